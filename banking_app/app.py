@@ -1,43 +1,45 @@
 from flask import Flask, render_template, request, redirect, url_for, session
+from flask.typing import ResponseReturnValue
 from functools import wraps
 from datetime import timedelta
+from typing import Any, Callable, Dict, List
 
 app = Flask(__name__)
 app.secret_key = ".env"
 app.permanent_session_lifetime = timedelta(minutes=30) 
 # Test accounts
-SAMPLE_ACCOUNTS = [
+SAMPLE_ACCOUNTS: List[Dict[str, Any]] = [
     {"id": 1, "name": "Checking Account", "balance": 2500.00},
     {"id": 2, "name": "Savings Account", "balance": 15000.00},
     {"id": 3, "name": "Business Account", "balance": 50000.00},
 ]
 
 # Test credentials for login
-SAMPLE_USERS = {
+SAMPLE_USERS: Dict[str, str] = {
     "test":"test",
     "admin":"admin",
 }
 
 # Payload for admin page 
-FAKE_USERS = [
+FAKE_USERS: List[Dict[str, Any]] = [
     {"id": 1, "username": "colinm", "email": "email@1.com", "num_accounts": "5", "balance": 42500.00},
     {"id": 2, "username": "jakep", "email": "email@2.com", "num_accounts": "8", "balance": 2315000.00},
     {"id": 3, "username": "carloso", "email": "email@3.com", "num_accounts": "1", "balance": 50000.00},
 ]
 
-def login_required(f):
+def login_required(f: Callable[..., Any]) -> Callable[..., Any]:
     @wraps(f)
-    def decorated_function(*args, **kwargs):
+    def decorated_function(*args: Any, **kwargs: Any) -> Any:
         if "username" not in session:
             return redirect(url_for("login"))
         return f(*args, **kwargs)
     return decorated_function
 @app.route('/')
-def home():
+def home() -> str:
     return render_template('login.html')
 
 @app.route('/login', methods=['GET', 'POST'])
-def login():
+def login() -> ResponseReturnValue:
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
@@ -55,7 +57,7 @@ def login():
 
 @app.route('/dashboard')
 @login_required
-def dashboard():
+def dashboard() -> str:
     # Mock 
     user_name = "Colin McArthur"  # Placeholder username
     transactions = [
@@ -81,15 +83,15 @@ def dashboard():
 
 @app.route('/transfer')
 @login_required
-def transfer():
+def transfer() -> str:
     return render_template('transfer.html', accounts=SAMPLE_ACCOUNTS)
 
 @app.route('/transfer', methods=['POST'])
 @login_required
-def process_transfer():
-    from_account_id = int(request.form.get('fromAccount'))
+def process_transfer() -> ResponseReturnValue:
+    from_account_id = int(request.form['fromAccount'])
     transfer_type = request.form.get('transferType')
-    amount = float(request.form.get('amount'))
+    amount = float(request.form['amount'])
 
     from_account = next((acc for acc in SAMPLE_ACCOUNTS if acc["id"] == from_account_id), None)
 
@@ -97,7 +99,7 @@ def process_transfer():
         return "Insufficient funds or invalid account.", 400
 
     if transfer_type == "internal":
-        to_account_id = int(request.form.get('toInternalAccount'))
+        to_account_id = int(request.form['toInternalAccount'])
         to_account = next((acc for acc in SAMPLE_ACCOUNTS if acc["id"] == to_account_id), None)
         if not to_account:
             return "Invalid target account.", 400
@@ -108,18 +110,18 @@ def process_transfer():
         print(f"Internal Transfer: ${amount} from {from_account['name']} to {to_account['name']}")
 
     elif transfer_type == "external":
-        to_account = request.form.get('toExternalAccount')
+        external_account = request.form.get('toExternalAccount')
         notes = request.form.get('notesExternal')
 
         # Process external transfer 
         from_account["balance"] -= amount
-        print(f"External Transfer: ${amount} from {from_account['name']} to External Account {to_account}. Notes: {notes}")
+        print(f"External Transfer: ${amount} from {from_account['name']} to External Account {external_account}. Notes: {notes}")
 
     return "Transfer processed successfully!"
 
 @app.route('/history')
 @login_required
-def transaction_history():
+def transaction_history() -> str:
     filter_type = request.args.get("type")
     # Basic filtering (replace with db)
     if filter_type == "debit":
@@ -132,28 +134,28 @@ def transaction_history():
         return render_template('history.html')
 
 @app.route('/register')
-def register():
+def register() -> str:
     return render_template('registration.html')
 
 @app.route('/admin')
 @login_required
-def admin():
+def admin() -> str:
     # Pass user data 
     return render_template('admin.html', users=FAKE_USERS)
 
 @app.route('/logout')
-def logout():
+def logout() -> ResponseReturnValue:
     session.pop("username", None)
     return redirect(url_for("login"))
 
 @app.route('/admin/transaction', methods=['POST'])
 @login_required
-def add_transaction():
+def add_transaction() -> ResponseReturnValue:
     if session.get("username") != "admin":
         return "Unauthorized", 403
 
-    account_id = int(request.form.get("account_id"))
-    amount = float(request.form.get("amount"))
+    account_id = int(request.form["account_id"])
+    amount = float(request.form["amount"])
     transaction_type = request.form.get("type")
 
     # Find account by account_id
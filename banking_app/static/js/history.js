@@ -1,23 +1,47 @@
 document.addEventListener("DOMContentLoaded", () => {
     const tableBody = document.getElementById("historyTableBody");
-    const filterDate = document.getElementById("filterDate");
+    const filterStart = document.getElementById("filterStart");
+    const filterEnd = document.getElementById("filterEnd");
     const filterType = document.getElementById("filterType");
+    const filterAccount = document.getElementById("filterAccount");
     const applyFiltersButton = document.getElementById("applyFilters");
+    const loadMoreButton = document.getElementById("loadMore");
 
-    function fetchTransactions() {
-        fetch('/api/transactions')
+    let nextCursor = null;
+    let loading = false;
+
+    function buildQuery(cursor) {
+        const params = new URLSearchParams();
+        if (filterStart.value) params.set("start", filterStart.value);
+        if (filterEnd.value) params.set("end", filterEnd.value);
+        if (filterType.value) params.set("type", filterType.value);
+        if (filterAccount.value) params.set("account", filterAccount.value);
+        if (cursor) params.set("cursor", cursor);
+        return params.toString();
+    }
+
+    // Fetches one page; the first page replaces the table, later pages append
+    function fetchTransactions(cursor = null) {
+        if (loading) return;
+        loading = true;
+        fetch(`/api/transactions?${buildQuery(cursor)}`)
             .then(response => response.json())
-            .then(data => {
-                renderTransactions(data);
+            .then(page => {
+                if (!cursor) tableBody.innerHTML = "";
+                renderTransactions(page.transactions, !cursor);
+                nextCursor = page.next_cursor;
+                loadMoreButton.hidden = !nextCursor;
             })
             .catch(error => {
                 console.error('Error fetching transactions:', error);
+            })
+            .finally(() => {
+                loading = false;
             });
     }
 
-    function renderTransactions(transactions) {
-        tableBody.innerHTML = "";
-        if (transactions.length === 0) {
+    function renderTransactions(transactions, firstPage) {
+        if (firstPage && transactions.length === 0) {
             tableBody.innerHTML = `<tr><td colspan="5">No transactions found.</td></tr>`;
             return;
         }
@@ -28,36 +52,21 @@ document.addEventListener("DOMContentLoaded", () => {
                 <td>${transaction.date}</td>
                 <td>${transaction.type}</td>
                 <td>${transaction.account}</td>
-                <td>$${transaction.amount.toFixed(2)}</td>
+                <td>$${Number(transaction.amount).toFixed(2)}</td>
                 <td>${transaction.notes || "N/A"}</td>
             `;
-           
+
             tableBody.appendChild(row);
         });
     }
 
-    function applyFilters() {
-        const selectedDate = filterDate.value;
-        const selectedType = filterType.value;
-
-        fetch('/api/transactions')
-            .then(response => response.json())
-            .then(data => {
-                const filteredTransactions = data.filter((transaction) => {
-                    const matchesDate = selectedDate ? transaction.date === selectedDate : true;
-                    const matchesType = selectedType ? transaction.type === selectedType : true;
-                    return matchesDate && matchesType;
-                });
-                renderTransactions(filteredTransactions);
-            })
-            .catch(error => {
-                console.error('Error fetching transactions:', error);
-            });
-    }
-
     applyFiltersButton.addEventListener("click", () => {
-        applyFilters();
+        fetchTransactions();
+    });
+
+    loadMoreButton.addEventListener("click", () => {
+        if (nextCursor) fetchTransactions(nextCursor);
     });
 
     fetchTransactions();
-});
\ No newline at end of file
+});
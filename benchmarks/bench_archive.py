@@ -0,0 +1,125 @@
+"""
+Transaction archival benchmark.
+
+Fills a scratch SQLite database with a year of transactions for a set of
+accounts, archives everything older than 90 days, and reports the size of
+the database before and after (vacuumed), the size of the archive files,
+and how long history pages take on both sides of the archive horizon.
+
+Usage:
+    python -m benchmarks.bench_archive --accounts 200 --per-day 2
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from database.archive import TransactionArchive, archive_transactions
+from database.init_db import create_engine_from_env, init_db
+from database.models import Account, Role, Transaction, User
+from database.models import TransactionType, TransactionStatus
+from logic.transaction_history import TransactionHistory, TransactionFilters
+
+DAYS = 365
+
+
+def seed(engine: Engine, accounts: int, per_day: int) -> int:
+    """One user owning `accounts` accounts with `per_day` daily entries."""
+    now = datetime.utcnow()
+    with engine.begin() as connection:
+        user_id = connection.execute(insert(User).returning(User.user_id), {
+            'username': "bench_archive", 'email': "bench@example.com",
+            'password_hash': "!", 'role': Role.user}).scalar_one()
+        account_ids = connection.execute(
+            insert(Account).returning(Account.account_id), [
+                {'user_id': user_id, 'account_type': "Checking Account",
+                 'balance': 0} for _ in range(accounts)]).scalars().all()
+        for day in range(DAYS):
+            connection.execute(insert(Transaction), [
+                {'account_id': account_id,
+                 'transaction_type': TransactionType.deposit,
+                 'amount': 1, 'status': TransactionStatus.completed,
+                 'created_at': now - timedelta(days=day, minutes=i)}
+                for account_id in account_ids for i in range(per_day)])
+    return user_id
+
+
+def database_size(engine: Engine, path: str) -> int:
+    # VACUUM cannot run in the transaction SQLAlchemy opens
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("VACUUM")
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        cursor.close()
+    finally:
+        connection.close()
+    return os.path.getsize(path)
+
+
+def archive_size(archive: TransactionArchive) -> int:
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(archive.root) for name in names)
+
+
+def page_time(engine: Engine, archive: TransactionArchive, user_id: int,
+              filters: TransactionFilters, repeat: int = 20) -> float:
+    """Average seconds to load the first history page matching filters."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        with sessionmaker(bind=engine)() as session:
+            TransactionHistory(session, archive).page(user_id, filters)
+    return (time.perf_counter() - start) / repeat
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--accounts", type=int, default=200)
+    parser.add_argument("--per-day", type=int, default=2)
+    parser.add_argument("--older-than-days", type=int, default=90)
+    args = parser.parse_args(argv)
+
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "bank.db")
+        engine = create_engine_from_env(f"sqlite:///{path}")
+        init_db(engine)
+        archive = TransactionArchive(os.path.join(scratch, "archive"))
+        user_id = seed(engine, args.accounts, args.per_day)
+        today = datetime.utcnow().date()
+        recent = TransactionFilters(start=today - timedelta(days=30))
+        old = TransactionFilters(start=today - timedelta(days=300),
+                                 end=today - timedelta(days=200))
+
+        size_before = database_size(engine, path)
+        recent_before = page_time(engine, archive, user_id, recent)
+        old_before = page_time(engine, archive, user_id, old)
+
+        start = time.perf_counter()
+        moved = archive_transactions(
+            engine, archive,
+            datetime.utcnow() - timedelta(days=args.older_than_days))
+        elapsed = time.perf_counter() - start
+
+        print(f"archived {moved} transactions in {elapsed:.1f}s")
+        print(f"database: {size_before / 1e6:.1f} MB -> "
+              f"{database_size(engine, path) / 1e6:.1f} MB, "
+              f"archive files: {archive_size(archive) / 1e6:.1f} MB")
+        print(f"{'page':>8} {'before ms':>10} {'after ms':>10}")
+        for name, filters, before in (("recent", recent, recent_before),
+                                      ("old", old, old_before)):
+            after = page_time(engine, archive, user_id, filters)
+            print(f"{name:>8} {before * 1000:>10.2f} {after * 1000:>10.2f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
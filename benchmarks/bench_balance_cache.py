@@ -0,0 +1,71 @@
+"""
+Balance cache benchmark.
+
+Runs a balance check (does an account cover an amount?) for random
+hot accounts, first with a balance query per check, then through the
+read-through BankSystem cache, and reports checks/sec and queries for both.
+
+Usage:
+    python -m benchmarks.bench_balance_cache --accounts 100 --checks 20000
+"""
+import argparse
+import logging
+import random
+import time
+from typing import List, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.bench_transfers import seed_accounts
+from database.init_db import create_engine_from_env, init_db
+from database.models import Account
+from logic.bank_system import BankSystem
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", default=None,
+                        help="overrides DATABASE_URL")
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--checks", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+
+    engine = create_engine_from_env(args.database_url)
+    init_db(engine)
+    Session = sessionmaker(bind=engine)
+    user_id, account_ids = seed_accounts(engine, args.accounts)
+    rng = random.Random(args.seed)
+    checks = [(rng.choice(account_ids), rng.randint(1, 99))
+              for _ in range(args.checks)]
+    queries = [0]
+    event.listen(engine, "before_cursor_execute",
+                 lambda *_: queries.__setitem__(0, queries[0] + 1))
+
+    def query_each() -> None:
+        with Session() as session:
+            for account_id, amount in checks:
+                session.execute(select(Account.balance).where(
+                    Account.account_id == account_id,
+                    Account.user_id == user_id)).scalar() >= amount
+
+    def cached() -> None:
+        bank_system = BankSystem(Session)
+        for account_id, amount in checks:
+            bank_system.has_funds(user_id, account_id, amount)
+
+    print(f"{'mode':>10} {'checks/s':>12} {'queries':>10}")
+    for mode, work in (("database", query_each), ("cached", cached)):
+        queries[0] = 0
+        start = time.perf_counter()
+        work()
+        elapsed = time.perf_counter() - start
+        print(f"{mode:>10} {args.checks / elapsed:>12.1f} {queries[0]:>10}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
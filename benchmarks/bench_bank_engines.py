@@ -0,0 +1,78 @@
+"""
+In-memory bank engine benchmark.
+
+Applies the same random deposits, withdrawals and transfers to the dict
+based BankSystem (one call per operation) and to VectorBankSystem (one
+batch call per operation kind) and reports operations/sec for each.
+
+Usage:
+    python -m benchmarks.bench_bank_engines --accounts 10000 \
+        --operations 100000
+"""
+import argparse
+import time
+from typing import Callable, Dict
+
+import numpy as np
+
+from database.money import from_cents
+from logic.bank_system import BankSystem
+from logic.vector_bank_system import VectorBankSystem
+
+USERS = 100
+
+
+def timed(work: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    work()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--accounts", type=int, default=10_000)
+    parser.add_argument("--operations", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    owners = np.arange(args.accounts) % USERS
+    accounts: Dict[int, Dict[int, object]] = {}
+    for account_id, user_id in enumerate(owners.tolist()):
+        accounts.setdefault(user_id, {})[account_id] = from_cents(100_000)
+
+    # transfers stay within a user, as BankSystem.transfer_funds requires
+    sources = rng.integers(0, args.accounts, args.operations)
+    targets = (sources + USERS * rng.integers(
+        1, args.accounts // USERS, args.operations)) % args.accounts
+    users = owners[sources]
+    cents = rng.integers(1, 50_000, args.operations)
+    amounts = [from_cents(c) for c in cents.tolist()]
+
+    bank_system = BankSystem()
+    bank_system.accounts = {user_id: dict(balances)
+                            for user_id, balances in accounts.items()}
+    vector = VectorBankSystem.from_accounts(accounts)
+
+    print(f"{'operation':>10} {'dict ops/s':>14} {'vector ops/s':>14}")
+    for name in ("deposit", "withdraw", "transfer"):
+        if name == "transfer":
+            scalar = timed(lambda: [
+                bank_system.transfer_funds(u, s, t, a) for u, s, t, a in
+                zip(users.tolist(), sources.tolist(), targets.tolist(),
+                    amounts)])
+            batch = timed(lambda: vector.transfer_many(
+                sources, targets, cents, user_ids=users))
+        else:
+            method = getattr(bank_system, name)
+            scalar = timed(lambda: [
+                method(u, s, a) for u, s, a in
+                zip(users.tolist(), sources.tolist(), amounts)])
+            many = getattr(vector, f"{name}_many")
+            batch = timed(lambda: many(sources, cents, user_ids=users))
+        print(f"{name:>10} {args.operations / scalar:>14.0f} "
+              f"{args.operations / batch:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
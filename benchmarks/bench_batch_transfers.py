@@ -0,0 +1,70 @@
+"""
+Batch transfer API benchmark.
+
+Moves the same number of transfers once through the single-transfer form
+route (one request and one commit each) and once through the JSON batch
+endpoint for each chunk size, and reports transfers/sec for each path.
+
+Usage:
+    python -m benchmarks.bench_batch_transfers --transfers 1000 \
+        --chunks 100 1000
+"""
+import argparse
+import logging
+import time
+from typing import Any, Dict, List
+
+from benchmarks.bench_transfers import seed_accounts
+from logic.main import BankApp
+
+
+def transfers(account_ids: List[int], count: int) -> List[Dict[str, Any]]:
+    """A round robin of one cent transfers between the accounts."""
+    return [{'from_account': account_ids[i % len(account_ids)],
+             'to_account': account_ids[(i + 1) % len(account_ids)],
+             'amount': '0.01'} for i in range(count)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--transfers", type=int, default=1000)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[100, 1000],
+                        help="chunk sizes to try for the batch endpoint")
+    args = parser.parse_args()
+
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    bank_app = BankApp()
+    bank_app.app.config['TESTING'] = True
+    bank_app.app.secret_key = bank_app.app.secret_key or "benchmark"
+    user_id, account_ids = seed_accounts(bank_app.engine, 4)
+    items = transfers(account_ids, args.transfers)
+
+    client = bank_app.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+
+    print(f"{'path':>20} {'transfers/s':>12}")
+    start = time.perf_counter()
+    for item in items:
+        client.post('/transfer', data={
+            'fromAccount': str(item['from_account']),
+            'transferType': 'internal',
+            'toInternalAccount': str(item['to_account']),
+            'amount': item['amount'],
+        })
+    elapsed = time.perf_counter() - start
+    print(f"{'single':>20} {len(items) / elapsed:>12.1f}")
+
+    for chunk_size in args.chunks:
+        start = time.perf_counter()
+        response = client.post('/api/transfers', json={
+            'transfers': items, 'chunk_size': chunk_size})
+        elapsed = time.perf_counter() - start
+        completed = response.get_json()['completed']
+        print(f"{f'batch ({chunk_size})':>20} {completed / elapsed:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Concurrency benchmark for the request-scoped database sessions.
+
+Drives the dashboard and transfer routes from a growing number of worker
+threads (each with its own test client, so each request runs in its own
+app context and checks out its own pooled connection) and reports the
+throughput for every thread count.
+
+Usage:
+    python -m benchmarks.bench_concurrency --threads 1 2 4 8 --duration 5
+"""
+import argparse
+import logging
+import threading
+import time
+from typing import List, Tuple
+
+import bcrypt
+from sqlalchemy import select
+
+from database.init_db import get_pool_stats
+from database.models import Account, Role, User
+from logic.main import BankApp
+
+BENCH_USERNAME = "bench_user"
+
+seeds: List[Tuple[int, List[int]]] = []
+
+
+def seed_user(bank_app: BankApp, index: int) -> Tuple[int, List[int]]:
+    """
+    Create (or reuse) a benchmark user with two well funded accounts.
+    Every worker thread gets its own user so transfers don't contend on
+    the same rows.
+    """
+    db = bank_app.db_session
+    username = f"{BENCH_USERNAME}_{index}"
+    user = db.query(User).filter_by(username=username).first()
+    if user is None:
+        user = User(username=username,
+                    email=f"{username}@example.com",
+                    password_hash=bcrypt.hashpw(
+                        b"bench", bcrypt.gensalt(4)).decode("utf-8"),
+                    role=Role.user)
+        db.add(user)
+        db.flush()
+        db.add_all([
+            Account(user_id=user.user_id, account_type="Checking Account",
+                    balance=1_000_000.00),
+            Account(user_id=user.user_id, account_type="Savings Account",
+                    balance=1_000_000.00),
+        ])
+        db.commit()
+    user_id = db.scalars(
+        select(User.user_id).where(User.username == username)).one()
+    account_ids = list(db.scalars(
+        select(Account.account_id).where(Account.user_id == user_id)
+        .order_by(Account.account_id).limit(2)))
+    bank_app.remove_db_session()
+    return user_id, account_ids
+
+
+def worker(bank_app: BankApp, deadline: float, counts: List[int],
+           index: int) -> None:
+    """
+    Alternate dashboard views and internal transfers until the deadline.
+    """
+    user_id, account_ids = seeds[index]
+    client = bank_app.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    done = 0
+    while time.perf_counter() < deadline:
+        client.get('/dashboard')
+        source, target = account_ids[done % 2], account_ids[(done + 1) % 2]
+        client.post('/transfer', data={
+            'fromAccount': str(source),
+            'transferType': 'internal',
+            'toInternalAccount': str(target),
+            'amount': '1',
+        })
+        done += 2
+    counts[index] = done
+
+
+def run(bank_app: BankApp, threads: int, duration: float) -> float:
+    """
+    Run the benchmark with the given number of threads, returning req/s.
+    """
+    while len(seeds) < threads:
+        seeds.append(seed_user(bank_app, len(seeds)))
+    counts = [0] * threads
+    deadline = time.perf_counter() + duration
+    workers = [threading.Thread(target=worker,
+                                args=(bank_app, deadline, counts, i))
+               for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, nargs="+",
+                        default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=5.0,
+                        help="seconds per thread count")
+    args = parser.parse_args()
+
+    # keep per-statement SQL echo out of the measurement
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    bank_app = BankApp()
+    bank_app.app.config['TESTING'] = True
+    bank_app.app.secret_key = bank_app.app.secret_key or "benchmark"
+    print(f"{'threads':>8} {'req/s':>10}")
+    for threads in args.threads:
+        print(f"{threads:>8} {run(bank_app, threads, args.duration):>10.1f}")
+    print(f"pool: {get_pool_stats(bank_app.engine)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Transaction export memory benchmark.
+
+Streams the CSV export of users with growing histories from a scratch
+SQLite database and reports rows/sec and the peak Python memory of each
+export, which should stay flat as the history grows.
+
+Usage:
+    python -m benchmarks.bench_export --sizes 1000 10000 100000
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from database.init_db import create_engine_from_env, init_db
+from database.models import Account, Role, Transaction, User
+from database.models import TransactionType, TransactionStatus
+from logic.transaction_export import TransactionExport
+
+
+def seed(engine: Engine, size: int) -> int:
+    """A user with one account holding `size` transactions."""
+    now = datetime.utcnow()
+    with engine.begin() as connection:
+        user_id = connection.execute(insert(User).returning(User.user_id), {
+            'username': f"bench_export_{size}",
+            'email': f"bench_export_{size}@example.com",
+            'password_hash': "!", 'role': Role.user}).scalar_one()
+        account_id = connection.execute(
+            insert(Account).returning(Account.account_id), {
+                'user_id': user_id, 'account_type': "Checking Account",
+                'balance': 0}).scalar_one()
+        for start in range(0, size, 10_000):
+            connection.execute(insert(Transaction), [
+                {'account_id': account_id,
+                 'transaction_type': TransactionType.deposit, 'amount': 1,
+                 'status': TransactionStatus.completed,
+                 'created_at': now - timedelta(minutes=i)}
+                for i in range(start, min(start + 10_000, size))])
+    return user_id
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1_000, 10_000, 100_000])
+    args = parser.parse_args(argv)
+
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        engine = create_engine_from_env(
+            f"sqlite:///{os.path.join(scratch, 'bank.db')}")
+        init_db(engine)
+        export = TransactionExport(sessionmaker(bind=engine))
+        print(f"{'rows':>10} {'rows/s':>10} {'peak MB':>10}")
+        for size in args.sizes:
+            user_id = seed(engine, size)
+            tracemalloc.start()
+            start = time.perf_counter()
+            written = sum(len(chunk) for chunk in export.to_csv(user_id))
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            assert written > 0
+            print(f"{size:>10} {size / elapsed:>10.0f} {peak / 1e6:>10.2f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
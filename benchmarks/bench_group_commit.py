@@ -0,0 +1,87 @@
+"""
+Group commit benchmark for the command bus.
+
+Worker threads post deposits, first each committing its own transaction,
+then through a CommandBus that commits them in shared micro-batches, and
+reports commands/sec and commits for both.
+
+Usage:
+    python -m benchmarks.bench_group_commit --threads 16 --duration 5 \
+        --batch-size 100 --max-wait-ms 2
+"""
+import argparse
+import logging
+import threading
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.bench_transfers import seed_accounts
+from database.init_db import create_engine_from_env, init_db
+from logic.commands import CommandBus, DbDepositCommand
+
+
+def run(threads: int, duration: float,
+        post: Callable[[int], None], account_ids: List[int]) -> int:
+    """Call `post` from every thread until the deadline; returns calls."""
+    counts = [0] * threads
+    deadline = time.perf_counter() + duration
+
+    def worker(index: int) -> None:
+        account_id = account_ids[index % len(account_ids)]
+        while time.perf_counter() < deadline:
+            post(account_id)
+            counts[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,))
+               for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sum(counts)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", default=None,
+                        help="overrides DATABASE_URL")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+
+    engine = create_engine_from_env(args.database_url)
+    init_db(engine)
+    Session = sessionmaker(bind=engine)
+    _, account_ids = seed_accounts(engine, args.threads)
+    commits = [0]
+    event.listen(engine, "commit", lambda *_: commits.__setitem__(
+        0, commits[0] + 1))
+
+    def post_alone(account_id: int) -> None:
+        with Session() as session, session.begin():
+            DbDepositCommand(account_id, "0.01").apply(session)
+
+    bus = CommandBus(Session, max_batch_size=args.batch_size,
+                     max_wait=args.max_wait_ms / 1000)
+
+    def post_grouped(account_id: int) -> None:
+        bus.execute(DbDepositCommand(account_id, "0.01"))
+
+    print(f"{'mode':>10} {'commands/s':>12} {'commits':>10}")
+    for mode, post in (("single", post_alone), ("grouped", post_grouped)):
+        commits[0] = 0
+        done = run(args.threads, args.duration, post, account_ids)
+        print(f"{mode:>10} {done / args.duration:>12.1f} {commits[0]:>10}")
+    bus.shutdown()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Logging overhead benchmark.
+
+Runs the same mix of requests (a transfer, the dashboard and the transfer
+form) against an app on a scratch SQLite database under different logging
+setups and reports the time per request of each: logging off, the old
+setup (every record formatted and written in the request thread, SQL
+echoed), and the queue listener at INFO, at DEBUG and at DEBUG sampled.
+The setups take turns for a few rounds; the best round of each counts.
+
+Usage:
+    python -m benchmarks.bench_logging --requests 1500 --rounds 3
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from flask.testing import FlaskClient
+from sqlalchemy import delete, func, select
+from sqlalchemy.engine import Engine
+
+from benchmarks.bench_transfers import seed_accounts
+from database.models import Transaction
+from logic.logging_config import JsonFormatter, configure_logging
+from logic.logging_config import shutdown_logging
+from logic.main import BankApp
+
+# debug records of the libraries are not what is measured here; the
+# connection pool logs under the name of its class
+QUIET = "sqlalchemy=WARNING,werkzeug=WARNING,database.init_db=WARNING"
+
+
+def run(client: FlaskClient, account_ids: List[int], count: int) -> float:
+    """Microseconds per request."""
+    start = time.perf_counter()
+    for i in range(count // 3):
+        client.post('/transfer', data={
+            'fromAccount': str(account_ids[i % 2]),
+            'transferType': 'internal',
+            'toInternalAccount': str(account_ids[(i + 1) % 2]),
+            'amount': '0.01',
+        })
+        client.get('/dashboard')
+        client.get('/transfer')
+    return (time.perf_counter() - start) / (count // 3 * 3) * 1e6
+
+
+def blocking(log: str) -> None:
+    """The setup `create_app` used to have, writing to `log`."""
+    handler = logging.FileHandler(log)
+    handler.setFormatter(JsonFormatter())
+    logging.getLogger().addHandler(handler)
+    logging.getLogger().setLevel(logging.DEBUG)
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
+
+
+def prune(engine: Engine, last_id: int) -> None:
+    """Drops the transactions of a run, so every run sees the same data."""
+    with engine.begin() as connection:
+        connection.execute(delete(Transaction).where(
+            Transaction.transaction_id > last_id))
+
+
+def reset() -> None:
+    shutdown_logging()
+    logging.disable(logging.NOTSET)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    for name in ('sqlalchemy', 'sqlalchemy.engine'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=1500)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        log_path = os.path.join(scratch, "app.log")
+        bank_app = BankApp({
+            'DATABASE_URL': f"sqlite:///{os.path.join(scratch, 'bank.db')}",
+            'TESTING': True, 'SECRET_KEY': "benchmark"})
+        user_id, account_ids = seed_accounts(bank_app.engine, 2)
+        client = bank_app.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+
+        with open(log_path, "a") as log:
+            setups: Dict[str, Callable[[], object]] = {
+                'off': lambda: logging.disable(logging.CRITICAL),
+                'blocking, SQL echo': lambda: blocking(log_path),
+                'queue, INFO': lambda: configure_logging(
+                    {'LOG_LEVEL': "INFO"}, log),
+                'queue, DEBUG': lambda: configure_logging(
+                    {'LOG_LEVEL': "DEBUG", 'LOG_LEVELS': QUIET}, log),
+                'queue, DEBUG 1%': lambda: configure_logging(
+                    {'LOG_LEVEL': "DEBUG", 'LOG_LEVELS': QUIET,
+                     'LOG_DEBUG_SAMPLE_RATE': "0.01"}, log),
+            }
+            best = {name: float("inf") for name in setups}
+            written: Dict[str, int] = dict.fromkeys(setups, 0)
+            run(client, account_ids, 30)  # warm up
+            with bank_app.engine.connect() as connection:
+                last_id = connection.execute(
+                    select(func.max(Transaction.transaction_id))).scalar()
+            for _ in range(args.rounds):
+                for name, setup in setups.items():
+                    size = os.path.getsize(log_path)
+                    setup()
+                    best[name] = min(best[name], run(
+                        client, account_ids, args.requests))
+                    reset()
+                    written[name] = os.path.getsize(log_path) - size
+                    prune(bank_app.engine, last_id or 0)
+        print(f"{'logging':>20} {'us/request':>11} {'log KB':>8}")
+        for name in setups:
+            print(f"{name:>20} {best[name]:>11.0f} "
+                  f"{written[name] / 1000:>8.0f}")
+        bank_app.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Login throughput benchmark for the password hashing service.
+
+Simulates a login storm: many request threads verify passwords at the same
+time. The baseline calls bcrypt.checkpw on each request thread; the
+PasswordHasher runs the same work on worker pools of growing size. On a
+multi-core machine throughput grows with the pool size up to the number
+of cores.
+
+Usage:
+    python -m benchmarks.bench_password_hashing --rounds 10 --logins 64
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import bcrypt
+
+from logic.password_hasher import PasswordHasher
+
+PASSWORD = "correct horse battery staple"
+
+
+def storm(verify: Callable[[str, str], bool], hashed: str, logins: int,
+          request_threads: int) -> float:
+    """
+    Run `logins` concurrent verifications, returning logins/s.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(request_threads) as requests:
+        results = list(requests.map(lambda _: verify(PASSWORD, hashed),
+                                    range(logins)))
+    elapsed = time.perf_counter() - start
+    assert all(results)
+    return logins / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--request-threads", type=int, default=32)
+    parser.add_argument("--executor", choices=("thread", "process"),
+                        default="thread")
+    args = parser.parse_args()
+
+    hashed = bcrypt.hashpw(PASSWORD.encode('utf-8'),
+                           bcrypt.gensalt(args.rounds)).decode('utf-8')
+    cpus = os.cpu_count() or 1
+    print(f"cost factor {args.rounds}, {cpus} CPUs, "
+          f"{args.request_threads} request threads")
+
+    def checkpw(password: str, stored: str) -> bool:
+        return bcrypt.checkpw(password.encode('utf-8'),
+                              stored.encode('utf-8'))
+
+    print(f"{'workers':>16} {'logins/s':>10}")
+    rate = storm(checkpw, hashed, args.logins, args.request_threads)
+    print(f"{'request thread':>16} {rate:>10.1f}")
+    workers = 1
+    while True:
+        hasher = PasswordHasher(rounds=args.rounds, max_workers=workers,
+                                executor=args.executor)
+        try:
+            rate = storm(hasher.verify, hashed, args.logins,
+                         args.request_threads)
+        finally:
+            hasher.shutdown()
+        print(f"{workers:>16} {rate:>10.1f}")
+        if workers >= cpus:
+            break
+        workers = min(workers * 2, cpus)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Startup benchmark: imports, app factory and admin bootstrap.
+
+Reports the slowest imports of `logic.main` under `python -X importtime`
+and the wall time of a fresh interpreter importing it and calling
+`create_app` on a scratch SQLite database. Then seeds growing user tables
+and times the admin bootstrap the application runs at startup: the old
+one, which loaded every user to lowercase the usernames, against the
+indexed existence check of `BankApp.add_admin_user`.
+
+Usage:
+    python -m benchmarks.bench_startup --sizes 1000 10000 100000 --top 10
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import exists, func, insert, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from database.init_db import create_engine_from_env, init_db
+from database.models import Role, User
+
+
+def full_scan(session: Session) -> bool:
+    """The bootstrap as it used to be: every user is loaded."""
+    for user in session.query(User).all():
+        if user.username != user.username.lower():
+            user.username = user.username.lower()
+    session.commit()
+    return session.query(User).filter_by(username="admin").first() \
+        is not None
+
+
+def indexed_check(session: Session) -> bool:
+    """The bootstrap of `BankApp.add_admin_user`."""
+    return bool(session.execute(select(exists().where(
+        func.lower(User.username) == "admin"))).scalar())
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FACTORY = """
+import logic.main
+logic.main.create_app({'DATABASE_URL': sys.argv[1]})
+"""
+
+
+def import_times(module: str) -> List[Tuple[int, str]]:
+    """
+    The cumulative import time in microseconds of `module` and of
+    everything it imports, slowest first, as `-X importtime` reports them.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times.append((int(cumulative), name.strip()))
+    return sorted(times, reverse=True)
+
+
+def cold_start(url: str) -> float:
+    """Seconds a new interpreter takes to import the app and build it."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import sys" + FACTORY, url],
+                   cwd=ROOT, capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def seed(session: Session, start: int, stop: int) -> None:
+    for offset in range(start, stop, 10_000):
+        session.execute(insert(User), [
+            {'username': f"bench_startup_{i}",
+             'email': f"bench_startup_{i}@example.com",
+             'password_hash': "!", 'role': Role.user}
+            for i in range(offset, min(offset + 10_000, stop))])
+    session.commit()
+
+
+def timed(bootstrap: Callable[[Session], bool], session: Session) -> float:
+    start = time.perf_counter()
+    assert bootstrap(session)
+    elapsed = time.perf_counter() - start
+    session.close()
+    return elapsed * 1000
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1_000, 10_000, 100_000])
+    parser.add_argument("--top", type=int, default=10,
+                        help="how many of the slowest imports to list")
+    args = parser.parse_args(argv)
+
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+
+    print(f"{'import ms':>10}  module")
+    for cumulative, name in import_times("logic.main")[:args.top]:
+        print(f"{cumulative / 1000:>10.1f}  {name}")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        cold = cold_start(f"sqlite:///{os.path.join(scratch, 'cold.db')}")
+        print(f"\ncold start (import + create_app): {cold * 1000:.0f} ms\n")
+        engine = create_engine_from_env(
+            f"sqlite:///{os.path.join(scratch, 'bank.db')}")
+        init_db(engine)
+        session_factory = sessionmaker(bind=engine)
+        with session_factory() as session:
+            session.add(User(username="admin", email="admin@example.com",
+                             password_hash="!", role=Role.admin))
+            session.commit()
+        print(f"{'users':>10} {'scan ms':>10} {'indexed ms':>11}")
+        seeded = 0
+        for size in args.sizes:
+            with session_factory() as session:
+                seed(session, seeded, size)
+            seeded = max(seeded, size)
+            scan = timed(full_scan, session_factory())
+            indexed = timed(indexed_check, session_factory())
+            print(f"{size:>10} {scan:>10.2f} {indexed:>11.3f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Contention stress benchmark for the transfer service.
+
+Worker threads move money between a small pool of hot accounts at random,
+each with its own session. Reports transfers/sec, rejected transfers and
+retries, then checks that the total over the pool is unchanged and no
+account went negative.
+
+Usage:
+    python -m benchmarks.bench_transfers --threads 8 --accounts 4 --duration 5
+"""
+import argparse
+import logging
+import random
+import sys
+import threading
+import time
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from database.init_db import create_engine_from_env, get_pool_stats, init_db
+from database.models import Account, Role, User
+from logic.transfer_service import InsufficientFunds, TransferService
+
+BENCH_USERNAME = "bench_transfers"
+
+
+def seed_accounts(engine: Engine, count: int) -> Tuple[int, List[int]]:
+    """
+    Create (or reuse) the benchmark user with at least `count` accounts
+    holding a small balance, so that transfers regularly hit the
+    insufficient funds check.
+    """
+    with sessionmaker(bind=engine)() as db:
+        user = db.query(User).filter_by(username=BENCH_USERNAME).first()
+        if user is None:
+            user = User(username=BENCH_USERNAME,
+                        email=f"{BENCH_USERNAME}@example.com",
+                        password_hash="!", role=Role.user)
+            db.add(user)
+            db.flush()
+        existing = db.query(Account).filter_by(user_id=user.user_id).count()
+        db.add_all([Account(user_id=user.user_id,
+                            account_type="Checking Account", balance=100)
+                    for _ in range(count - existing)])
+        db.commit()
+        user_id = db.scalars(select(User.user_id).where(
+            User.username == BENCH_USERNAME)).one()
+        account_ids = list(db.scalars(
+            select(Account.account_id).where(Account.user_id == user_id)
+            .order_by(Account.account_id).limit(count)))
+        return user_id, account_ids
+
+
+def total(engine: Engine, account_ids: List[int]) -> Tuple[Decimal, Decimal]:
+    """Sum and minimum balance over the given accounts."""
+    with sessionmaker(bind=engine)() as db:
+        row = db.execute(select(func.sum(Account.balance),
+                                func.min(Account.balance)).where(
+            Account.account_id.in_(account_ids))).one()
+    return row[0], row[1]
+
+
+def worker(engine: Engine, user_id: int, account_ids: List[int],
+           deadline: float, stats: List[List[int]], index: int) -> None:
+    """Random transfers between the hot accounts until the deadline."""
+    rng = random.Random(index)
+    done = rejected = retries = 0
+    with sessionmaker(bind=engine)() as db:
+        service = TransferService(db, max_retries=20)
+        while time.perf_counter() < deadline:
+            source, target = rng.sample(account_ids, 2)
+            amount = Decimal(rng.randint(1, 5000)) / 100
+            try:
+                retries += service.transfer(user_id, source, target,
+                                            amount).attempts - 1
+                done += 1
+            except InsufficientFunds:
+                rejected += 1
+    stats[index] = [done, rejected, retries]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", default=None,
+                        help="overrides DATABASE_URL")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--accounts", type=int, default=4,
+                        help="size of the hot account pool (at least 2)")
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+
+    engine = create_engine_from_env(args.database_url)
+    init_db(engine)
+    user_id, account_ids = seed_accounts(engine, max(args.accounts, 2))
+    before, _ = total(engine, account_ids)
+
+    stats = [[0, 0, 0] for _ in range(args.threads)]
+    deadline = time.perf_counter() + args.duration
+    workers = [threading.Thread(target=worker,
+                                args=(engine, user_id, account_ids,
+                                      deadline, stats, i))
+               for i in range(args.threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    done, rejected, retries = (sum(column) for column in zip(*stats))
+    after, lowest = total(engine, account_ids)
+    print(f"{done / elapsed:.1f} transfers/s ({done} done, "
+          f"{rejected} rejected, {retries} retries)")
+    print(f"total before {before}, after {after}, lowest balance {lowest}")
+    print(f"pool: {get_pool_stats(engine)}")
+    engine.dispose()
+    if after != before or lowest < 0:
+        sys.exit("Money was not conserved.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import os
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from itertools import groupby, islice
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.engine import Engine
+
+from database.models import Transaction, TransactionType, TransactionStatus
+from database.money import from_cents, to_cents
+from database.partitions import add_months, month_start
+
+# pyarrow takes longer to import than the rest of the application, so it
+# is only imported once the archive is actually read or written
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+# next to the package, like the templates, so that the web app and the
+# CLI find the same archive whatever directory they are started from
+DEFAULT_ARCHIVE_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), "..", "archive", "transactions"))
+DEFAULT_ARCHIVE_AFTER_DAYS = 90
+
+_HORIZON_FILE = "HORIZON"
+_DELETE_BATCH_SIZE = 1000
+_ACCOUNTS_PER_QUERY = 100
+
+
+def archive_dir() -> str:
+    """
+    Returns the archive location from the `TRANSACTION_ARCHIVE_DIR`
+    environment variable.
+    """
+    return os.getenv("TRANSACTION_ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR)
+
+
+def archive_after() -> timedelta:
+    """
+    Returns the age from which transactions are archived, from the
+    `ARCHIVE_AFTER_DAYS` environment variable.
+    """
+    return timedelta(days=int(os.getenv("ARCHIVE_AFTER_DAYS",
+                                        DEFAULT_ARCHIVE_AFTER_DAYS)))
+
+
+@lru_cache(maxsize=None)
+def schema() -> 'pa.Schema':
+    """
+    The columns of the archive files. There is one file per account and
+    month, in the Arrow IPC format: columnar, zstd-compressed and read
+    through a memory map.
+    """
+    import pyarrow as pa
+    return pa.schema([
+        ('transaction_id', pa.int64()),
+        ('account_id', pa.int64()),
+        ('transaction_type', pa.string()),
+        ('amount', pa.int64()),  # cents
+        ('status', pa.string()),
+        ('created_at', pa.timestamp('us')),
+        ('notes', pa.string()),
+    ])
+
+
+class ArchivedTransaction(NamedTuple):
+    """A transaction read back from the archive."""
+    transaction_id: int
+    account_id: int
+    transaction_type: TransactionType
+    amount: Any
+    status: TransactionStatus
+    created_at: datetime
+    notes: Optional[str]
+
+
+class TransactionArchive:
+    """
+    Transactions moved out of the database, stored under
+    `<root>/<account_id>/<YYYY-MM>.arrow`.
+
+    The horizon is the cutoff of the latest archival run: every
+    transaction created before it that is no longer pending lives in the
+    archive rather than the database.
+    """
+
+    def __init__(self, root: Optional[str] = None) -> None:
+        self._root = Path(root or archive_dir())
+        # (inode, mtime) of the horizon file and the horizon read from it
+        self._horizon: Optional[Tuple[Tuple[int, int], datetime]] = None
+
+    @property
+    def root(self) -> Path:
+        """Getter for the archive directory."""
+        return self._root
+
+    @property
+    def horizon(self) -> Optional[datetime]:
+        """
+        Getter for the cutoff of the latest archival, None if never. The
+        file is only read again once it was replaced.
+        """
+        path = self._root / _HORIZON_FILE
+        try:
+            stat = path.stat()
+            version = (stat.st_ino, stat.st_mtime_ns)
+            if self._horizon is None or self._horizon[0] != version:
+                horizon = datetime.fromisoformat(path.read_text().strip())
+                self._horizon = (version, horizon)
+        except FileNotFoundError:
+            return None
+        return self._horizon[1]
+
+    @horizon.setter
+    def horizon(self, value: datetime) -> None:
+        """Setter for the horizon; it never moves back."""
+        current = self.horizon
+        if current is not None and current >= value:
+            return
+        self._root.mkdir(parents=True, exist_ok=True)
+        path = self._root / _HORIZON_FILE
+        temporary = path.with_name(path.name + ".tmp")
+        temporary.write_text(value.isoformat())
+        os.replace(temporary, path)
+
+    def path(self, account_id: int, month: date) -> Path:
+        """The file holding an account's archived transactions of a month."""
+        return self._root / str(account_id) / f"{month:%Y-%m}.arrow"
+
+    def months(self, account_id: int) -> List[date]:
+        """The months archived for an account, newest first."""
+        directory = self._root / str(account_id)
+        if not directory.is_dir():
+            return []
+        return sorted((datetime.strptime(path.stem, "%Y-%m").date()
+                       for path in directory.glob("*.arrow")), reverse=True)
+
+    def read(self, account_id: int, month: date) -> 'pa.Table':
+        """Reads one account-month file through a memory map."""
+        import pyarrow as pa
+        source = pa.memory_map(str(self.path(account_id, month)))
+        return pa.ipc.open_file(source).read_all()
+
+    def write(self, account_id: int, month: date,
+              rows: Sequence[Dict[str, Any]]) -> None:
+        """
+        Adds transactions (dicts with the `schema()` columns) to an
+        account-month file. Transactions already in it are kept once, so
+        an interrupted archival can be re-run. The file is replaced
+        atomically.
+        """
+        import pyarrow as pa
+        path = self.path(account_id, month)
+        merged: Dict[int, Dict[str, Any]] = {}
+        if path.exists():
+            merged.update((row['transaction_id'], row)
+                          for row in self.read(account_id, month).to_pylist())
+        merged.update((row['transaction_id'], row) for row in rows)
+        table = pa.Table.from_pylist(
+            sorted(merged.values(),
+                   key=lambda row: (row['created_at'], row['transaction_id'])),
+            schema=schema())
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(path.name + ".tmp")
+        with pa.OSFile(str(temporary), 'wb') as sink:
+            options = pa.ipc.IpcWriteOptions(compression='zstd')
+            with pa.ipc.new_file(sink, schema(), options=options) as writer:
+                writer.write_table(table)
+        os.replace(temporary, path)
+
+    def scan(self, account_ids: Iterable[int],
+             transaction_type: Optional[TransactionType] = None,
+             start: Optional[datetime] = None,
+             end: Optional[datetime] = None,
+             before: Optional[Tuple[datetime, int]] = None,
+             limit: Optional[int] = None) -> List[ArchivedTransaction]:
+        """
+        The archived transactions of the given accounts, newest first,
+        created in [start, end) and ordered before the keyset position
+        `before` = (created_at, transaction_id). With a `limit`, reading
+        stops at the first month that completes it.
+        """
+        return list(islice(self.iterate(account_ids, transaction_type,
+                                        start, end, before), limit))
+
+    def iterate(self, account_ids: Iterable[int],
+                transaction_type: Optional[TransactionType] = None,
+                start: Optional[datetime] = None,
+                end: Optional[datetime] = None,
+                before: Optional[Tuple[datetime, int]] = None
+                ) -> Iterator[ArchivedTransaction]:
+        """
+        Lazily yields what `scan` returns, reading one month of files at a
+        time, so that memory use does not grow with the archive.
+        """
+        files = sorted(((month, account_id) for account_id in set(account_ids)
+                        for month in self.months(account_id)), reverse=True)
+        for month, group in groupby(files, key=lambda file: file[0]):
+            if end is not None and _midnight(month) >= end:
+                continue
+            if start is not None and _midnight(add_months(month, 1)) <= start:
+                return
+            found: List[ArchivedTransaction] = []
+            for _, account_id in group:
+                table = self._filter(self.read(account_id, month),
+                                     transaction_type, start, end, before)
+                found.extend(_from_row(row) for row in table.to_pylist())
+            found.sort(key=lambda row: (row.created_at, row.transaction_id),
+                       reverse=True)
+            yield from found
+
+    @staticmethod
+    def _filter(table: 'pa.Table',
+                transaction_type: Optional[TransactionType],
+                start: Optional[datetime], end: Optional[datetime],
+                before: Optional[Tuple[datetime, int]]) -> 'pa.Table':
+        import pyarrow.compute as pc
+        mask = None
+        if transaction_type is not None:
+            mask = _and(mask, pc.equal(table['transaction_type'],
+                                       transaction_type.name))
+        if start is not None:
+            mask = _and(mask, pc.greater_equal(table['created_at'], start))
+        if end is not None:
+            mask = _and(mask, pc.less(table['created_at'], end))
+        if before is not None:
+            created_at, transaction_id = before
+            mask = _and(mask, pc.or_(
+                pc.less(table['created_at'], created_at),
+                pc.and_(pc.equal(table['created_at'], created_at),
+                        pc.less(table['transaction_id'], transaction_id))))
+        return table if mask is None else table.filter(mask)
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+def _and(mask: Any, condition: Any) -> Any:
+    import pyarrow.compute as pc
+    return condition if mask is None else pc.and_(mask, condition)
+
+
+def _from_row(row: Dict[str, Any]) -> ArchivedTransaction:
+    return ArchivedTransaction(
+        row['transaction_id'], row['account_id'],
+        TransactionType[row['transaction_type']], from_cents(row['amount']),
+        TransactionStatus[row['status']], row['created_at'], row['notes'])
+
+
+def _to_row(row: Any) -> Dict[str, Any]:
+    return {'transaction_id': row.transaction_id,
+            'account_id': row.account_id,
+            'transaction_type': row.transaction_type.name,
+            'amount': to_cents(row.amount),
+            'status': row.status.name,
+            'created_at': row.created_at,
+            'notes': row.notes}
+
+
+def archive_transactions(engine: Engine, archive: TransactionArchive,
+                         cutoff: Optional[datetime] = None) -> int:
+    """
+    Moves the transactions created before `cutoff` (default: older than
+    `ARCHIVE_AFTER_DAYS`) from the database into the archive, one month
+    at a time. Pending transactions stay in the database.
+
+    Each account-month file is written before its rows are deleted, so a
+    crash leaves rows in both places at worst, and re-running the
+    archival completes it.
+
+    Returns:
+        int: The number of transactions archived.
+    """
+    cutoff = cutoff or datetime.utcnow() - archive_after()
+    archivable = (Transaction.created_at < cutoff,
+                  Transaction.status != TransactionStatus.pending)
+    with engine.connect() as connection:
+        oldest = connection.execute(
+            select(func.min(Transaction.created_at)).where(*archivable)
+        ).scalar()
+    archived = 0
+    month = month_start(oldest) if oldest is not None else None
+    while month is not None and month <= cutoff.date():
+        in_month = (*archivable, Transaction.created_at >= _midnight(month),
+                    Transaction.created_at < _midnight(add_months(month, 1)))
+        with engine.connect() as connection:
+            account_ids = connection.execute(
+                select(Transaction.account_id).where(*in_month).distinct()
+                .order_by(Transaction.account_id)).scalars().all()
+        # a few accounts at a time, so that memory use stays bounded
+        for start in range(0, len(account_ids), _ACCOUNTS_PER_QUERY):
+            with engine.connect() as connection:
+                rows = connection.execute(
+                    select(Transaction.__table__).where(
+                        *in_month, Transaction.account_id.in_(
+                            account_ids[start:start + _ACCOUNTS_PER_QUERY]))
+                    .order_by(Transaction.account_id)).all()
+            for _, group in groupby(rows, key=lambda row: row.account_id):
+                archived += _move(engine, archive, month, list(group))
+        month = add_months(month, 1)
+    archive.horizon = cutoff
+    return archived
+
+
+def _move(engine: Engine, archive: TransactionArchive, month: date,
+          rows: List[Any]) -> int:
+    """Archives one account-month, then deletes its rows."""
+    archive.write(rows[0].account_id, month, [_to_row(row) for row in rows])
+    lower = min(row.created_at for row in rows)
+    upper = max(row.created_at for row in rows)
+    with engine.begin() as connection:
+        for start in range(0, len(rows), _DELETE_BATCH_SIZE):
+            ids = [row.transaction_id
+                   for row in rows[start:start + _DELETE_BATCH_SIZE]]
+            # the created_at bounds let PostgreSQL prune to one partition
+            connection.execute(delete(Transaction).where(
+                Transaction.created_at.between(lower, upper),
+                Transaction.transaction_id.in_(ids)))
+    return len(rows)
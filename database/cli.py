@@ -0,0 +1,212 @@
+import argparse
+import csv
+import sys
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Connection, Engine
+
+from database.archive import TransactionArchive, archive_transactions
+from database.init_db import create_engine_from_env, init_db
+from database.models import User, Account, Transaction, Role, IdempotencyKey
+from database.models import TransactionType, TransactionStatus
+from database.partitions import add_months, drop_partitions, month_start
+from database.partitions import ensure_partitions
+
+
+def _batches(rows: Iterable[Dict[str, str]],
+             size: int) -> Iterator[List[Dict[str, str]]]:
+    iterator = iter(rows)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _new_rows(connection: Connection, batch: List[Dict[str, str]],
+              seen_usernames: Set[str],
+              seen_emails: Set[str]) -> List[Dict[str, str]]:
+    """
+    Drop rows that are incomplete, repeat an earlier row of the file, or
+    clash with an existing username or email.
+    """
+    rows = []
+    for row in batch:
+        username = (row.get('username') or '').strip().lower()
+        email = (row.get('email') or '').strip()
+        if not username or not email or not row.get('password'):
+            continue
+        if username in seen_usernames or email in seen_emails:
+            continue
+        seen_usernames.add(username)
+        seen_emails.add(email)
+        rows.append({'username': username, 'email': email,
+                     'password': row['password']})
+    if not rows:
+        return rows
+    lowered = func.lower(User.username)
+    taken_usernames = set(connection.execute(
+        select(lowered).where(
+            lowered.in_([row['username'] for row in rows]))).scalars())
+    taken_emails = set(connection.execute(
+        select(User.email).where(
+            User.email.in_([row['email'] for row in rows]))).scalars())
+    return [row for row in rows
+            if row['username'] not in taken_usernames
+            and row['email'] not in taken_emails]
+
+
+def import_users(engine: Engine, lines: Iterable[str],
+                 batch_size: int = 1000, rounds: Optional[int] = None,
+                 workers: Optional[int] = None) -> int:
+    """
+    Bulk-import users from CSV (columns: username, email, password) with
+    the same starter accounts and opening deposits as registration.
+
+    Each batch is hashed in parallel, then written in one transaction with
+    three multi-row INSERTs (users, accounts, transactions); the ids of
+    new rows come back through RETURNING. Rows whose username or email
+    already exists are skipped, so an interrupted import can be re-run.
+
+    Returns:
+        int: The number of users imported.
+    """
+    from logic.password_hasher import PasswordHasher
+    from logic.user_auth import STARTER_ACCOUNTS
+
+    hasher = PasswordHasher(rounds=rounds, max_workers=workers)
+    imported = 0
+    seen_usernames: Set[str] = set()
+    seen_emails: Set[str] = set()
+    try:
+        for batch in _batches(csv.DictReader(lines), batch_size):
+            with engine.connect() as connection:
+                rows = _new_rows(connection, batch, seen_usernames,
+                                 seen_emails)
+            if not rows:
+                continue
+            # hash outside the transaction so no connection waits on bcrypt
+            hashes = hasher.hash_many(row['password'] for row in rows)
+            with engine.begin() as connection:
+                user_ids = connection.execute(
+                    insert(User).returning(User.user_id,
+                                           sort_by_parameter_order=True),
+                    [{'username': row['username'], 'email': row['email'],
+                      'password_hash': hashed, 'role': Role.user}
+                     for row, hashed in zip(rows, hashes)]).scalars().all()
+                accounts = [{'user_id': user_id, 'account_type': kind,
+                             'balance': balance}
+                            for user_id in user_ids
+                            for kind, balance in STARTER_ACCOUNTS]
+                account_ids = connection.execute(
+                    insert(Account).returning(Account.account_id,
+                                              sort_by_parameter_order=True),
+                    accounts).scalars().all()
+                connection.execute(insert(Transaction), [
+                    {'account_id': account_id,
+                     'transaction_type': TransactionType.deposit,
+                     'amount': account['balance'],
+                     'status': TransactionStatus.completed}
+                    for account_id, account in zip(account_ids, accounts)])
+                imported += len(user_ids)
+            print(f"Imported {imported} users", file=sys.stderr)
+    finally:
+        hasher.shutdown()
+    return imported
+
+
+def purge_idempotency_keys(engine: Engine) -> int:
+    """
+    Delete idempotency keys past their expiry.
+
+    Returns:
+        int: The number of keys deleted.
+    """
+    with engine.begin() as connection:
+        return connection.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.expires_at <= datetime.utcnow())).rowcount
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m database.cli",
+                                     description="Database maintenance.")
+    parser.add_argument("--database-url", default=None,
+                        help="overrides DATABASE_URL")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser(
+        "import-users", help="bulk-import users from a CSV file")
+    importer.add_argument("csv_file", type=argparse.FileType("r"),
+                          help="CSV with username,email,password columns")
+    importer.add_argument("--batch-size", type=int, default=1000)
+    importer.add_argument("--rounds", type=int, default=None,
+                          help="bcrypt cost for imported passwords; they "
+                               "are rehashed to BCRYPT_ROUNDS at login")
+    importer.add_argument("--workers", type=int, default=None,
+                          help="password hashing pool size")
+
+    commands.add_parser("purge-idempotency-keys",
+                        help="delete expired idempotency keys")
+
+    ensure = commands.add_parser(
+        "ensure-partitions",
+        help="create the transaction partitions of the coming months")
+    ensure.add_argument("--months-ahead", type=int, default=None,
+                        help="default: TRANSACTION_PARTITIONS_AHEAD")
+
+    dropper = commands.add_parser(
+        "drop-partitions",
+        help="detach and drop old transaction partitions")
+    dropper.add_argument("--keep-months", type=int, required=True,
+                         help="keep the current month and this many "
+                              "months before it")
+    dropper.add_argument("--detach-only", action="store_true",
+                         help="keep detached partitions as tables")
+
+    archiver = commands.add_parser(
+        "archive-transactions",
+        help="move old transactions into the archive files")
+    archiver.add_argument("--older-than-days", type=int, default=None,
+                          help="default: ARCHIVE_AFTER_DAYS")
+    archiver.add_argument("--archive-dir", default=None,
+                          help="default: TRANSACTION_ARCHIVE_DIR")
+
+    args = parser.parse_args(argv)
+    engine = create_engine_from_env(args.database_url)
+    init_db(engine)
+    try:
+        if args.command == "import-users":
+            with args.csv_file:
+                count = import_users(engine, args.csv_file,
+                                     batch_size=args.batch_size,
+                                     rounds=args.rounds,
+                                     workers=args.workers)
+            print(f"Imported {count} users.")
+        elif args.command == "purge-idempotency-keys":
+            print(f"Deleted {purge_idempotency_keys(engine)} expired keys.")
+        elif args.command == "ensure-partitions":
+            created = ensure_partitions(engine, ahead=args.months_ahead)
+            print(f"Created {len(created)} partitions: "
+                  f"{', '.join(created) or '-'}")
+        elif args.command == "drop-partitions":
+            before = add_months(month_start(datetime.utcnow()),
+                                -args.keep_months)
+            removed = drop_partitions(engine, before,
+                                      detach_only=args.detach_only)
+            action = "Detached" if args.detach_only else "Dropped"
+            print(f"{action} {len(removed)} partitions: "
+                  f"{', '.join(removed) or '-'}")
+        elif args.command == "archive-transactions":
+            cutoff = None
+            if args.older_than_days is not None:
+                cutoff = datetime.utcnow() - timedelta(
+                    days=args.older_than_days)
+            count = archive_transactions(
+                engine, TransactionArchive(args.archive_dir), cutoff)
+            print(f"Archived {count} transactions.")
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
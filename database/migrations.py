@@ -0,0 +1,244 @@
+import argparse
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional, cast
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table
+from sqlalchemy import func, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+from database.models import Account, Transaction, IdempotencyKey, User
+from database.partitions import partition_transactions
+
+# Kept out of Base.metadata so that create_all never creates it on its own:
+# a missing version table is how a pre-migration database is recognised.
+version_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version", version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False, default=datetime.utcnow),
+)
+
+# arbitrary key for the PostgreSQL advisory lock serialising migrations
+_MIGRATION_LOCK_KEY = 7_351_902
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    A single schema or data change.
+
+    Attributes:
+        version (int): Position in the migration sequence, starting at 1.
+        description (str): Short summary, recorded in `schema_version`.
+        upgrade (Callable): Applies the change on the given connection.
+    """
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def _create_indexes(*indexes: str) -> Callable[[Connection], None]:
+    """
+    Returns an upgrade step creating the named model indexes if missing.
+    """
+    def upgrade(connection: Connection) -> None:
+        tables = (Account.__table__, Transaction.__table__)
+        for table in tables:
+            for index in cast(Table, table).indexes:
+                if index.name in indexes:
+                    index.create(connection, checkfirst=True)
+    return upgrade
+
+
+MONEY_COLUMNS = (("accounts", "balance"), ("transactions", "amount"))
+
+
+def _money_to_cents(connection: Connection) -> None:
+    """
+    Converts the float money columns to integer cents. Columns that are
+    already integers are left alone.
+    """
+    inspector = inspect(connection)
+    for table, column in MONEY_COLUMNS:
+        declared = next(c['type'] for c in inspector.get_columns(table)
+                        if c['name'] == column)
+        if isinstance(declared, Integer):
+            continue
+        if connection.dialect.name == "postgresql":
+            connection.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT "
+                f"USING round({column}::numeric * 100)::bigint"))
+        else:
+            # SQLite cannot change a column's type; the values become
+            # whole numbers of cents, which the Money type reads back
+            connection.execute(text(
+                f"UPDATE {table} "
+                f"SET {column} = CAST(round({column} * 100) AS INTEGER)"))
+
+
+def _create_tables(*tables: Table) -> Callable[[Connection], None]:
+    """Returns an upgrade step creating the given tables if missing."""
+    def upgrade(connection: Connection) -> None:
+        for table in tables:
+            table.create(connection, checkfirst=True)
+    return upgrade
+
+
+def _add_ledger_version(connection: Connection) -> None:
+    """Adds `users.ledger_version`, starting every user at 1."""
+    columns = {c['name'] for c in inspect(connection).get_columns("users")}
+    if "ledger_version" not in columns:
+        connection.execute(text(
+            "ALTER TABLE users "
+            "ADD COLUMN ledger_version BIGINT NOT NULL DEFAULT 1"))
+
+
+def _add_idempotency_content_type(connection: Connection) -> None:
+    """Adds `idempotency_keys.content_type`, so replays keep their type."""
+    columns = {c['name']
+               for c in inspect(connection).get_columns("idempotency_keys")}
+    if "content_type" not in columns:
+        connection.execute(text(
+            "ALTER TABLE idempotency_keys ADD COLUMN content_type VARCHAR"))
+
+
+def _lowercase_usernames(connection: Connection) -> None:
+    """
+    Lowercases the usernames once (this used to run at every startup) and
+    adds the unique index on `lower(username)`.
+
+    Raises:
+        RuntimeError: If usernames differ only in case; those users have
+            to be merged or renamed by hand first.
+    """
+    users = cast(Table, User.__table__)
+    lowered = func.lower(users.c.username)
+    clashes = connection.execute(
+        select(lowered).group_by(lowered).having(func.count() > 1)
+    ).scalars().all()
+    if clashes:
+        raise RuntimeError("Usernames differing only in case: "
+                           + ", ".join(sorted(clashes)))
+    connection.execute(update(users).where(users.c.username != lowered)
+                       .values(username=lowered))
+    # checkfirst cannot see expression indexes on every dialect
+    connection.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_username_lower "
+        "ON users (lower(username))"))
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "indexes for the dashboard, history and login queries",
+              _create_indexes("ix_accounts_user_id",
+                              "ix_transactions_account_created",
+                              "ix_transactions_pending")),
+    Migration(2, "store money as integer cents", _money_to_cents),
+    Migration(3, "idempotency keys for transfers",
+              _create_tables(cast(Table, IdempotencyKey.__table__))),
+    Migration(4, "partition transactions by month (PostgreSQL)",
+              partition_transactions),
+    Migration(5, "ledger version per user", _add_ledger_version),
+    Migration(6, "lowercase usernames, unique index on lower(username)",
+              _lowercase_usernames),
+    Migration(7, "content type of stored idempotent responses",
+              _add_idempotency_content_type),
+]
+
+HEAD = MIGRATIONS[-1].version
+
+
+def current_version(connection: Connection) -> int:
+    """
+    Returns the latest applied migration, 0 for an unversioned database.
+    """
+    if not inspect(connection).has_table(schema_version.name):
+        return 0
+    version = connection.execute(
+        select(schema_version.c.version)
+        .order_by(schema_version.c.version.desc()).limit(1)).scalar()
+    return version or 0
+
+
+def _record(connection: Connection, migration: Migration) -> None:
+    connection.execute(schema_version.insert().values(
+        version=migration.version, description=migration.description,
+        applied_at=datetime.utcnow()))
+
+
+def _lock(connection: Connection) -> None:
+    """Keeps workers starting at the same time from migrating twice."""
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"),
+                           {'key': _MIGRATION_LOCK_KEY})
+
+
+def stamp(engine: Engine, version: int = HEAD) -> None:
+    """
+    Marks the database as being at `version` without running anything.
+    Used for databases whose tables were just created from the models.
+    """
+    with engine.begin() as connection:
+        _lock(connection)
+        version_metadata.create_all(connection)
+        applied = current_version(connection)
+        for migration in MIGRATIONS:
+            if applied < migration.version <= version:
+                _record(connection, migration)
+
+
+def migrate(engine: Engine, target: Optional[int] = None) -> List[int]:
+    """
+    Applies every pending migration up to `target` (default: all), each
+    in its own transaction. A database already at `target`, as it is at
+    every startup but the first after a release, is only read once; the
+    lock is taken when there is something to apply.
+
+    Returns:
+        list[int]: The versions that were applied.
+    """
+    target = HEAD if target is None else target
+    with engine.connect() as connection:
+        version = current_version(connection)
+    if version >= target:
+        return []
+    applied: List[int] = []
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        if migration.version > target:
+            break
+        with engine.begin() as connection:
+            _lock(connection)
+            version_metadata.create_all(connection)
+            if current_version(connection) >= migration.version:
+                continue
+            migration.upgrade(connection)
+            _record(connection, migration)
+            applied.append(migration.version)
+    return applied
+
+
+def main() -> None:
+    from database.init_db import get_engine
+    engine = get_engine()
+
+    parser = argparse.ArgumentParser(description="Apply schema migrations.")
+    parser.add_argument("--status", action="store_true",
+                        help="only print the current schema version")
+    parser.add_argument("--target", type=int, default=None,
+                        help="migrate up to this version")
+    args = parser.parse_args()
+
+    if not args.status:
+        for version in migrate(engine, args.target):
+            print(f"Applied migration {version}: "
+                  f"{MIGRATIONS[version - 1].description}")
+    with engine.connect() as connection:
+        print(f"Schema version: {current_version(connection)} (head {HEAD})")
+
+
+if __name__ == "__main__":
+    main()
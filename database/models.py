@@ -1,10 +1,15 @@
-from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, String, Float, Enum, ForeignKey, DateTime  # noqa: E501
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy import Integer, String, Enum, ForeignKey, DateTime, Index, LargeBinary, BigInteger, text  # noqa: E501
 from sqlalchemy.orm import relationship
 import enum
 from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
+from database.money import Money
 
-Base = declarative_base()
+
+class Base(DeclarativeBase):
+    """Base class of the mapped models."""
 
 # Enums
 
@@ -61,17 +66,28 @@ class User(Base):
         email (str): Unique email address of the user.
         password_hash (str): Hashed password for the user.
         role (Role): Role of the user, either user or admin.
+        ledger_version (int): Incremented in the same transaction as every
+            change to the user's balances or transactions; the ETag of the
+            user's read APIs.
         accounts (list[Account]): List of accounts associated with the user.
     """
     __tablename__ = "users"
+    __table_args__ = (
+        # logins and sign-ups look usernames up case-insensitively
+        Index("ix_users_username_lower", text("lower(username)"),
+              unique=True),
+    )
 
-    user_id = Column(Integer, primary_key=True, autoincrement=True)
-    username = Column(String, nullable=False, unique=True)
-    email = Column(String, nullable=False, unique=True)
-    password_hash = Column(String, nullable=False)
-    role = Column(Enum(Role), nullable=False)
+    user_id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, autoincrement=True)
+    username: Mapped[str] = mapped_column(String, nullable=False, unique=True)
+    email: Mapped[str] = mapped_column(String, nullable=False, unique=True)
+    password_hash: Mapped[str] = mapped_column(String, nullable=False)
+    role: Mapped[Role] = mapped_column(Enum(Role), nullable=False)
+    ledger_version: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=1, server_default=text("1"))
 
-    accounts = relationship("Account", back_populates="user")
+    accounts: Mapped[List["Account"]] = relationship(back_populates="user")
 
 
 class Account(Base):
@@ -82,20 +98,27 @@ class Account(Base):
         account_id (int): Unique identifier for the account.
         user_id (int): Foreign key referencing the user who owns the account.
         account_type (str): Type of the account (e.g., savings, checking).
-        balance (float): Current balance in the account.
+        balance (Decimal): Current balance in the account, stored in cents.
         created_at (datetime): Timestamp when the account was created.
         user (User): The user who owns the account.
         transactions (list[Transaction]): List of transactions for the account.
     """
     __tablename__ = "accounts"
-    account_id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
-    account_type = Column(String, nullable=False)
-    balance = Column(Float, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-
-    user = relationship("User", back_populates="accounts")
-    transactions = relationship("Transaction", back_populates="account")
+    __table_args__ = (
+        Index("ix_accounts_user_id", "user_id"),
+    )
+    account_id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.user_id"), nullable=False)
+    account_type: Mapped[str] = mapped_column(String, nullable=False)
+    balance: Mapped[Decimal] = mapped_column(Money, nullable=False)
+    created_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime, default=datetime.utcnow)
+
+    user: Mapped[User] = relationship(back_populates="accounts")
+    transactions: Mapped[List["Transaction"]] = relationship(
+        back_populates="account")
 
 
 class Transaction(Base):
@@ -106,22 +129,72 @@ class Transaction(Base):
         transaction_id (int): Unique identifier for the transaction.
         account_id (int): Foreign key referencing the account involved in the transaction.  # noqa: E501
         transaction_type (TransactionType): Type of the transaction (e.g., deposit, withdrawal).  # noqa: E501
-        amount (float): Amount of money involved in the transaction.
+        amount (Decimal): Amount of money involved in the transaction, stored in cents.  # noqa: E501
         status (TransactionStatus): Status of the transaction (e.g., pending, completed).  # noqa: E501
         created_at (datetime): Timestamp when the transaction was created.
         notes (str): Optional notes or description of the transaction.
         account (Account): The account associated with the transaction.
     """
     __tablename__ = "transactions"
-
-    transaction_id = Column(Integer, primary_key=True, autoincrement=True)
-    account_id = Column(
+    __table_args__ = (
+        # history and dashboard: newest transactions of an account first
+        Index("ix_transactions_account_created", "account_id",
+              text("created_at DESC"), text("transaction_id DESC")),
+        # pending transfer counts only ever look at the few pending rows
+        Index("ix_transactions_pending", "account_id",
+              postgresql_where=text("status = 'pending'"),
+              sqlite_where=text("status = 'pending'")),
+    )
+
+    transaction_id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, autoincrement=True)
+    account_id: Mapped[int] = mapped_column(
         Integer,
         ForeignKey("accounts.account_id"),
         nullable=False)
-    transaction_type = Column(Enum(TransactionType), nullable=False)
-    amount = Column(Float, nullable=False)
-    status = Column(Enum(TransactionStatus), nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    notes = Column(String, nullable=True)
-    account = relationship("Account", back_populates="transactions")
+    transaction_type: Mapped[TransactionType] = mapped_column(
+        Enum(TransactionType), nullable=False)
+    amount: Mapped[Decimal] = mapped_column(Money, nullable=False)
+    status: Mapped[TransactionStatus] = mapped_column(
+        Enum(TransactionStatus), nullable=False)
+    # the partition key on PostgreSQL, see database/partitions.py
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, nullable=False)
+    notes: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    account: Mapped[Account] = relationship(back_populates="transactions")
+
+
+class IdempotencyKey(Base):
+    """
+    A request made with an `Idempotency-Key` header and, once it finished,
+    the response to replay for retries of it.
+
+    Attributes:
+        key_hash (bytes): SHA-256 of the user, endpoint and header value.
+        request_hash (bytes): SHA-256 of the request body, to detect a key
+            reused for a different request.
+        status_code (int): Status of the stored response; NULL while the
+            original request is still being processed.
+        location (str): Location header of the stored response, if any.
+        content_type (str): Content-Type header of the stored response.
+        body (bytes): Body of the stored response.
+        created_at (datetime): When the key was first seen.
+        expires_at (datetime): When the key may be forgotten. While the
+            request is in progress, when its reservation lapses and a
+            retry may take the key over.
+    """
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+    key_hash: Mapped[bytes] = mapped_column(LargeBinary(32), primary_key=True)
+    request_hash: Mapped[bytes] = mapped_column(
+        LargeBinary(32), nullable=False)
+    status_code: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    location: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    content_type: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    body: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
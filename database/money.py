@@ -0,0 +1,86 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Any, Optional, Union
+
+from sqlalchemy import BigInteger
+from sqlalchemy.engine import Dialect
+from sqlalchemy.types import TypeDecorator
+
+CENT = Decimal("0.01")
+# the largest amount a BIGINT number of cents can hold
+MAX_AMOUNT = Decimal(2 ** 63 - 1) / 100
+
+MoneyLike = Union[Decimal, int, float, str]
+
+
+def to_money(value: MoneyLike) -> Decimal:
+    """
+    Converts a number to a Decimal rounded to whole cents.
+
+    Floats go through their shortest repr, so 0.1 becomes Decimal('0.10')
+    rather than the binary expansion of 0.1.
+
+    Raises:
+        ValueError: If the value is not a finite number, or too large for
+            the cents stored by `Money` (see `MAX_AMOUNT`).
+    """
+    try:
+        amount = Decimal(str(value)) if isinstance(value, float) \
+            else Decimal(value)
+    except (InvalidOperation, TypeError, ValueError) as e:
+        raise ValueError("Invalid amount.") from e
+    if not amount.is_finite():
+        raise ValueError("Invalid amount.")
+    if abs(amount) > MAX_AMOUNT:
+        raise ValueError("Amount out of range.")
+    try:
+        return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+    except InvalidOperation as e:
+        raise ValueError("Invalid amount.") from e
+
+
+def to_cents(value: MoneyLike) -> int:
+    """Converts a number to integer minor units (cents)."""
+    return int(to_money(value) * 100)
+
+
+def from_cents(cents: int) -> Decimal:
+    """Converts integer minor units (cents) to a Decimal amount."""
+    return (Decimal(int(cents)) / 100).quantize(CENT)
+
+
+def parse_amount(text: str) -> Decimal:
+    """
+    Parses a user supplied amount, which must be positive and have at
+    most two decimal places.
+
+    Raises:
+        ValueError: If the amount is malformed, not positive, has
+            fractions of a cent or is larger than `MAX_AMOUNT`.
+    """
+    try:
+        amount = Decimal(text.strip())
+    except (InvalidOperation, AttributeError) as e:
+        raise ValueError("Invalid amount.") from e
+    if not amount.is_finite() or amount <= 0 or amount != to_money(amount):
+        raise ValueError("Invalid amount.")
+    return to_money(amount)
+
+
+class Money(TypeDecorator[Decimal]):
+    """
+    Money column stored as a BIGINT number of cents and exposed as a
+    Decimal with two places, so sums and comparisons in SQL are exact.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[MoneyLike],
+                           dialect: Dialect) -> Optional[int]:
+        return None if value is None else to_cents(value)
+
+    def process_result_value(self, value: Optional[Any],
+                             dialect: Dialect) -> Optional[Decimal]:
+        return None if value is None else from_cents(value)
+
+    def coerce_compared_value(self, op: Any, value: Any) -> 'Money':
+        return self
@@ -0,0 +1,238 @@
+import os
+import re
+from datetime import date, datetime
+from typing import List, Optional, Union, cast
+
+from sqlalchemy import Table, text
+from sqlalchemy.engine import Connection, Engine
+
+from database.models import Transaction
+
+TABLE = "transactions"
+DEFAULT_PARTITION = f"{TABLE}_default"
+DEFAULT_MONTHS_AHEAD = 3
+
+_PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{4}})(\d{{2}})$")
+
+# arbitrary key for the PostgreSQL advisory lock serialising maintenance
+_PARTITION_LOCK_KEY = 7_351_903
+
+
+def months_ahead() -> int:
+    """
+    Returns how many months of future partitions are kept ready, from the
+    `TRANSACTION_PARTITIONS_AHEAD` environment variable.
+    """
+    return int(os.getenv("TRANSACTION_PARTITIONS_AHEAD",
+                         DEFAULT_MONTHS_AHEAD))
+
+
+def month_start(day: Union[date, datetime]) -> date:
+    """The first day of the month containing `day`."""
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    """The first day of the month `months` after `month`."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """Name of the partition holding the transactions of `month`."""
+    return f"{TABLE}_p{month.year:04d}{month.month:02d}"
+
+
+def is_partitioned(connection: Connection) -> bool:
+    """Whether the transactions table is a partitioned PostgreSQL table."""
+    if connection.dialect.name != "postgresql":
+        return False
+    return bool(connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+        "WHERE partrelid = to_regclass(:table))"), {'table': TABLE}).scalar())
+
+
+def partitions(connection: Connection) -> List[date]:
+    """The months that have a partition, oldest first."""
+    names = connection.execute(text(
+        "SELECT inhrelid::regclass::text FROM pg_inherits "
+        "WHERE inhparent = to_regclass(:table)"), {'table': TABLE}).scalars()
+    return sorted(date(int(match[1]), int(match[2]), 1)
+                  for match in map(_PARTITION_NAME.match, names) if match)
+
+
+def _lock(connection: Connection) -> None:
+    connection.execute(text("SELECT pg_advisory_xact_lock(:key)"),
+                       {'key': _PARTITION_LOCK_KEY})
+
+
+def _create_partition(connection: Connection, month: date) -> None:
+    """
+    Creates the partition of one month, moving any of its rows that
+    landed in the default partition into it first.
+    """
+    name = partition_name(month)
+    lower, upper = month.isoformat(), add_months(month, 1).isoformat()
+    connection.execute(text(
+        f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)"))
+    connection.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        f"WHERE created_at >= '{lower}' AND created_at < '{upper}' "
+        f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"))
+    connection.execute(text(
+        f"ALTER TABLE {TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{lower}') TO ('{upper}')"))
+
+
+def partition_transactions(connection: Connection,
+                           today: Optional[date] = None) -> None:
+    """
+    Turns the transactions table into one range partitioned by month of
+    `created_at`, with a default partition for rows outside the monthly
+    ones. Existing rows are copied over, keeping their ids and sequence.
+
+    PostgreSQL only, and a no-op once the table is partitioned. The
+    primary key becomes (transaction_id, created_at), since a partitioned
+    table's unique constraints must include the partition key.
+    """
+    if connection.dialect.name != "postgresql" or is_partitioned(connection):
+        return
+    _lock(connection)
+    old = f"{TABLE}_unpartitioned"
+    connection.execute(text(f"ALTER TABLE {TABLE} RENAME TO {old}"))
+    connection.execute(text(
+        f"ALTER TABLE {old} RENAME CONSTRAINT {TABLE}_pkey TO {old}_pkey"))
+    for index in cast(Table, Transaction.__table__).indexes:
+        connection.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    connection.execute(text(
+        f"UPDATE {old} SET created_at = now() AT TIME ZONE 'utc' "
+        f"WHERE created_at IS NULL"))
+
+    connection.execute(text(
+        f"CREATE TABLE {TABLE} (LIKE {old} INCLUDING DEFAULTS) "
+        f"PARTITION BY RANGE (created_at)"))
+    connection.execute(text(
+        f"ALTER TABLE {TABLE} ALTER COLUMN created_at SET NOT NULL"))
+    connection.execute(text(
+        f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+    oldest = connection.execute(text(
+        f"SELECT min(created_at) FROM {old}")).scalar()
+    month = month_start(oldest or today or datetime.utcnow())
+    last = add_months(month_start(today or datetime.utcnow()),
+                      months_ahead())
+    while month <= last:
+        _create_partition(connection, month)
+        month = add_months(month, 1)
+
+    connection.execute(text(f"INSERT INTO {TABLE} SELECT * FROM {old}"))
+    sequence = connection.execute(text(
+        "SELECT pg_get_serial_sequence(:table, 'transaction_id')"),
+        {'table': old}).scalar()
+    if sequence:
+        connection.execute(text(
+            f"ALTER SEQUENCE {sequence} OWNED BY {TABLE}.transaction_id"))
+    connection.execute(text(f"DROP TABLE {old}"))
+
+    connection.execute(text(
+        f"ALTER TABLE {TABLE} ADD PRIMARY KEY (transaction_id, created_at)"))
+    connection.execute(text(
+        f"ALTER TABLE {TABLE} ADD FOREIGN KEY (account_id) "
+        f"REFERENCES accounts (account_id)"))
+    for index in cast(Table, Transaction.__table__).indexes:
+        index.create(connection)
+
+
+def ensure_partitions(engine: Engine, ahead: Optional[int] = None,
+                      today: Optional[date] = None) -> List[str]:
+    """
+    Creates the partitions of the current month and the `ahead` months
+    after it (default `TRANSACTION_PARTITIONS_AHEAD`) that do not exist
+    yet. Does nothing unless the table is partitioned.
+
+    Returns:
+        list[str]: The names of the partitions created.
+    """
+    ahead = months_ahead() if ahead is None else ahead
+    created: List[str] = []
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            return created
+        _lock(connection)
+        existing = set(partitions(connection))
+        month = month_start(today or datetime.utcnow())
+        for _ in range(ahead + 1):
+            if month not in existing:
+                _create_partition(connection, month)
+                created.append(partition_name(month))
+            month = add_months(month, 1)
+    return created
+
+
+def drop_partitions(engine: Engine, before: date,
+                    detach_only: bool = False) -> List[str]:
+    """
+    Detaches and drops the monthly partitions that end on or before
+    `before`, which removes old transactions without the DELETE, vacuum
+    and index bloat a large purge causes. With `detach_only`, the
+    partitions are kept as standalone tables (e.g. to archive them).
+
+    Rows of those months in the default partition (inserted after their
+    month was dropped, or before it was created) are deleted as well,
+    or with `detach_only` moved to a standalone table of their own. The
+    default partition only holds such stragglers, so that stays small.
+
+    Returns:
+        list[str]: The names of the partitions removed, followed with
+        `detach_only` by the table the default partition's rows went to,
+        if it had any.
+    """
+    removed: List[str] = []
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            return removed
+        _lock(connection)
+        for month in partitions(connection):
+            if add_months(month, 1) > before:
+                break
+            name = partition_name(month)
+            connection.execute(text(
+                f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+            if not detach_only:
+                connection.execute(text(f"DROP TABLE {name}"))
+            removed.append(name)
+        archive = _drop_default_rows(connection, month_start(before),
+                                     detach_only)
+        if archive is not None:
+            removed.append(archive)
+    return removed
+
+
+def _default_archive_name(end: date) -> str:
+    """Name of the table archiving the default partition's old rows."""
+    return f"{DEFAULT_PARTITION}_before_{end.year:04d}{end.month:02d}"
+
+
+def _drop_default_rows(connection: Connection, end: date,
+                       detach_only: bool) -> Optional[str]:
+    """
+    Deletes the default partition's rows created before `end`, or with
+    `detach_only` moves them to a standalone table, whose name is
+    returned.
+    """
+    condition = f"created_at < '{end.isoformat()}'"
+    if not connection.execute(text(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+            f"WHERE {condition})")).scalar():
+        return None
+    if not detach_only:
+        connection.execute(text(
+            f"DELETE FROM {DEFAULT_PARTITION} WHERE {condition}"))
+        return None
+    name = _default_archive_name(end)
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} "
+        f"(LIKE {TABLE} INCLUDING DEFAULTS)"))
+    connection.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {condition} "
+        f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"))
+    return name
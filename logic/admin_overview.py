@@ -0,0 +1,111 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from sqlalchemy import func, select
+
+from database.init_db import DbSession
+from database.models import Account, User
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 500
+
+num_accounts = func.count(Account.account_id)
+total_balance = func.coalesce(func.sum(Account.balance), 0)
+
+SORT_COLUMNS: Dict[str, Any] = {
+    'id': User.user_id,
+    'username': User.username,
+    'accounts': num_accounts,
+    'balance': total_balance,
+}
+
+
+@dataclass
+class AdminPage:
+    """
+    One page of the admin user overview.
+
+    Attributes:
+        users (list[dict]): id, username, email, num_accounts and balance
+            of each user on the page.
+        page (int): The 1-based page number.
+        per_page (int): Users per page.
+        total (int): Number of users overall.
+        sort (str): The sort key, one of `SORT_COLUMNS`.
+        order (str): 'asc' or 'desc'.
+    """
+    users: List[Dict[str, Any]] = field(default_factory=list)
+    page: int = 1
+    per_page: int = DEFAULT_PER_PAGE
+    total: int = 0
+    sort: str = 'id'
+    order: str = 'asc'
+
+    @property
+    def pages(self) -> int:
+        """Number of pages overall."""
+        return max(1, -(-self.total // self.per_page))
+
+
+class AdminOverview:
+    """
+    Per-user account counts and balances, aggregated in the database
+    (users LEFT JOIN accounts ... GROUP BY) one page at a time.
+    """
+
+    def __init__(self, session: DbSession) -> None:
+        self._session = session
+
+    @property
+    def session(self) -> DbSession:
+        """Getter for the database session."""
+        return self._session
+
+    def page(self, page: int = 1, per_page: int = DEFAULT_PER_PAGE,
+             sort: str = 'id', order: str = 'asc') -> AdminPage:
+        """
+        Fetch one page of users sorted by `sort`, with the user id as
+        tie-breaker so pages are stable. The total user count comes from a
+        window function in the same statement.
+
+        Raises:
+            ValueError: If the sort key or order is unknown.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError("Invalid sort key.")
+        if order not in ('asc', 'desc'):
+            raise ValueError("Invalid sort order.")
+        page = max(1, page)
+        per_page = max(1, min(per_page, MAX_PER_PAGE))
+        column = SORT_COLUMNS[sort]
+        direction = column.desc() if order == 'desc' else column.asc()
+
+        rows = self._session.execute(
+            select(User.user_id, User.username, User.email,
+                   num_accounts.label('num_accounts'),
+                   total_balance.label('balance'),
+                   func.count().over().label('total'))
+            .outerjoin(Account, Account.user_id == User.user_id)
+            .group_by(User.user_id, User.username, User.email)
+            .order_by(direction, User.user_id)
+            .limit(per_page).offset((page - 1) * per_page)
+        ).all()
+
+        result = AdminPage(page=page, per_page=per_page, sort=sort,
+                           order=order)
+        result.users = [
+            {
+                'id': row.user_id,
+                'username': row.username,
+                'email': row.email,
+                'num_accounts': row.num_accounts,
+                'balance': row.balance,
+            }
+            for row in rows
+        ]
+        if rows:
+            result.total = rows[0].total
+        elif page > 1:
+            result.total = self._session.execute(
+                select(func.count()).select_from(User)).scalar_one()
+        return result
@@ -0,0 +1,193 @@
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from flask import Flask, request, send_from_directory, url_for
+from markupsafe import Markup, escape
+from werkzeug.wrappers import Response as WerkzeugResponse
+
+try:
+    import brotli  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# what each page loads, as bundle name -> source files under static/
+BUNDLES: Dict[str, Tuple[str, ...]] = {
+    'admin.css': ('css/sidebar.css', 'css/admin.css'),
+    'dashboard.css': ('css/sidebar.css', 'css/dashboard.css'),
+    'history.css': ('css/sidebar.css', 'css/history.css'),
+    'transfer.css': ('css/sidebar.css', 'css/transfer.css'),
+    'login.css': ('css/login.css',),
+    'registration.css': ('css/registration.css',),
+    'history.js': ('js/history.js',),
+    'transfer.js': ('js/transfer.js',),
+    'registration.js': ('js/registration.js',),
+}
+DIST_DIR = "dist"
+MANIFEST = "manifest.json"
+# fingerprinted files never change, so browsers may keep them for a year
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+_CSS_SPACE = re.compile(r"\s+")
+_CSS_PUNCTUATION = re.compile(r"\s*([{};,>])\s*")
+_JS_LINE_COMMENT = re.compile(r"^\s*//.*$", re.MULTILINE)
+
+
+def minify_css(text: str) -> str:
+    """Drops comments and the whitespace around CSS punctuation."""
+    text = _CSS_SPACE.sub(" ", _CSS_COMMENT.sub("", text))
+    text = _CSS_PUNCTUATION.sub(r"\1", text).replace(";}", "}")
+    return re.sub(r":\s+", ":", text).strip()
+
+
+def minify_js(text: str) -> str:
+    """
+    Drops indentation, blank lines and whole-line comments. Line breaks
+    are kept, since automatic semicolon insertion may depend on them.
+    """
+    lines = (line.strip() for line in _JS_LINE_COMMENT.sub("", text)
+             .splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def build_assets(static_folder: str,
+                 bundles: Optional[Dict[str, Sequence[str]]] = None
+                 ) -> Dict[str, str]:
+    """
+    Concatenates and minifies each bundle into `<static>/dist`, named
+    after the hash of its content, next to gzip (and, when the `brotli`
+    package is installed, brotli) compressed copies. Writes the manifest
+    mapping bundle names to the built files.
+
+    Returns:
+        dict[str, str]: The manifest.
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    manifest: Dict[str, str] = {}
+    for name, sources in (BUNDLES if bundles is None else bundles).items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_folder, source),
+                      encoding="utf-8") as f:
+                parts.append(f.read())
+        stem, extension = os.path.splitext(name)
+        minify = minify_css if extension == ".css" else minify_js
+        content = "\n".join(minify(part) for part in parts).encode("utf-8")
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        built = f"{stem}.{digest}{extension}"
+        path = os.path.join(dist, built)
+        with open(path, "wb") as f:
+            f.write(content)
+        # mtime=0 keeps the compressed files identical between builds
+        with open(path + ".gz", "wb") as f:
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + ".br", "wb") as f:
+                f.write(brotli.compress(content))
+        manifest[name] = built
+    with open(os.path.join(dist, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class StaticAssets:
+    """
+    Serves the bundles built by `build_assets` from `/assets/` with
+    far-future immutable caching, picking the brotli or gzip copy the
+    client accepts.
+
+    Templates link bundles with the `stylesheets` and `scripts` globals.
+    Without a built manifest (e.g. during development) they link the
+    source files through the regular static route instead.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        assert app.static_folder is not None
+        self._static_folder = app.static_folder
+        self._dist = os.path.join(app.static_folder, DIST_DIR)
+        self._manifest = self._load_manifest()
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.send)
+        app.add_template_global(self.stylesheets)
+        app.add_template_global(self.scripts)
+
+    @property
+    def manifest(self) -> Dict[str, str]:
+        """Getter for the bundle name -> built file mapping."""
+        return self._manifest
+
+    def _load_manifest(self) -> Dict[str, str]:
+        try:
+            with open(os.path.join(self._dist, MANIFEST),
+                      encoding="utf-8") as f:
+                manifest: Dict[str, str] = json.load(f)
+        except FileNotFoundError:
+            logger.info("No built assets in %s, serving the sources",
+                        self._dist)
+            return {}
+        return manifest
+
+    def urls(self, bundle: str) -> List[str]:
+        """The URLs to load for a bundle."""
+        if bundle in self._manifest:
+            return [url_for('assets', filename=self._manifest[bundle])]
+        return [url_for('static', filename=source)
+                for source in BUNDLES[bundle]]
+
+    def stylesheets(self, bundle: str) -> Markup:
+        """The `<link>` tags of a stylesheet bundle."""
+        return Markup("\n").join(
+            Markup('<link rel="stylesheet" href="%s">') % escape(url)
+            for url in self.urls(bundle))
+
+    def scripts(self, bundle: str) -> Markup:
+        """The deferred `<script>` tags of a script bundle."""
+        return Markup("\n").join(
+            Markup('<script src="%s" defer></script>') % escape(url)
+            for url in self.urls(bundle))
+
+    def send(self, filename: str) -> WerkzeugResponse:
+        """View of `/assets/<filename>`."""
+        mimetype = mimetypes.guess_type(filename)[0]
+        encoding = next((
+            (suffix, name) for suffix, name in (('.br', 'br'),
+                                                ('.gz', 'gzip'))
+            if request.accept_encodings[name]
+            and os.path.isfile(os.path.join(self._dist, filename + suffix))
+        ), None)
+        if encoding is None:
+            response = send_from_directory(self._dist, filename,
+                                           mimetype=mimetype, max_age=0)
+        else:
+            response = send_from_directory(
+                self._dist, filename + encoding[0], mimetype=mimetype,
+                max_age=0)
+            response.headers['Content-Encoding'] = encoding[1]
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Bundle, minify, fingerprint and precompress the "
+                    "static assets.")
+    parser.add_argument(
+        "--static-folder", default=os.path.abspath(os.path.join(
+            os.path.dirname(__file__), '../banking_app/static')))
+    args = parser.parse_args(argv)
+    for name, built in build_assets(args.static_folder).items():
+        print(f"{name} -> {DIST_DIR}/{built}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,434 @@
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional
+from typing import Tuple, Union, cast
+
+from sqlalchemy import Table, insert, select, update
+from sqlalchemy.orm import Session
+
+from database.models import Account, Transaction
+from database.models import TransactionType, TransactionStatus
+from database.money import MoneyLike, to_money
+from logic.ledger_version import bump_ledger_versions
+
+logger = logging.getLogger(__name__)
+
+# about 16 MiB of cached balances
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+Balances = Dict[int, Decimal]
+Changes = Tuple[Tuple[int, Decimal], ...]
+# (user_id, kind, ((account_id, delta), ...))
+Operation = Tuple[int, TransactionType, Changes]
+
+
+class _Overdraft(Exception):
+    """A journaled operation no longer fits the balance in the database."""
+
+
 class BankSystem:
-    def __init__(self):
+    """
+    Account balances kept in memory as `{user_id: {account_id: balance}}`.
+
+    Given a session factory, it becomes a read-through, write-behind cache
+    of the `accounts` table:
+
+    - a user's balances are loaded on first access and reloaded once
+      older than `max_age` seconds, so writes made by other processes
+      show up;
+    - the cached balances take at most about `max_bytes` of memory (as
+      estimated by `sys.getsizeof`), evicting the least recently used
+      users first;
+    - deposits, withdrawals and transfers update the cache at once and
+      are journaled; the journal is flushed in one transaction every
+      `flush_interval` seconds or once it holds `flush_batch_size`
+      operations. Flushing adds each change to the stored balance
+      (`balance = balance + delta`) instead of overwriting it, so it
+      never clobbers writes made elsewhere.
+
+    Recovery: users with unflushed operations are never evicted or
+    reloaded. A journaled operation that would overdraw the stored
+    balance (or hits a deleted account) is dropped and logged, and its
+    users are reloaded. If a flush fails, the journal is kept and retried.
+
+    Without a session factory it is a plain in-memory store.
+    """
+
+    def __init__(self,
+                 session_factory: Optional[Callable[[], Session]] = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES, max_age: float = 30.0,
+                 flush_interval: float = 1.0,
+                 flush_batch_size: int = 100) -> None:
         """
         Initialize BankSystem with a dictionary to store user accounts.
         """
-        self._accounts = {}
+        self._accounts: 'OrderedDict[int, Balances]' = OrderedDict()
+        self._loaded_at: Dict[int, float] = {}
+        self._owners: Dict[int, int] = {}
+        # estimated bytes held for each cached user, and their sum
+        self._sizes: Dict[int, int] = {}
+        self._size = 0
+        self._journal: List[Operation] = []
+        # number of journaled operations per user
+        self._dirty: Dict[int, int] = {}
+        # bumped whenever cached balances are changed or dropped from
+        # outside, so that a load racing with it is retried
+        self._generation = 0
+        self._session_factory = session_factory
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._flush_interval = flush_interval
+        self._flush_batch_size = flush_batch_size
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
 
     @property
-    def accounts(self):
+    def accounts(self) -> 'OrderedDict[int, Balances]':
         """Getter for user accounts."""
         return self._accounts
 
     @accounts.setter
-    def accounts(self, value):
+    def accounts(self, value: Mapping[int, Balances]) -> None:
         """Setter for user accounts."""
-        self._accounts = value
+        with self._lock:
+            self._generation += 1
+            self._accounts = OrderedDict(value)
+            now = time.monotonic()
+            self._loaded_at = {user_id: now for user_id in self._accounts}
+            self._owners = {account_id: user_id
+                            for user_id, balances in self._accounts.items()
+                            for account_id in balances}
+            self._sizes = {user_id: self._footprint(balances)
+                           for user_id, balances in self._accounts.items()}
+            self._size = sum(self._sizes.values())
 
-    def get_user_accounts(self, user_id):
+    @property
+    def max_bytes(self) -> int:
+        """Getter for the memory the cached balances may take."""
+        return self._max_bytes
+
+    @property
+    def size(self) -> int:
+        """Estimated bytes taken by the cached balances."""
+        return self._size
+
+    @property
+    def pending(self) -> int:
+        """Number of journaled operations not yet written to the database."""
+        return len(self._journal)
+
+    def get_user_accounts(self, user_id: int) -> Union[Balances, List[Any]]:
         """
         Get accounts for a specific user.
         """
-        return self._accounts.get(user_id, [])
+        balances = self._entry(user_id)
+        return [] if balances is None else balances
 
-    def deposit(self, user_id, account_id, amount):
+    def refresh(self, user_id: int, balances: Mapping[int, MoneyLike]) -> None:
         """
-        Deposit an amount into the specified user account
+        Cache balances of a user that were just read from the database
+        along with other data (e.g. the dashboard), so that the next
+        access does not load them again. A user with unflushed operations
+        keeps the cached balances, which include those operations.
         """
-        if user_id in self._accounts and account_id in self._accounts[user_id]:
-            self._accounts[user_id][account_id] += amount
+        with self._lock:
+            if self._session_factory is None or self._is_dirty(user_id):
+                return
+            self._generation += 1
+            self._drop(user_id)
+            self._store(user_id, {account_id: to_money(balance)
+                                  for account_id, balance in balances.items()})
 
-    def withdraw(self, user_id, account_id, amount):
+    def has_funds(self, user_id: int, account_id: int,
+                  amount: MoneyLike) -> bool:
+        """
+        Pre-check that an account of the user covers `amount`, from the
+        cache when possible. A shortfall is confirmed against the database
+        before it is reported. Unknown accounts pass, leaving the error to
+        the actual transfer.
+        """
+        amount = to_money(amount)
+        balances = self._entry(user_id)
+        with self._lock:
+            if balances is None or account_id not in balances:
+                return True
+            if balances[account_id] >= amount:
+                return True
+            if self._session_factory is None or self._is_dirty(user_id):
+                return False
+            if self._accounts.get(user_id) is balances:
+                self._drop(user_id)
+        balances = self._entry(user_id)
+        return balances is None or account_id not in balances \
+            or balances[account_id] >= amount
+
+    def deposit(self, user_id: int, account_id: int,
+                amount: MoneyLike) -> bool:
+        """
+        Deposit an amount into the specified user account.
+        Returns whether the deposit was applied.
+        """
+        amount = to_money(amount)
+        self._entry(user_id)
+        with self._lock:
+            balances = self._entry(user_id)
+            if balances is None or account_id not in balances:
+                return False
+            balances[account_id] = to_money(balances[account_id]) + amount
+            self._record(user_id, TransactionType.deposit,
+                         ((account_id, amount),))
+        return True
+
+    def withdraw(self, user_id: int, account_id: int,
+                 amount: MoneyLike) -> bool:
         """
         Withdraw an amount from the specified user.
+        Returns whether the withdrawal was applied.
         """
-        if user_id in self._accounts and account_id in self._accounts[user_id]:
-            if self._accounts[user_id][account_id] >= amount:
-                self._accounts[user_id][account_id] -= amount
+        amount = to_money(amount)
+        self._entry(user_id)
+        with self._lock:
+            balances = self._entry(user_id)
+            if balances is None or account_id not in balances:
+                return False
+            if balances[account_id] < amount:
+                return False
+            balances[account_id] = to_money(balances[account_id]) - amount
+            self._record(user_id, TransactionType.withdrawal,
+                         ((account_id, -amount),))
+        return True
 
-    def transfer_funds(self, user_id, from_account, to_account, amount):
+    def transfer_funds(self, user_id: int, from_account: int,
+                       to_account: int, amount: MoneyLike) -> bool:
         """
         Transfer funds between two user accounts.
+        Returns whether the transfer was applied.
+        """
+        amount = to_money(amount)
+        self._entry(user_id)
+        with self._lock:
+            balances = self._entry(user_id)
+            if balances is None or from_account not in balances \
+                    or to_account not in balances:
+                return False
+            if balances[from_account] < amount:
+                return False
+            balances[from_account] = to_money(balances[from_account]) - amount  # noqa: E501
+            balances[to_account] = to_money(balances[to_account]) + amount  # noqa: E501
+            self._record(user_id, TransactionType.transfer,
+                         ((from_account, -amount), (to_account, amount)))
+        return True
+
+    def apply_committed(self, changes: Mapping[int, MoneyLike]) -> None:
+        """
+        Update cached balances after a change that was already written to
+        the database by someone else (e.g. the transfer service), given
+        as `{account_id: delta}`. Accounts that are not cached are skipped.
+        """
+        with self._lock:
+            self._generation += 1
+            for account_id, delta in changes.items():
+                user_id = self._owners.get(account_id)
+                if user_id is not None and user_id in self._accounts:
+                    balances = self._accounts[user_id]
+                    balances[account_id] = to_money(balances[account_id]) \
+                        + to_money(delta)
+
+    def invalidate(self,
+                   account_ids: Optional[Iterable[int]] = None) -> None:
+        """
+        Forget the cached balances of the given accounts (all if None),
+        except those with unflushed operations, so that they are reloaded
+        on next access.
+        """
+        with self._lock:
+            self._generation += 1
+            users: Iterable[Optional[int]]
+            if account_ids is None:
+                users = list(self._accounts)
+            else:
+                users = {self._owners.get(account_id)
+                         for account_id in account_ids}
+            for user_id in users:
+                if user_id is not None and user_id in self._accounts \
+                        and not self._is_dirty(user_id):
+                    self._drop(user_id)
+
+    def flush(self) -> int:
+        """
+        Write the journaled operations to the database in one transaction.
+        Returns the number of operations written.
+        """
+        if self._session_factory is None:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                operations = list(self._journal)
+            if not operations:
+                return 0
+            try:
+                failed = self._write(operations)
+            except Exception:
+                logger.exception("Flushing %d balance changes failed; "
+                                 "they will be retried", len(operations))
+                self._schedule()
+                return 0
+            with self._lock:
+                del self._journal[:len(operations)]
+                for user_id, _, _ in operations:
+                    self._dirty[user_id] -= 1
+                    if not self._dirty[user_id]:
+                        del self._dirty[user_id]
+                for user_id, _, _ in failed:
+                    if not self._is_dirty(user_id):
+                        self._drop(user_id)
+            for operation in failed:
+                logger.error("Dropped cached %s that would overdraw: %s",
+                             operation[1].value, operation[2])
+            return len(operations) - len(failed)
+
+    def _write(self, operations: List[Operation]) -> List[Operation]:
+        """
+        Apply the operations as guarded relative updates, each in its own
+        savepoint. Returns the operations that would have overdrawn.
+        """
+        assert self._session_factory is not None
+        accounts = cast(Table, Account.__table__)
+        failed = []
+        with self._session_factory() as session:
+            with session.begin():
+                for operation in operations:
+                    user_id, kind, changes = operation
+                    try:
+                        with session.begin_nested():
+                            for account_id, delta in sorted(changes):
+                                # the connection's result has a rowcount
+                                result = session.connection().execute(
+                                    update(accounts).where(
+                                        accounts.c.account_id == account_id,
+                                        accounts.c.balance + delta >= 0)
+                                    .values(balance=accounts.c.balance
+                                            + delta))
+                                if result.rowcount != 1:
+                                    raise _Overdraft()
+                            session.execute(insert(Transaction), [
+                                self._transaction(kind, account_id, delta)
+                                for account_id, delta in changes])
+                            bump_ledger_versions(session, dict(changes))
+                    except _Overdraft:
+                        failed.append(operation)
+        return failed
+
+    @staticmethod
+    def _transaction(kind: TransactionType, account_id: int,
+                     delta: Decimal) -> Dict[str, Any]:
+        if kind == TransactionType.transfer:
+            kind = TransactionType.deposit if delta > 0 \
+                else TransactionType.withdrawal
+        return {'account_id': account_id, 'transaction_type': kind,
+                'amount': abs(delta), 'status': TransactionStatus.completed}
+
+    def _record(self, user_id: int, kind: TransactionType,
+                changes: Changes) -> None:
+        if self._session_factory is None:
+            return
+        self._journal.append((user_id, kind, changes))
+        self._dirty[user_id] = self._dirty.get(user_id, 0) + 1
+        if len(self._journal) >= self._flush_batch_size:
+            if not self._flush_lock.locked():
+                threading.Thread(target=self.flush, daemon=True).start()
+        else:
+            self._schedule()
+
+    def _schedule(self) -> None:
+        with self._lock:
+            if self._timer is None or not self._timer.is_alive():
+                self._timer = threading.Timer(self._flush_interval,
+                                              self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _timed_flush(self) -> None:
+        self.flush()
+        with self._lock:
+            if self._journal:
+                self._timer = None
+                self._schedule()
+
+    def _is_dirty(self, user_id: int) -> bool:
+        return user_id in self._dirty
+
+    def _is_stale(self, user_id: int) -> bool:
+        return self._session_factory is not None and \
+            time.monotonic() - self._loaded_at[user_id] > self._max_age
+
+    def _entry(self, user_id: int) -> Optional[Balances]:
+        """
+        The cached balances of a user, loading them on a miss or when they
+        are older than `max_age`. The database is read outside the lock;
+        the result is only cached if nothing changed the cache meanwhile,
+        and the load is retried otherwise. Mutators call this before
+        taking the lock, so that the call under the lock is a hit.
+        """
+        while True:
+            with self._lock:
+                balances = self._accounts.get(user_id)
+                if balances is not None:
+                    if not self._is_stale(user_id) or \
+                            self._is_dirty(user_id):
+                        self._accounts.move_to_end(user_id)
+                        return balances
+                    self._drop(user_id)
+                if self._session_factory is None:
+                    return None
+                generation = self._generation
+            with self._session_factory() as session:
+                rows = session.execute(
+                    select(Account.account_id, Account.balance)
+                    .where(Account.user_id == user_id)).all()
+            if not rows:
+                return None
+            with self._lock:
+                if user_id in self._accounts or \
+                        generation != self._generation:
+                    continue
+                balances = {row.account_id: row.balance for row in rows}
+                self._store(user_id, balances)
+                return balances
+
+    def _store(self, user_id: int, balances: Balances) -> None:
+        self._accounts[user_id] = balances
+        self._loaded_at[user_id] = time.monotonic()
+        self._owners.update((account_id, user_id) for account_id in balances)
+        self._sizes[user_id] = self._footprint(balances)
+        self._size += self._sizes[user_id]
+        self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used clean users above `max_bytes`."""
+        for user_id in list(self._accounts)[:-1]:
+            if self._size <= self._max_bytes:
+                break
+            if not self._is_dirty(user_id):
+                self._drop(user_id)
+
+    def _drop(self, user_id: int) -> None:
+        for account_id in self._accounts.pop(user_id, {}):
+            self._owners.pop(account_id, None)
+        self._loaded_at.pop(user_id, None)
+        self._size -= self._sizes.pop(user_id, 0)
+
+    @staticmethod
+    def _footprint(balances: Balances) -> int:
+        """
+        Estimated bytes held for a user: the balance dict with its keys
+        and values, and an entry in the account owner index per account.
         """
-        if user_id in self._accounts:
-            if from_account in self._accounts[user_id] and to_account in self._accounts[user_id]:  # noqa: E501
-                if self._accounts[user_id][from_account] >= amount:
-                    self._accounts[user_id][from_account] -= amount
-                    self._accounts[user_id][to_account] += amount
+        return sys.getsizeof(balances) + sum(
+            2 * sys.getsizeof(account_id) + sys.getsizeof(balance)
+            for account_id, balance in balances.items())
@@ -0,0 +1,347 @@
+import logging
+import os
+import pickle
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300.0
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_URL = "redis://localhost:6379/0"
+# how long a RESP server may take to answer before the cache gives up
+SOCKET_TIMEOUT = 0.25
+
+
+class CacheBackend(ABC):
+    """Key-value storage with a per-entry time to live."""
+
+    @abstractmethod
+    def get(self, key: str) -> Any:
+        """The value of a key, None if missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Store a value for `ttl` seconds."""
+
+    @abstractmethod
+    def delete(self, *keys: str) -> None:
+        """Forget the given keys."""
+
+
+class MemoryBackend(CacheBackend):
+    """
+    In-process dict with per-entry expiry, evicting the least recently
+    used entries beyond `max_entries`. Values are stored as they are, so
+    callers must not mutate what they put in or get out.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self._max_entries = max_entries
+        self._clock = clock
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_entries(self) -> int:
+        """Getter for the most entries kept."""
+        return self._max_entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+class RespError(Exception):
+    """An error reply from a RESP server."""
+
+
+class RespBackend(CacheBackend):
+    """
+    Client of a server speaking the Redis protocol (RESP), e.g. a local
+    Redis or a compatible stand-in, using GET, SET EX and DEL. Values are
+    pickled, so the server must only be reachable by this application.
+
+    The cache is an optimisation: when the server is unreachable or
+    slow, reads miss and writes are dropped instead of failing requests.
+    """
+
+    def __init__(self, url: str = DEFAULT_URL,
+                 timeout: float = SOCKET_TIMEOUT) -> None:
+        parsed = urlparse(url)
+        self._address = (parsed.hostname or "localhost", parsed.port or 6379)
+        self._database = int(parsed.path.lstrip("/") or 0)
+        self._password = parsed.password
+        self._timeout = timeout
+        self._socket: Optional[socket.socket] = None
+        self._reader: Any = None
+        self._lock = threading.Lock()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """Getter for the server's host and port."""
+        return self._address
+
+    def get(self, key: str) -> Any:
+        data = self._call_quietly("GET", key)
+        return pickle.loads(data) if data is not None else None
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self._call_quietly("SET", key, pickle.dumps(value), "PX",
+                           str(max(1, int(ttl * 1000))))
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self._call_quietly("DEL", *keys)
+
+    def close(self) -> None:
+        """Close the connection; the next command reconnects."""
+        with self._lock:
+            self._disconnect()
+
+    def _call_quietly(self, *args: Any) -> Any:
+        try:
+            return self.call(*args)
+        except (OSError, RespError) as e:
+            logger.warning("Cache server %s:%d failed: %s", *self._address, e)
+            return None
+
+    def call(self, *args: Any) -> Any:
+        """
+        Send one command and return its reply, connecting first if needed.
+
+        Raises:
+            OSError: If the server cannot be reached.
+            RespError: If the server answers with an error.
+        """
+        with self._lock:
+            try:
+                if self._socket is None:
+                    self._connect()
+                return self._command(args)
+            except OSError:
+                self._disconnect()
+                raise
+
+    def _connect(self) -> None:
+        self._socket = socket.create_connection(self._address,
+                                                timeout=self._timeout)
+        self._reader = self._socket.makefile("rb")
+        if self._password:
+            self._command(("AUTH", self._password))
+        if self._database:
+            self._command(("SELECT", str(self._database)))
+
+    def _disconnect(self) -> None:
+        if self._socket is not None:
+            self._reader.close()
+            self._socket.close()
+        self._socket = self._reader = None
+
+    def _command(self, args: Iterable[Any]) -> Any:
+        assert self._socket is not None
+        self._socket.sendall(encode_command(args))
+        return read_reply(self._reader)
+
+
+def encode_command(args: Iterable[Any]) -> bytes:
+    """A command as a RESP array of bulk strings."""
+    parts = [arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+             for arg in args]
+    chunks = [b"*%d\r\n" % len(parts)]
+    for part in parts:
+        chunks.append(b"$%d\r\n%s\r\n" % (len(part), part))
+    return b"".join(chunks)
+
+
+def read_reply(reader: Any) -> Any:
+    """
+    Read one RESP reply from a binary file object.
+
+    Raises:
+        RespError: For an error reply.
+        OSError: If the connection closed mid-reply.
+    """
+    line = reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("Connection closed by the cache server.")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode("utf-8")
+    if kind == b"-":
+        raise RespError(rest.decode("utf-8"))
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError("Connection closed by the cache server.")
+        return data[:-2]
+    if kind == b"*":
+        length = int(rest)
+        return None if length < 0 else [read_reply(reader)
+                                        for _ in range(length)]
+    raise RespError(f"Unexpected reply {line!r}")
+
+
+def backend_from_env() -> CacheBackend:
+    """
+    Returns the backend chosen by `USER_CACHE_BACKEND`: `memory` (default,
+    sized by `USER_CACHE_SIZE`) or `resp` (at `USER_CACHE_URL`).
+    """
+    kind = os.getenv("USER_CACHE_BACKEND", "memory")
+    if kind == "resp":
+        return RespBackend(os.getenv("USER_CACHE_URL", DEFAULT_URL))
+    if kind != "memory":
+        raise ValueError(f"Unknown cache backend: {kind}")
+    return MemoryBackend(int(os.getenv("USER_CACHE_SIZE",
+                                       DEFAULT_MAX_ENTRIES)))
+
+
+class UserCache:
+    """
+    Per-user cache of read models such as the dashboard and the account
+    list, stored under `user:<user_id>:<name>`.
+
+    Each entry is tagged with the user's ledger version when it was
+    loaded, and only served while the version is unchanged. The
+    invalidation hooks drop entries as soon as a route changes a user's
+    data; the version check also catches writes made elsewhere (other
+    processes, recipients of external transfers, write-behind flushes)
+    and a load racing with a write.
+    """
+
+    NAMES = ('dashboard', 'accounts')
+
+    def __init__(self, backend: Optional[CacheBackend] = None,
+                 ttl: Optional[float] = None,
+                 max_owners: int = DEFAULT_MAX_ENTRIES) -> None:
+        self._backend = backend or backend_from_env()
+        self._ttl = ttl if ttl is not None else float(os.getenv(
+            "USER_CACHE_TTL_SECONDS", DEFAULT_TTL))
+        # account -> owner, for the accounts this process cached most
+        # recently; a forgotten owner is still caught by the version check
+        self._owners: 'OrderedDict[int, int]' = OrderedDict()
+        self._max_owners = max_owners
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self) -> CacheBackend:
+        """Getter for the storage backend."""
+        return self._backend
+
+    @property
+    def ttl(self) -> float:
+        """Getter for how long entries live, in seconds."""
+        return self._ttl
+
+    @property
+    def max_owners(self) -> int:
+        """Getter for the most account owners remembered."""
+        return self._max_owners
+
+    @property
+    def hits(self) -> int:
+        """Getter for the number of lookups served from the cache."""
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """Getter for the number of lookups that had to load."""
+        return self._misses
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit and miss counters, for monitoring."""
+        with self._lock:
+            hits, misses = self._hits, self._misses
+        lookups = hits + misses
+        return {'backend': type(self._backend).__name__,
+                'hits': hits, 'misses': misses,
+                'hit_ratio': hits / lookups if lookups else 0.0}
+
+    @staticmethod
+    def key(user_id: int, name: str) -> str:
+        return f"user:{user_id}:{name}"
+
+    def load(self, user_id: int, name: str, version: Optional[int],
+             loader: Callable[[], Any],
+             account_ids: Callable[[Any], Iterable[int]] = lambda _: ()
+             ) -> Any:
+        """
+        Returns the cached value of `name` for the user at `version`, or
+        calls `loader` and caches what it returns (unless None).
+        `account_ids` lists the accounts a value covers, so that
+        `invalidate_accounts` can find its owner.
+        """
+        key = self.key(user_id, name)
+        entry = self._backend.get(key) if version is not None else None
+        if entry is not None and entry[0] == version:
+            with self._lock:
+                self._hits += 1
+            return entry[1]
+        with self._lock:
+            self._misses += 1
+        value = loader()
+        if value is not None and version is not None:
+            self._backend.set(key, (version, value), self._ttl)
+            with self._lock:
+                for account_id in account_ids(value):
+                    self._owners[account_id] = user_id
+                    self._owners.move_to_end(account_id)
+                while len(self._owners) > self._max_owners:
+                    self._owners.popitem(last=False)
+        return value
+
+    def invalidate(self, *user_ids: Optional[int]) -> None:
+        """Drop every cached entry of the given users."""
+        self._backend.delete(*(self.key(user_id, name)
+                               for user_id in user_ids if user_id is not None
+                               for name in self.NAMES))
+
+    def invalidate_accounts(self, account_ids: Iterable[int]) -> List[int]:
+        """
+        Drop the entries of the owners of the given accounts, as far as
+        this process has seen them.
+
+        Returns:
+            list[int]: The users invalidated.
+        """
+        with self._lock:
+            users = sorted({self._owners[account_id]
+                            for account_id in account_ids
+                            if account_id in self._owners})
+        self.invalidate(*users)
+        return users
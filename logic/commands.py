@@ -0,0 +1,339 @@
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from database.models import Account, Transaction
+from database.models import TransactionType, TransactionStatus
+from database.money import MoneyLike, to_money
+from logic.ledger_version import bump_ledger_versions
+from logic.transfer_service import InsufficientFunds, TransferError
+from logic.transfer_service import TransferService, is_retryable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_SIZE = 100
+DEFAULT_MAX_WAIT = 0.002
+
+
+class DbCommand(ABC):
+    """
+    A balance change applied inside a transaction shared with other
+    commands. `apply` must not commit; it raises `TransferError` to reject
+    the command, which only rolls back that command.
+    """
+
+    @abstractmethod
+    def apply(self, session: Session) -> Any:
+        """Apply the command in the session's current transaction."""
+
+    @abstractmethod
+    def compensation(self) -> 'DbCommand':
+        """The command that undoes this one once it has been applied."""
+
+
+class DbDepositCommand(DbCommand):
+    """
+    Deposit into an account; with a `user_id`, only into an account of
+    that user.
+    """
+
+    def __init__(self, account_id: int, amount: MoneyLike,
+                 user_id: Optional[int] = None) -> None:
+        self._account_id = account_id
+        self._amount = _positive(amount)
+        self._user_id = user_id
+
+    @property
+    def amount(self) -> Decimal:
+        """Getter for the amount."""
+        return self._amount
+
+    def apply(self, session: Session) -> Decimal:
+        """
+        Returns:
+            Decimal: The new balance of the account.
+        """
+        return _post(session, self._account_id, self._amount, self._user_id,
+                     TransactionType.deposit)
+
+    def compensation(self) -> 'DbWithdrawCommand':
+        return DbWithdrawCommand(self._account_id, self._amount)
+
+
+class DbWithdrawCommand(DbCommand):
+    """
+    Withdraw from an account unless that would overdraw it; with a
+    `user_id`, only from an account of that user.
+    """
+
+    def __init__(self, account_id: int, amount: MoneyLike,
+                 user_id: Optional[int] = None) -> None:
+        self._account_id = account_id
+        self._amount = _positive(amount)
+        self._user_id = user_id
+
+    @property
+    def amount(self) -> Decimal:
+        """Getter for the amount."""
+        return self._amount
+
+    def apply(self, session: Session) -> Decimal:
+        """
+        Returns:
+            Decimal: The new balance of the account.
+        """
+        return _post(session, self._account_id, -self._amount, self._user_id,
+                     TransactionType.withdrawal)
+
+    def compensation(self) -> DbDepositCommand:
+        return DbDepositCommand(self._account_id, self._amount)
+
+
+class DbTransferCommand(DbCommand):
+    """
+    Transfer between accounts with the rules of `TransferService`.
+    """
+
+    def __init__(self, user_id: Optional[int], from_account_id: int,
+                 to_account_id: int, amount: MoneyLike,
+                 external: bool = False) -> None:
+        self._user_id = user_id
+        self._from_account_id = from_account_id
+        self._to_account_id = to_account_id
+        self._amount = _positive(amount)
+        self._external = external
+
+    @property
+    def amount(self) -> Decimal:
+        """Getter for the amount."""
+        return self._amount
+
+    def apply(self, session: Session) -> Decimal:
+        """
+        Returns:
+            Decimal: The new balance of the source account.
+        """
+        return TransferService(session).apply(
+            self._user_id, self._from_account_id, self._to_account_id,
+            self._amount, self._external).from_balance
+
+    def compensation(self) -> 'DbTransferCommand':
+        # the money goes back even if the target belongs to another user
+        return DbTransferCommand(None, self._to_account_id,
+                                 self._from_account_id, self._amount)
+
+
+def _positive(amount: MoneyLike) -> Decimal:
+    """
+    Raises:
+        ValueError: If the amount is not a positive number of cents.
+    """
+    amount = to_money(amount)
+    if amount <= 0:
+        raise ValueError("Invalid amount.")
+    return amount
+
+
+def _post(session: Session, account_id: int, change: Decimal,
+          user_id: Optional[int], kind: TransactionType) -> Decimal:
+    """
+    Add `change` to a balance, refusing to take it below zero, and record
+    the transaction.
+    """
+    statement = update(Account).where(Account.account_id == account_id)
+    if user_id is not None:
+        statement = statement.where(Account.user_id == user_id)
+    if change < 0:
+        statement = statement.where(Account.balance >= -change)
+    balance = session.execute(
+        statement.values(balance=Account.balance + change)
+        .returning(Account.balance),
+        execution_options={'synchronize_session': False}).scalar()
+    if balance is None:
+        exists = session.get(Account, account_id)
+        if change < 0 and exists is not None and (
+                user_id is None or exists.user_id == user_id):
+            raise InsufficientFunds()
+        raise TransferError("Invalid account.")
+    session.execute(insert(Transaction), [{
+        'account_id': account_id, 'transaction_type': kind,
+        'amount': abs(change), 'status': TransactionStatus.completed}])
+    bump_ledger_versions(session, [account_id])
+    return balance
+
+
+# the buses of this process, whose queue and worker a forked child resets
+_buses: 'weakref.WeakSet[CommandBus]' = weakref.WeakSet()
+
+
+def _reset_after_fork() -> None:
+    for bus in list(_buses):
+        bus._queue = queue.Queue()
+        bus._worker = None
+        bus._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+@dataclass
+class _Pending:
+    command: DbCommand
+    future: 'Future[Any]' = field(default_factory=Future)
+
+
+class CommandBus:
+    """
+    Group commit executor for database commands.
+
+    Commands submitted from any thread are queued; a single worker takes up
+    to `max_batch_size` of them, waiting at most `max_wait` seconds for the
+    batch to fill, and applies them in one transaction with one commit.
+    Each command runs in its own savepoint, so a rejected command does not
+    affect the others. Callers get a future resolving to the command's
+    result once the batch has committed. A forked child process starts
+    with an empty queue and a worker of its own.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session],
+                 max_batch_size: Optional[int] = None,
+                 max_wait: Optional[float] = None,
+                 max_retries: int = 3,
+                 backoff: float = 0.01) -> None:
+        self._session_factory = session_factory
+        self._max_batch_size = max_batch_size or int(os.getenv(
+            "COMMAND_BATCH_SIZE", DEFAULT_MAX_BATCH_SIZE))
+        self._max_wait = max_wait if max_wait is not None else float(
+            os.getenv("COMMAND_MAX_WAIT_MS", DEFAULT_MAX_WAIT * 1000)) / 1000
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._queue: 'queue.Queue[Optional[_Pending]]' = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        _buses.add(self)
+
+    @property
+    def max_batch_size(self) -> int:
+        """Getter for the largest number of commands per commit."""
+        return self._max_batch_size
+
+    @property
+    def max_wait(self) -> float:
+        """Getter for how long a batch waits to fill, in seconds."""
+        return self._max_wait
+
+    def submit(self, command: DbCommand) -> 'Future[Any]':
+        """Queue a command, returning a future for its result."""
+        pending = _Pending(command)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Command bus is shut down.")
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="command-bus", daemon=True)
+                self._worker.start()
+            self._queue.put(pending)
+        return pending.future
+
+    def execute(self, command: DbCommand,
+                timeout: Optional[float] = None) -> Any:
+        """Submit a command and wait for its result."""
+        return self.submit(command).result(timeout)
+
+    def undo(self, command: DbCommand) -> 'Future[Any]':
+        """Queue the compensation of an applied command."""
+        return self.submit(command.compensation())
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting commands; queued commands are still applied."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            worker = self._worker
+            self._queue.put(None)
+        if wait and worker is not None:
+            worker.join()
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self._max_wait
+            stop = False
+            while len(batch) < self._max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) \
+                        if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch: List[_Pending]) -> None:
+        """
+        Apply and commit a batch, retrying transient failures with jittered
+        exponential backoff. If the batch keeps failing, each command is
+        committed on its own so a single bad command cannot fail the rest.
+        """
+        for attempt in range(self._max_retries + 1):
+            try:
+                outcomes = self._apply(batch)
+            except DBAPIError as e:
+                if is_retryable(e) and attempt < self._max_retries:
+                    time.sleep(self._backoff * 2 ** attempt
+                               * (1 + random.random()))
+                    continue
+                if len(batch) > 1:
+                    logger.warning("Group commit of %d commands failed, "
+                                   "committing them one by one", len(batch))
+                    for pending in batch:
+                        self._commit([pending])
+                    return
+                batch[0].future.set_exception(e)
+                return
+            except Exception as e:
+                for pending in batch:
+                    pending.future.set_exception(e)
+                return
+            for pending, (result, error) in zip(batch, outcomes):
+                if error is not None:
+                    pending.future.set_exception(error)
+                else:
+                    pending.future.set_result(result)
+            return
+
+    def _apply(self, batch: List[_Pending]) -> List[Any]:
+        outcomes: List[Any] = []
+        with self._session_factory() as session:
+            with session.begin():
+                for pending in batch:
+                    try:
+                        with session.begin_nested():
+                            outcomes.append(
+                                (pending.command.apply(session), None))
+                    except TransferError as e:
+                        outcomes.append((None, e))
+        return outcomes
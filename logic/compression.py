@@ -0,0 +1,54 @@
+import gzip
+import os
+from typing import Optional
+
+from flask import Flask, request
+from werkzeug.wrappers import Response as WerkzeugResponse
+
+DEFAULT_MIN_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = frozenset({'text/html', 'application/json'})
+# fast levels compress HTML and JSON almost as well as level 9
+COMPRESS_LEVEL = 6
+
+
+def compress_min_size() -> int:
+    """
+    Returns the smallest response body worth compressing, in bytes, from
+    the `COMPRESS_MIN_SIZE` environment variable.
+    """
+    return int(os.getenv("COMPRESS_MIN_SIZE", DEFAULT_MIN_SIZE))
+
+
+class ResponseCompression:
+    """
+    Gzips HTML and JSON responses of at least `min_size` bytes for clients
+    that accept it. Streamed responses (e.g. exports), responses that are
+    already encoded and anything but 200s are sent as they are.
+    """
+
+    def __init__(self, app: Flask, min_size: Optional[int] = None) -> None:
+        self._min_size = compress_min_size() if min_size is None \
+            else min_size
+        app.after_request(self.compress)
+
+    @property
+    def min_size(self) -> int:
+        """Getter for the smallest body that is compressed, in bytes."""
+        return self._min_size
+
+    def compress(self, response: WerkzeugResponse) -> WerkzeugResponse:
+        """After request hook compressing the response if worthwhile."""
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.status_code != 200 or response.is_streamed \
+                or response.direct_passthrough \
+                or 'Content-Encoding' in response.headers \
+                or not request.accept_encodings['gzip']:
+            return response
+        body = response.get_data()
+        if len(body) < self._min_size:
+            return response
+        response.set_data(gzip.compress(body, compresslevel=COMPRESS_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
@@ -0,0 +1,223 @@
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, List, Mapping, Optional, Sequence
+
+from sqlalchemy import Select, case, func, literal, select, true, union_all
+
+from database.init_db import DbSession
+from database.models import Account, Transaction, User
+from database.models import TransactionType, TransactionStatus
+
+RECENT_LIMIT = 5
+# first look for recent activity in the newest partitions only
+RECENT_WINDOW = timedelta(days=31)
+
+INCOME_TYPES = (TransactionType.deposit,)
+EXPENSE_TYPES = (TransactionType.withdrawal, TransactionType.transfer)
+
+
+@dataclass
+class AccountSummary:
+    """
+    Attributes:
+        account_id (int): Unique identifier for the account.
+        account_type (str): Type of the account.
+        balance (Decimal): Current balance in the account.
+    """
+    account_id: int
+    account_type: str
+    balance: Decimal
+
+
+@dataclass
+class ActivityItem:
+    """
+    Attributes:
+        transaction_id (int): Unique identifier for the transaction.
+        created_at (datetime): Timestamp when the transaction was created.
+        transaction_type (TransactionType): Type of the transaction.
+        amount (Decimal): Amount of money involved in the transaction.
+    """
+    transaction_id: int
+    created_at: datetime
+    transaction_type: TransactionType
+    amount: Decimal
+
+
+@dataclass
+class DashboardData:
+    """
+    Everything the dashboard page renders for one user.
+    """
+    user_name: str
+    accounts: List[AccountSummary] = field(default_factory=list)
+    recent_income: List[ActivityItem] = field(default_factory=list)
+    recent_expenses: List[ActivityItem] = field(default_factory=list)
+    pending_transfers: int = 0
+
+    @property
+    def total_balance(self) -> Decimal:
+        """Sum of the balances of all the user's accounts."""
+        return sum((account.balance for account in self.accounts),
+                   Decimal("0.00"))
+
+
+def with_balances(accounts: Sequence[AccountSummary],
+                  balances: Mapping[int, Decimal]) -> List[AccountSummary]:
+    """
+    The accounts with the balances of `balances` (e.g. those of the
+    `BankSystem` cache, which include changes not yet written to the
+    database) where it has them.
+    """
+    return [replace(account, balance=balances[account.account_id])
+            if account.account_id in balances else account
+            for account in accounts]
+
+
+class DashboardService:
+    """
+    Loads the dashboard in two statements: the user with their accounts and
+    pending transfer count, then the most recent income and expenses. On
+    PostgreSQL a third one searches the whole history when the newest
+    partitions do not hold enough recent activity.
+    """
+
+    def __init__(self, session: DbSession,
+                 recent_limit: int = RECENT_LIMIT,
+                 recent_window: Optional[timedelta] = RECENT_WINDOW) -> None:
+        self._session = session
+        self._recent_limit = recent_limit
+        self._recent_window = recent_window
+
+    @property
+    def session(self) -> DbSession:
+        """Getter for the database session."""
+        return self._session
+
+    def load(self, user_id: int) -> Optional[DashboardData]:
+        """
+        Returns the dashboard data of a user, or None if there is no such
+        user.
+        """
+        rows = self._session.execute(self._accounts_statement(user_id)).all()
+        if not rows:
+            return None
+        data = DashboardData(user_name=rows[0].username,
+                             pending_transfers=rows[0].pending or 0)
+        data.accounts = [
+            AccountSummary(row.account_id, row.account_type, row.balance)
+            for row in rows if row.account_id is not None
+        ]
+        if not data.accounts:
+            return data
+
+        for row in self._recent_rows(user_id):
+            item = ActivityItem(row.transaction_id, row.created_at,
+                                row.transaction_type, row.amount)
+            if row.kind == 'income':
+                data.recent_income.append(item)
+            else:
+                data.recent_expenses.append(item)
+        return data
+
+    def accounts(self, user_id: int) -> List[AccountSummary]:
+        """The user's accounts with their balances, by account id."""
+        rows = self._session.execute(
+            select(Account.account_id, Account.account_type, Account.balance)
+            .where(Account.user_id == user_id).order_by(Account.account_id))
+        return [AccountSummary(row.account_id, row.account_type, row.balance)
+                for row in rows]
+
+    def _accounts_statement(self, user_id: int) -> Select[Any]:
+        """
+        The user's accounts, each row also carrying the username and the
+        number of the user's pending transactions (counted through the
+        partial pending index).
+        """
+        pending = select(func.count()).select_from(Transaction).join(
+            Account).where(Account.user_id == user_id,
+                           Transaction.status == TransactionStatus.pending
+                           ).scalar_subquery()
+        return select(
+            User.username, Account.account_id, Account.account_type,
+            Account.balance, pending.label('pending')
+        ).outerjoin(Account, Account.user_id == User.user_id).where(
+            User.user_id == user_id).order_by(Account.account_id)
+
+    def _recent_rows(self, user_id: int) -> Sequence[Any]:
+        """
+        On PostgreSQL, where transactions are partitioned by month, the
+        newest transactions are first looked up within `recent_window`, so
+        that only the latest partitions are scanned. The whole history is
+        only searched if that does not fill both lists.
+        """
+        if self._recent_window is not None and \
+                self._session.get_bind().dialect.name == "postgresql":
+            since = datetime.utcnow() - self._recent_window
+            rows = self._session.execute(
+                self._recent_statement(user_id, since)).all()
+            kinds = [row.kind for row in rows]
+            if kinds.count('income') >= self._recent_limit and \
+                    kinds.count('expense') >= self._recent_limit:
+                return rows
+        return self._session.execute(self._recent_statement(user_id)).all()
+
+    def _recent_statement(self, user_id: int,
+                          since: Optional[datetime] = None) -> Select[Any]:
+        """
+        The newest `recent_limit` income and expense transactions, ranked
+        per kind with a window function.
+        """
+        if self._session.get_bind().dialect.name == "postgresql":
+            candidates = self._lateral_candidates(user_id, since)
+        else:
+            kind = case(
+                (Transaction.transaction_type.in_(INCOME_TYPES),
+                 literal('income')),
+                else_=literal('expense'))
+            candidates = select(
+                Transaction.transaction_id, Transaction.created_at,
+                Transaction.transaction_type, Transaction.amount,
+                kind.label('kind')
+            ).join(Account).where(Account.user_id == user_id).subquery()
+
+        ranked = select(
+            candidates,
+            func.row_number().over(
+                partition_by=candidates.c.kind,
+                order_by=(candidates.c.created_at.desc(),
+                          candidates.c.transaction_id.desc())
+            ).label('rank')
+        ).subquery()
+        return select(ranked).where(
+            ranked.c.rank <= self._recent_limit).order_by(
+            ranked.c.kind, ranked.c.rank)
+
+    def _lateral_candidates(self, user_id: int,
+                            since: Optional[datetime] = None) -> Any:
+        """
+        Top-N per account and kind through LATERAL subqueries, so that
+        each account only reads the head of its created_at index instead
+        of the user's whole history. A `since` bound lets PostgreSQL prune
+        the older partitions.
+        """
+        def top(kind: str, types: Sequence[TransactionType]) -> Select[Any]:
+            query = select(
+                Transaction.transaction_id, Transaction.created_at,
+                Transaction.transaction_type, Transaction.amount
+            ).where(
+                Transaction.account_id == Account.account_id,
+                Transaction.transaction_type.in_(types)
+            )
+            if since is not None:
+                query = query.where(Transaction.created_at >= since)
+            newest = query.order_by(
+                Transaction.created_at.desc(),
+                Transaction.transaction_id.desc()
+            ).limit(self._recent_limit).lateral()
+            return select(newest, literal(kind).label('kind')).select_from(
+                Account).join(newest, true()).where(Account.user_id == user_id)
+
+        return union_all(top('income', INCOME_TYPES),
+                         top('expense', EXPENSE_TYPES)).subquery()
@@ -0,0 +1,254 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Any, Callable, Optional, Tuple
+
+from flask import make_response, request, session
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.wrappers import Response as WerkzeugResponse
+
+from database.init_db import DbSession
+from database.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+DEFAULT_TTL = timedelta(hours=24)
+# how long a request may hold its key before a retry can take it over
+DEFAULT_LEASE = timedelta(seconds=60)
+DEFAULT_CACHE_SIZE = 10_000
+
+
+class IdempotencyConflict(Exception):
+    """
+    The key is in use by a request that is still running, or was used
+    for a different request.
+
+    Attributes:
+        status_code (int): 409 or 422, to answer the client with.
+    """
+
+    def __init__(self, message: str, status_code: int) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    """
+    The parts of a response needed to replay it.
+    """
+    status_code: int
+    body: bytes
+    location: Optional[str]
+    content_type: Optional[str]
+    request_hash: bytes
+    expires_at: datetime
+
+    def to_response(self) -> WerkzeugResponse:
+        response = make_response(self.body, self.status_code)
+        if self.location:
+            response.headers['Location'] = self.location
+        if self.content_type:
+            response.headers['Content-Type'] = self.content_type
+        response.headers[REPLAYED_HEADER] = "true"
+        return response
+
+
+def _ttl_from_env() -> timedelta:
+    seconds = os.getenv("IDEMPOTENCY_TTL_SECONDS")
+    return timedelta(seconds=int(seconds)) if seconds else DEFAULT_TTL
+
+
+class IdempotencyStore:
+    """
+    Remembers the response to each idempotency key for `ttl`.
+
+    A key is reserved (inserted with no response) and committed before the
+    request runs, so a concurrent retry sees the reservation instead of
+    running the request a second time. The reservation is a lease: if the
+    request has not finished after `lease` (e.g. its worker died), a retry
+    takes the key over. Finished responses are immutable,
+    so they are also kept in a bounded in-process LRU cache and replayed
+    without a database round trip.
+    """
+
+    def __init__(self, session: DbSession, ttl: Optional[timedelta] = None,
+                 cache_size: int = DEFAULT_CACHE_SIZE,
+                 lease: timedelta = DEFAULT_LEASE) -> None:
+        self._session = session
+        self._ttl = ttl or _ttl_from_env()
+        self._lease = lease
+        self._cache_size = cache_size
+        self._cache: 'OrderedDict[bytes, StoredResponse]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self) -> timedelta:
+        """Getter for how long keys are remembered."""
+        return self._ttl
+
+    @property
+    def lease(self) -> timedelta:
+        """Getter for how long a running request holds its key."""
+        return self._lease
+
+    def reserve(self, key_hash: bytes,
+                request_hash: bytes) -> Optional[StoredResponse]:
+        """
+        Claim a key for a new request.
+
+        Returns:
+            StoredResponse: The response to replay if the key was already
+                used for this request, None if the caller should run it.
+
+        Raises:
+            IdempotencyConflict: If the key is held by a request still in
+                progress or was used for a different request.
+        """
+        now = datetime.utcnow()
+        stored = self._cached(key_hash, now)
+        if stored is None:
+            if self._claim(key_hash, request_hash, now):
+                return None
+            row = self._session.get(IdempotencyKey, key_hash)
+            # a row released in the meantime belonged to a running request
+            if row is None or row.status_code is None:
+                raise IdempotencyConflict(
+                    "A request with this Idempotency-Key is in progress.",
+                    409)
+            stored = StoredResponse(row.status_code, row.body or b"",
+                                    row.location, row.content_type,
+                                    row.request_hash, row.expires_at)
+            self._remember(key_hash, stored)
+        if stored.request_hash != request_hash:
+            raise IdempotencyConflict(
+                "Idempotency-Key was used for a different request.", 422)
+        return stored
+
+    def _claim(self, key_hash: bytes, request_hash: bytes,
+               now: datetime) -> bool:
+        """
+        Insert the reservation of a key, or take over its row if that has
+        expired or its lease lapsed. The takeover is a single conditional
+        UPDATE, so of several concurrent retries only one gets the key.
+        """
+        values = dict(request_hash=request_hash, created_at=now,
+                      expires_at=now + self._lease)
+        try:
+            self._session.execute(insert(IdempotencyKey).values(
+                key_hash=key_hash, **values))
+            self._session.commit()
+            return True
+        except IntegrityError:
+            self._session.rollback()
+        # the connection's result has a rowcount
+        taken = self._session.connection().execute(
+            update(IdempotencyKey).where(
+                IdempotencyKey.key_hash == key_hash,
+                IdempotencyKey.expires_at <= now
+            ).values(status_code=None, body=None, location=None,
+                     content_type=None, **values))
+        self._session.commit()
+        return taken.rowcount == 1
+
+    def complete(self, key_hash: bytes, request_hash: bytes,
+                 response: WerkzeugResponse) -> None:
+        """Store the response of a reserved key for replay."""
+        row = self._session.get(IdempotencyKey, key_hash)
+        if row is None or row.status_code is not None:
+            # a retry that took over the lapsed key answered already
+            return
+        row.status_code = response.status_code
+        row.body = response.get_data()
+        row.location = response.headers.get('Location')
+        row.content_type = response.headers.get('Content-Type')
+        row.expires_at = row.created_at + self._ttl
+        self._session.commit()
+        self._remember(key_hash, StoredResponse(
+            row.status_code, row.body, row.location, row.content_type,
+            request_hash, row.expires_at))
+
+    def release(self, key_hash: bytes) -> None:
+        """
+        Forget a reservation whose request failed, so that a retry runs it
+        again.
+        """
+        self._session.rollback()
+        self._session.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.key_hash == key_hash,
+            IdempotencyKey.status_code.is_(None)))
+        self._session.commit()
+
+    def _cached(self, key_hash: bytes,
+                now: datetime) -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._cache.get(key_hash)
+            if stored is None:
+                return None
+            if stored.expires_at <= now:
+                del self._cache[key_hash]
+                return None
+            self._cache.move_to_end(key_hash)
+            return stored
+
+    def _remember(self, key_hash: bytes, stored: StoredResponse) -> None:
+        with self._lock:
+            self._cache[key_hash] = stored
+            self._cache.move_to_end(key_hash)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+
+def _hashes(key: str) -> Tuple[bytes, bytes]:
+    """
+    Hash the key together with the user and endpoint, so keys of different
+    users or endpoints never collide, and hash the request body.
+    """
+    scope = f"{session.get('user_id')}|{request.method}|{request.path}|{key}"
+    key_hash = hashlib.sha256(scope.encode("utf-8")).digest()
+    # the body stays cached, so form parsing in the view still works
+    return key_hash, hashlib.sha256(request.get_data()).digest()
+
+
+def idempotent(store: IdempotencyStore) -> Callable[..., Any]:
+    """
+    Decorator making a POST route replay its stored response when called
+    again with the same `Idempotency-Key` header. Requests without the
+    header run as usual. Server errors release the key so that the
+    retry runs the request again.
+    """
+    def decorator(f: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(f)
+        def decorated_function(*args: Any, **kwargs: Any) -> Any:
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if key is None or request.method != 'POST':
+                return f(*args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return make_response("Invalid Idempotency-Key.", 400)
+
+            key_hash, request_hash = _hashes(key)
+            try:
+                stored = store.reserve(key_hash, request_hash)
+            except IdempotencyConflict as e:
+                return make_response(str(e), e.status_code)
+            if stored is not None:
+                return stored.to_response()
+
+            try:
+                response = make_response(f(*args, **kwargs))
+            except Exception:
+                store.release(key_hash)
+                raise
+            if response.status_code >= 500:
+                store.release(key_hash)
+            else:
+                store.complete(key_hash, request_hash, response)
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,81 @@
+import hashlib
+from functools import wraps
+from typing import Any, Callable, Iterable, Optional
+
+from flask import g, make_response, request, session
+from sqlalchemy import select, update
+
+from database.init_db import DbSession
+from database.models import Account, User
+
+# responses may be stored by the browser only, and must be revalidated
+CACHE_CONTROL = "private, no-cache"
+
+
+def bump_ledger_versions(db_session: DbSession,
+                         account_ids: Iterable[int]) -> None:
+    """
+    Increments the ledger version of the owners of the given accounts.
+    Runs in the caller's transaction, so the new version becomes visible
+    together with the balance changes it stands for.
+    """
+    account_ids = sorted(set(account_ids))
+    if not account_ids:
+        return
+    owners = select(Account.user_id).where(
+        Account.account_id.in_(account_ids))
+    db_session.execute(
+        update(User).where(User.user_id.in_(owners))
+        .values(ledger_version=User.ledger_version + 1),
+        execution_options={'synchronize_session': False})
+
+
+def ledger_version(db_session: DbSession,
+                   user_id: Optional[int]) -> Optional[int]:
+    """The user's ledger version (a primary key lookup), None if unknown."""
+    if user_id is None:
+        return None
+    version = db_session.execute(
+        select(User.ledger_version).where(User.user_id == user_id)).scalar()
+    return int(version) if version is not None else None
+
+
+def ledger_etag(user_id: int, version: int) -> str:
+    """
+    The entity tag of the current request's response for a user at a
+    ledger version. The user and full path (with the query string) are
+    hashed in, so different users, pages and filters never share a tag.
+    """
+    scope = f"{user_id}|{request.full_path}".encode("utf-8")
+    return f"{version}-{hashlib.sha256(scope).hexdigest()[:16]}"
+
+
+def conditional(db_session: DbSession) -> Callable[..., Any]:
+    """
+    Decorator for GET routes whose response only depends on the logged in
+    user's ledger. The response is tagged with an ETag derived from the
+    ledger version; a request whose `If-None-Match` still matches gets an
+    empty 304 after a single lookup, without running the route. The route
+    finds the version in `g.ledger_version`.
+    """
+    def decorator(f: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(f)
+        def decorated_function(*args: Any, **kwargs: Any) -> Any:
+            user_id = session.get('user_id')
+            version = ledger_version(db_session, user_id)
+            if version is None:
+                return f(*args, **kwargs)
+            g.ledger_version = version
+            etag = ledger_etag(user_id, version)  # type: ignore[arg-type]
+            if request.if_none_match.contains_weak(etag):
+                response = make_response("", 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            # weak: the same ledger version, not necessarily the same bytes
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = CACHE_CONTROL
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,240 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import IO, Any, Dict, Mapping, Optional, Tuple
+
+from flask import Flask, g, request
+from werkzeug.wrappers import Response as WerkzeugResponse
+
+DEFAULT_LEVEL = "INFO"
+DEFAULT_FORMAT = "json"
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord(
+    "", logging.INFO, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[logging.Handler] = None
+_hooks_registered = False
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line: the time (UTC), level,
+    logger and message, the fields passed through `extra`, and the
+    traceback of an exception.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc)
+            .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items()
+                     if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one in every `1 / rate` records at or below `max_level` for each
+    call site, and every record above it. Kept records carry the rate in
+    `sample_rate`, so that counts can be scaled back up.
+
+    Counting per call site rather than per message keeps the counters
+    bounded by the code, even for messages built with f-strings.
+    """
+
+    def __init__(self, rate: float = 1.0,
+                 max_level: int = logging.DEBUG) -> None:
+        super().__init__()
+        if not 0 < rate <= 1:
+            raise ValueError("The sample rate must be in (0, 1].")
+        self._rate = rate
+        self._every = max(1, round(1 / rate))
+        self._max_level = max_level
+        self._seen: Dict[Tuple[str, int, str, int], int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        """Getter for the fraction of low level records kept."""
+        return self._rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self._max_level or self._every == 1:
+            return True
+        key = (record.name, record.levelno, record.pathname, record.lineno)
+        with self._lock:
+            seen = self._seen.get(key, 0)
+            self._seen[key] = seen + 1
+        if seen % self._every:
+            return False
+        record.sample_rate = self._rate
+        return True
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Puts records on the queue as they are. The standard `QueueHandler`
+    formats the message in the logging thread, so that records can be
+    pickled to another process; the listener here is a thread of the same
+    process, so formatting is left to it. Arguments are formatted when the
+    listener gets to them and must not be changed after logging them.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """
+    Parses per-logger levels, e.g. `sqlalchemy.engine=INFO,logic=DEBUG`.
+
+    Raises:
+        ValueError: For an entry without `=` or with an unknown level.
+    """
+    levels: Dict[str, int] = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, separator, level = entry.partition("=")
+        if not separator:
+            raise ValueError(f"Expected <logger>=<level>, got {entry!r}.")
+        levels[name.strip()] = _level(level)
+    return levels
+
+
+def _level(name: str) -> int:
+    level = logging.getLevelName(name.strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level {name!r}.")
+    return level
+
+
+def configure_logging(environ: Optional[Mapping[str, str]] = None,
+                      stream: Optional[IO[str]] = None) -> QueueListener:
+    """
+    Routes all logging through a queue to a listener thread that formats
+    and writes the records, so that request threads neither format
+    messages nor wait on I/O. Replaces the handler of an earlier call.
+
+    Environment variables:
+        LOG_LEVEL: Level of the root logger (default INFO).
+        LOG_LEVELS: Per-logger levels, e.g. `sqlalchemy.engine=INFO`
+            to echo every SQL statement.
+        LOG_FORMAT: `json` (default), one object per line, or `text`.
+        LOG_DEBUG_SAMPLE_RATE: Fraction of DEBUG records kept for each
+            message (default 1, all).
+
+    Returns:
+        QueueListener: The started listener.
+    """
+    global _listener, _handler, _hooks_registered
+    environ = os.environ if environ is None else environ
+    level = _level(environ.get("LOG_LEVEL") or DEFAULT_LEVEL)
+    levels = parse_levels(environ.get("LOG_LEVELS", ""))
+    log_format = environ.get("LOG_FORMAT") or DEFAULT_FORMAT
+    if log_format not in ("json", "text"):
+        raise ValueError("LOG_FORMAT must be 'json' or 'text'.")
+    rate = float(environ.get("LOG_DEBUG_SAMPLE_RATE") or 1)
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if log_format == "json"
+                        else logging.Formatter(TEXT_FORMAT))
+    records: 'queue.SimpleQueue[logging.LogRecord]' = queue.SimpleQueue()
+    handler = LazyQueueHandler(records)
+    # dropped records never reach the queue
+    handler.addFilter(SamplingFilter(rate))
+    listener = QueueListener(records, output)
+
+    with _lock:
+        _shutdown()
+        root = logging.getLogger()
+        root.setLevel(level)
+        for name, logger_level in levels.items():
+            logging.getLogger(name).setLevel(logger_level)
+        root.addHandler(handler)
+        listener.start()
+        _listener, _handler = listener, handler
+        if not _hooks_registered:
+            atexit.register(shutdown_logging)
+            os.register_at_fork(after_in_child=_restart_after_fork)
+            _hooks_registered = True
+    return listener
+
+
+def shutdown_logging() -> None:
+    """Writes out the queued records and removes the queue handler."""
+    with _lock:
+        _shutdown()
+
+
+def _shutdown() -> None:
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+    if _listener is not None:
+        _listener.stop()
+    _listener = _handler = None
+
+
+def _restart_after_fork() -> None:
+    # a forked child inherits the queue but not the listener thread
+    global _listener, _lock
+    _lock = threading.Lock()
+    if _listener is not None:
+        _listener = QueueListener(
+            _listener.queue, *_listener.handlers,
+            respect_handler_level=_listener.respect_handler_level)
+        _listener.start()
+
+
+class RequestLog:
+    """
+    Logs each request at DEBUG level, with its method, path, status and
+    duration as structured fields. These are the most frequent records of
+    the application, which `LOG_DEBUG_SAMPLE_RATE` thins out.
+    """
+
+    def __init__(self, app: Flask,
+                 logger: Optional[logging.Logger] = None) -> None:
+        self._logger = logger or logging.getLogger("logic.requests")
+        app.before_request(self._start)
+        app.after_request(self._log)
+
+    @property
+    def logger(self) -> logging.Logger:
+        """Getter for the logger the requests are logged to."""
+        return self._logger
+
+    def _start(self) -> None:
+        g.request_started = time.perf_counter()
+
+    def _log(self, response: WerkzeugResponse) -> WerkzeugResponse:
+        if self._logger.isEnabledFor(logging.DEBUG):
+            started = g.get('request_started', time.perf_counter())
+            self._logger.debug(
+                "%s %s %d", request.method, request.path,
+                response.status_code, extra={
+                    'method': request.method, 'path': request.path,
+                    'status': response.status_code,
+                    'duration_ms': round(
+                        (time.perf_counter() - started) * 1000, 3)})
+        return response
@@ -1,39 +1,92 @@
 from flask import Flask, render_template, request, redirect, url_for, session, jsonify, make_response
+from flask import Response
+from flask import current_app, g, has_app_context
+from flask.ctx import AppContext
+from flask.globals import app_ctx
+import atexit
 import os
-import bcrypt
+import threading
+import time
+import weakref
 from dotenv import load_dotenv
 from logic.user_auth import UserAuth
-from logic.bank_system import BankSystem
-from database.init_db import engine
-from database.models import User, Account, Transaction, Role
-from database.models import TransactionType, TransactionStatus
-from sqlalchemy.orm import sessionmaker
+from logic.bank_system import BankSystem, DEFAULT_MAX_BYTES
+from logic.password_hasher import PasswordHasher
+from logic.idempotency import IdempotencyStore, idempotent
+from logic.ledger_version import conditional, ledger_version
+from logic.cache import UserCache
+from logic.assets import StaticAssets
+from logic.compression import ResponseCompression
+from logic.logging_config import RequestLog, configure_logging
+from logic.commands import CommandBus, DbCommand
+from logic.commands import DbDepositCommand, DbWithdrawCommand
+from logic.admin_overview import AdminOverview, DEFAULT_PER_PAGE
+from logic.dashboard import DashboardService, DashboardData, AccountSummary
+from logic.dashboard import with_balances
+from logic.transaction_history import TransactionHistory, TransactionFilters
+from logic.transaction_history import DEFAULT_PAGE_SIZE
+from logic.transaction_export import TransactionExport, EXPORT_FORMATS
+from database.archive import TransactionArchive
+from logic.transfer_service import TransferService, TransferError
+from logic.transfer_service import MAX_BATCH_SIZE
+from database.init_db import create_engine_from_env, get_engine, init_db
+from database.models import User, Account, Role
+from database.money import MoneyLike, parse_amount, to_money
+from decimal import Decimal
+from sqlalchemy import exists, func, select
+from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.orm.session import Session as ORM_Session
+from dataclasses import replace
 from functools import wraps
 from abc import ABC, abstractmethod
 import logging
-from typing import Any, Callable, Union, Optional, Tuple, List, Dict
+from typing import Any, Callable, Union, Optional, List, Mapping, Sequence
+from typing import cast
 
+from werkzeug.local import LocalProxy
 from werkzeug.wrappers import Response as WerkzeugResponse
+from sqlalchemy.engine import Engine
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
+# how long the role claim in the signed session cookie is trusted before
+# admin_required checks it against the database again
+DEFAULT_ROLE_CLAIM_TTL = 60.0
 
+# apps not closed yet, whose pending writes are flushed at exit
+_open_apps: 'weakref.WeakSet[BankApp]' = weakref.WeakSet()
 
-class BankApp:
-    _instance: Optional['BankApp'] = None
 
-    def __new__(cls: type['BankApp'], *args: object, **kwargs: object) -> 'BankApp':
-        if not cls._instance:
-            cls._instance = super(BankApp, cls).__new__(cls, *args, **kwargs)
-        return cls._instance
+def _close_apps() -> None:
+    for bank_app in list(_open_apps):
+        bank_app.close()
+
+
+atexit.register(_close_apps)
+
+
+def _session_scope() -> int:
+    """
+    Scope sessions to the current Flask app context, falling back to the
+    current thread outside of one (e.g. during startup).
+    """
+    if has_app_context():
+        return id(cast('LocalProxy[AppContext]', app_ctx)
+                  ._get_current_object())
+    return threading.get_ident()
+
 
-    def __init__(self) -> None:
+class BankApp:
+    def __init__(self, config: Optional[Mapping[str, Any]] = None) -> None:
         """
         Initialize the BankApp with Flask, database, and user authentication.
-        This follows the Singleton pattern (only one instance is created)
+        Every instance is independent: it has its own Flask app, sessions,
+        caches and workers, and all of its state lives on the instance.
+
+        Args:
+            config (Mapping): Flask settings overriding the environment,
+                e.g. `SECRET_KEY`, `TESTING` or `DATABASE_URL` (which
+                gives the app an engine of its own).
         """
         self._app = Flask(
             __name__,
@@ -47,13 +100,54 @@ class BankApp:
             )
         )
         load_dotenv(dotenv_path=".env")
+        self._assets = StaticAssets(self._app)
+        self._compression = ResponseCompression(self._app)
+        self._request_log = RequestLog(self._app)
         self._app.secret_key = os.getenv("SECRET_KEY")
-        Session = sessionmaker(bind=engine)
-        self._db_session: ORM_Session = Session()
-        self._bank_system = BankSystem()  # type: ignore
-        self._user_auth = UserAuth(self._bank_system, self._db_session)  # type: ignore
+        self._app.config.from_mapping(config or {})
+        database_url = self._app.config.get('DATABASE_URL')
+        # nothing connects until the schema check below
+        self._owns_engine = bool(database_url)
+        self._engine = create_engine_from_env(database_url) \
+            if database_url else get_engine()
+        Session = sessionmaker(bind=self._engine)
+        self._session_factory = Session
+        self._db_session: scoped_session[ORM_Session] = scoped_session(
+            Session, scopefunc=_session_scope)
+        self._app.teardown_appcontext(self.remove_db_session)
+        # lets the route decorators reach the app without the module global
+        self._app.extensions['bank_app'] = self
+        self._role_claim_ttl = float(os.getenv("ROLE_CLAIM_TTL_SECONDS",
+                                               DEFAULT_ROLE_CLAIM_TTL))
+        # read-through, write-behind cache of account balances
+        self._bank_system = BankSystem(Session, max_bytes=int(os.getenv(
+            "BALANCE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)))
+        self._password_hasher = PasswordHasher()
+        self._idempotency = IdempotencyStore(self._db_session)
+        self._command_bus = CommandBus(Session)
+        self._archive = TransactionArchive()
+        # dashboards and account lists, per user and ledger version
+        self._user_cache = UserCache()
+        self._user_auth = UserAuth(self._bank_system, self._db_session,
+                                   self._password_hasher)
         self.setup_routes()
+        init_db(self._engine)
         self.add_admin_user()
+        self.remove_db_session()
+        _open_apps.add(self)
+
+    def close(self) -> None:
+        """
+        Write out the pending balance changes and stop the workers of this
+        app. An engine created for the app's own `DATABASE_URL` is
+        disposed; the shared default engine is left open.
+        """
+        _open_apps.discard(self)
+        self._bank_system.flush()
+        self._command_bus.shutdown()
+        self._password_hasher.shutdown()
+        if self._owns_engine:
+            self._engine.dispose()
 
     @property
     def app(self) -> Flask:
@@ -63,12 +157,28 @@ class BankApp:
         return self._app
 
     @property
-    def db_session(self) -> ORM_Session:
+    def engine(self) -> Engine:
+        """
+        Getter for the database engine.
+        """
+        return self._engine
+
+    @property
+    def db_session(self) -> scoped_session[ORM_Session]:
         """
-        Getter for the database session.
+        Getter for the database session registry.
+        Each app context (i.e. each request) gets its own session.
         """
         return self._db_session
 
+    def remove_db_session(
+            self, exception: Optional[BaseException] = None) -> None:
+        """
+        Close the session of the current app context and return its
+        connection to the pool. Registered as an app context teardown.
+        """
+        self._db_session.remove()
+
     @property
     def bank_system(self) -> BankSystem:
         """
@@ -83,6 +193,65 @@ class BankApp:
         """
         return self._user_auth
 
+    @property
+    def password_hasher(self) -> PasswordHasher:
+        """
+        Getter for the password hashing service.
+        """
+        return self._password_hasher
+
+    @property
+    def command_bus(self) -> CommandBus:
+        """
+        Getter for the group commit executor of balance commands.
+        """
+        return self._command_bus
+
+    @property
+    def assets(self) -> StaticAssets:
+        """
+        Getter for the fingerprinted static asset bundles.
+        """
+        return self._assets
+
+    @property
+    def role_claim_ttl(self) -> float:
+        """
+        Getter for how many seconds a session's role claim is trusted.
+        """
+        return self._role_claim_ttl
+
+    @property
+    def user_cache(self) -> UserCache:
+        """
+        Getter for the cache of per-user dashboards and account lists.
+        """
+        return self._user_cache
+
+    @property
+    def idempotency(self) -> IdempotencyStore:
+        """
+        Getter for the store of idempotency keys and replayable responses.
+        """
+        return self._idempotency
+
+    def _remember_balances(self, user_id: int,
+                           accounts: Sequence[AccountSummary]) -> None:
+        """
+        Hand the balances read along with a page to the balance cache, so
+        that reads of the user's balances do not load them again.
+        """
+        self._bank_system.refresh(user_id, {
+            account.account_id: account.balance for account in accounts})
+
+    def _cached_balances(self, user_id: int) -> Mapping[int, Decimal]:
+        """
+        The user's balances from the balance cache, unflushed changes
+        included, loading them on a miss.
+        """
+        balances = self._bank_system.get_user_accounts(user_id)
+        return balances if isinstance(balances, dict) else {}
+
     def setup_routes(self) -> None:
         @self._app.route('/')
         def login() -> str:
@@ -92,11 +261,16 @@ class BankApp:
         def handle_login() -> WerkzeugResponse:
             username = request.form.get('username', '')
             password = request.form.get('password', '')
-            user: Optional[User] = self._db_session.query(User).filter_by(
-                username=username.strip().lower()).first()
-            if user and bcrypt.checkpw(password.encode('utf-8'),
-                                       user.password_hash.encode('utf-8')):
+            # served by the unique index on lower(username)
+            user: Optional[User] = self._db_session.query(User).filter(
+                func.lower(User.username) == username.strip().lower()).first()
+            if user and self._password_hasher.verify(password,
+                                                     user.password_hash):
+                if self._password_hasher.needs_rehash(user.password_hash):
+                    user.password_hash = self._password_hasher.hash(password)
+                    self._db_session.commit()
                 session['user_id'] = user.user_id
+                _claim_role(user.user_id, user.role)
                 if user.role == Role.admin:
                     return redirect(url_for('admin'))
                 return redirect(url_for('dashboard'))
@@ -105,237 +279,249 @@ class BankApp:
 
         @self._app.route('/dashboard')
         @login_required
+        @conditional(self._db_session)
         def dashboard() -> str:
-            user_id = session.get('user_id')
-            user: Optional[User] = self._db_session.query(User).filter_by(user_id=user_id).first()
-            if user is not None:
-                user_accounts: List[Account] = self._db_session.query(Account).filter_by(user_id=user.user_id).all()
-                total_balance = sum(
-                    account.balance for account in user_accounts)
-                user_name = user.username
-
-                recent_income = self._db_session.query(Transaction).join(Account).filter(
-                    Account.user_id == user.user_id, Transaction.transaction_type.in_([TransactionType.deposit])
-                ).order_by(Transaction.created_at.desc()).limit(5).all()
-
-                recent_expenses = self._db_session.query(Transaction).join(Account).filter(
-                    Account.user_id == user.user_id, Transaction.transaction_type.in_([TransactionType.withdrawal,
-                                                                                       TransactionType.transfer])
-                ).order_by(Transaction.created_at.desc()).limit(5).all()
-
-                pending_transfers = self._db_session.query(Transaction).join(Account).filter(
-                    Account.user_id == user.user_id, Transaction.status == TransactionStatus.pending
-                ).count()
+            user_id = session['user_id']
+
+            def load() -> Optional[DashboardData]:
+                data = DashboardService(self._db_session).load(user_id)
+                if data is not None:
+                    self._remember_balances(user_id, data.accounts)
+                return data
+
+            data = self._user_cache.load(
+                user_id, 'dashboard', g.get('ledger_version'), load,
+                account_ids=_account_ids)
+            if data is None:
+                data = DashboardData(user_name="Guest")
             else:
-                user_accounts = []
-                total_balance = 0.0
-                user_name = "Guest"
-                recent_income = []
-                recent_expenses = []
-                pending_transfers = 0
+                # hot accounts show the balance cache, unflushed changes
+                # included
+                data = replace(data, accounts=with_balances(
+                    data.accounts,
+                    self._cached_balances(user_id)))
 
             return render_template(
                 'dashboard.html',
-                accounts=user_accounts,
-                total_balance=total_balance,
-                user_name=user_name,
-                recent_income=recent_income,
-                recent_expenses=recent_expenses,
-                pending_transfers=pending_transfers
+                accounts=data.accounts,
+                total_balance=data.total_balance,
+                user_name=data.user_name,
+                recent_income=data.recent_income,
+                recent_expenses=data.recent_expenses,
+                pending_transfers=data.pending_transfers
             )
 
         @self._app.route('/admin')
         @admin_required
-        def admin() -> str:
-            users = self._db_session.query(User).all()
-            user_data = []
-            for user in users:
-                num_accounts = len(user.accounts)
-                total_balance = sum(
-                    account.balance for account in user.accounts)
-                user_data.append({
-                    'id': user.user_id,
-                    'username': user.username,
-                    'email': user.email,
-                    'num_accounts': num_accounts,
-                    'balance': total_balance
-                })
-            return render_template('admin.html', users=user_data)
+        def admin() -> Union[WerkzeugResponse, str]:
+            try:
+                overview = AdminOverview(self._db_session).page(
+                    page=request.args.get('page', 1, type=int),
+                    per_page=request.args.get('per_page', DEFAULT_PER_PAGE,
+                                              type=int),
+                    sort=request.args.get('sort', 'id'),
+                    order=request.args.get('order', 'asc'))
+            except ValueError as e:
+                return make_response(str(e), 400)
+            return render_template('admin.html', users=overview.users,
+                                   overview=overview)
+
+        @self._app.route('/admin/cache')
+        @admin_required
+        def admin_cache() -> WerkzeugResponse:
+            return jsonify(self._user_cache.stats())
 
         @self._app.route('/admin/transaction', methods=['POST'])
         @admin_required
+        @idempotent(self._idempotency)
         def add_transaction() -> WerkzeugResponse:
-            account_id = request.form.get('account_id', '0')
-            amount_str = request.form.get('amount', '0')
-            amount = float(amount_str)
-            transaction_type = request.form.get('type', '')
-            account: Optional[Account] = self._db_session.query(Account).filter_by(
-                account_id=account_id).first()
-            if not account:
+            try:
+                account_id = int(request.form.get('account_id', '0'))
+            except ValueError:
                 return make_response("Invalid account.", 400)
-
+            try:
+                amount = parse_amount(request.form.get('amount', '0'))
+            except ValueError as e:
+                return make_response(str(e), 400)
+            transaction_type = request.form.get('type', '')
+            command: DbCommand
             if transaction_type == 'deposit':
-                account.balance += amount
-                transaction = Transaction(account_id=account_id,
-                                          transaction_type=TransactionType.deposit,
-                                          amount=amount, status=TransactionStatus.completed)
+                command = DbDepositCommand(account_id, amount)
             elif transaction_type == 'withdraw':
-                if account.balance < amount:
-                    return make_response("Insufficient funds.", 400)
-                account.balance -= amount
-                transaction = Transaction(account_id=account_id,
-                                          transaction_type=TransactionType.withdrawal,
-                                          amount=amount,
-                                          status=TransactionStatus.completed)
+                command = DbWithdrawCommand(account_id, amount)
             else:
                 return make_response("Invalid transaction type.", 400)
 
-            self._db_session.add(transaction)
-            self._db_session.commit()
+            try:
+                self._command_bus.execute(command)
+            except TransferError as e:
+                return make_response(str(e), 400)
+            self._bank_system.apply_committed(
+                {account_id: amount if transaction_type == 'deposit'
+                 else -amount})
+            self._user_cache.invalidate_accounts([account_id])
             return redirect(url_for('admin'))
 
         @self._app.route('/transfer', methods=['GET', 'POST'])
         @login_required
+        @idempotent(self._idempotency)
         def transfer() -> Union[WerkzeugResponse, str]:
-            user_id = session.get('user_id')
+            user_id = session['user_id']
+            if request.method == 'GET':
+                # the version lookup doubles as the check that the user exists
+                version = ledger_version(self._db_session, user_id)
+                if version is None:
+                    return redirect(url_for('login'))
+
+                def load() -> List[AccountSummary]:
+                    accounts = DashboardService(
+                        self._db_session).accounts(user_id)
+                    self._remember_balances(user_id, accounts)
+                    return accounts
+
+                accounts = self._user_cache.load(
+                    user_id, 'accounts', version, load,
+                    account_ids=lambda accounts: [
+                        account.account_id for account in accounts])
+                accounts = with_balances(
+                    accounts,
+                    self._cached_balances(user_id))
+                return render_template('transfer.html', accounts=accounts)
+
             user: Optional[User] = self._db_session.query(User).filter_by(
                 user_id=user_id).first()
             if not user:
                 return redirect(url_for('login'))
 
-            if request.method == 'POST':
-                try:
-                    logger.debug(f"Received form data: {request.form}")
-
-                    from_account_id_str = request.form.get('fromAccount', '0')
-                    from_account_id = int(from_account_id_str)
-                    transfer_type = request.form.get('transferType', '')
-                    amount_str = request.form.get('amount', '0')
-                    amount = float(amount_str)
-
-                    from_account: Optional[Account] = self._db_session.query(Account).filter_by(
-                        account_id=from_account_id, user_id=user.user_id
-                    ).first()
-
-                    if not from_account:
-                        logger.error("Invalid source account.")
-                        return make_response("Invalid source account.", 400)
-                    if from_account.balance < amount:
-                        logger.error("Insufficient funds.")
-                        return make_response("Insufficient funds.", 400)
-
-                    to_account: Optional[Account] = None
-
-                    if transfer_type == "internal":
-                        to_account_id_str = request.form.get('toInternalAccount', '0')
-                        to_account_id = int(to_account_id_str)
-                        to_account = self._db_session.query(Account).filter_by(
-                            account_id=to_account_id, user_id=user.user_id
-                        ).first()
-
-                        if not to_account:
-                            logger.error("Invalid target account.")
-                            return make_response("Invalid target account.", 400)
-
-                        logger.debug(f"Before Transfer - From Account Balance: {from_account.balance}, To Account Balance: {to_account.balance}")
-
-                        from_account.balance -= amount
-                        to_account.balance += amount
-
-                        # Create transaction records
-                        from_transaction = Transaction(
-                            account_id=from_account_id,
-                            transaction_type=TransactionType.withdrawal,
-                            amount=amount,
-                            status=TransactionStatus.completed
-                        )
-                        to_transaction = Transaction(
-                            account_id=to_account_id,
-                            transaction_type=TransactionType.deposit,
-                            amount=amount,
-                            status=TransactionStatus.completed
-                        )
-
-                        self._db_session.add_all(
-                            [from_transaction, to_transaction])
-
-                        logger.debug(f"After Transfer - From Account Balance: {from_account.balance}, To Account Balance: {to_account.balance}")
-
-                        self._db_session.commit()
-                        logger.info(f"Internal Transfer: ${amount} from {from_account.account_id} to {to_account.account_id}")
-
-                    elif transfer_type == "external":
-                        to_account_id_str = request.form.get('toExternalAccount', '0')
-                        to_account_id = int(to_account_id_str)
-                        to_account = self._db_session.query(Account).filter_by(
-                            account_id=to_account_id).first()
-
-                        if not to_account:
-                            logger.error("Invalid external target account.")
-                            return make_response("Invalid external target account.", 400)
-
-                        # Process external
-                        from_account.balance -= amount
-                        to_account.balance += amount
-
-                        # Create transaction records
-                        from_transaction = Transaction(
-                            account_id=from_account_id,
-                            transaction_type=TransactionType.withdrawal,
-                            amount=amount,
-                            status=TransactionStatus.completed
-                        )
-                        to_transaction = Transaction(
-                            account_id=to_account_id,
-                            transaction_type=TransactionType.deposit,
-                            amount=amount,
-                            status=TransactionStatus.completed
-                        )
-
-                        self._db_session.add_all(
-                            [from_transaction, to_transaction])
-
-                        # Commit transaction
-                        self._db_session.commit()
-                        logger.info(f"External Transfer: ${amount} from {from_account.account_id} to {to_account.account_id}")
-
-                    return redirect(url_for('dashboard'))
-
-                except Exception as e:
-                    self._db_session.rollback()
-                    logger.exception("An error occurred during the transfer.")
-                    return make_response(f"An error occurred during the transfer: {str(e)}", 500)
-
-            # Fetch users
-            user_accounts = self._db_session.query(Account).filter_by(
-                user_id=user.user_id).all()
-            return render_template('transfer.html', accounts=user_accounts)
+            transfer_type = request.form.get('transferType', '')
+            if transfer_type not in ('internal', 'external'):
+                return make_response("Invalid transfer type.", 400)
+            external = transfer_type == 'external'
+            try:
+                amount = parse_amount(request.form.get('amount', '0'))
+                from_account_id = int(request.form.get('fromAccount', '0'))
+                to_account_id = int(request.form.get(
+                    'toExternalAccount' if external
+                    else 'toInternalAccount', '0'))
+            except ValueError as e:
+                return make_response(str(e), 400)
+
+            # hot accounts are pre-checked from the balance cache; the
+            # conditional UPDATE of the transfer still enforces the funds
+            if not self._bank_system.has_funds(user_id, from_account_id,
+                                               amount):
+                logger.error("Transfer rejected: Insufficient funds.")
+                return make_response("Insufficient funds.", 400)
+            try:
+                TransferService(self._db_session).transfer(
+                    user.user_id, from_account_id, to_account_id, amount,
+                    external=external)
+            except TransferError as e:
+                logger.error("Transfer rejected: %s", e)
+                self._bank_system.invalidate([from_account_id, to_account_id])
+                return make_response(str(e), 400)
+            except Exception:
+                self._db_session.rollback()
+                logger.exception("An error occurred during the transfer.")
+                # the details are logged; they are not for the client
+                return make_response(
+                    "An error occurred during the transfer.", 500)
+
+            self._bank_system.apply_committed(
+                {from_account_id: -amount, to_account_id: amount})
+            self._user_cache.invalidate(user.user_id)
+            self._user_cache.invalidate_accounts([to_account_id])
+            logger.info("%s transfer: $%s from %s to %s",
+                        transfer_type.capitalize(), amount,
+                        from_account_id, to_account_id)
+            return redirect(url_for('dashboard'))
 
         @self._app.route('/history')
         @login_required
         def transaction_history() -> str:
-            return render_template('history.html')
+            user_accounts = self._db_session.query(Account).filter_by(
+                user_id=session['user_id']).all()
+            return render_template('history.html', accounts=user_accounts)
 
         @self._app.route('/api/transactions', methods=['GET'])
         @login_required
+        @conditional(self._db_session)
         def api_transactions() -> WerkzeugResponse:
-            user_id = session.get('user_id')
-            transactions = self._db_session.query(Transaction).join(
-                Account).filter(Account.user_id == user_id).order_by(
-                    Transaction.created_at.desc()).all()
-
-            transaction_list = [
-                {
-                    'date': transaction.account.created_at.strftime("%Y-%m-%d"),
-                    'type': transaction.transaction_type.name,
-                    'account': transaction.account.account_type,
-                    'amount': transaction.amount,
-                    'notes': ""
-                }
-                for transaction in transactions
-            ]
-
-            return jsonify(transaction_list)
+            user_id = session['user_id']
+            try:
+                filters = TransactionFilters.from_args(request.args)
+                history = TransactionHistory(self._db_session, self._archive)
+                page = history.page(
+                    user_id, filters,
+                    cursor=request.args.get('cursor'),
+                    limit=request.args.get('limit', DEFAULT_PAGE_SIZE,
+                                           type=int))
+            except ValueError as e:
+                return make_response(str(e), 400)
+            return jsonify(page.to_dict())
+
+        @self._app.route('/api/transactions/export', methods=['GET'])
+        @login_required
+        def api_transactions_export() -> WerkzeugResponse:
+            export_format = request.args.get('format', 'csv')
+            try:
+                filters = TransactionFilters.from_args(request.args)
+                export = TransactionExport(self._session_factory,
+                                           self._archive)
+                chunks = export.stream(
+                    session['user_id'], export_format, filters)
+            except ValueError as e:
+                return make_response(str(e), 400)
+            # streamed as the rows are read; the body never sits in memory
+            response = Response(chunks, mimetype=EXPORT_FORMATS[export_format])
+            response.headers['Content-Disposition'] = \
+                f'attachment; filename="transactions.{export_format}"'
+            return response
+
+        @self._app.route('/api/transfers', methods=['POST'])
+        @login_required
+        @idempotent(self._idempotency)
+        def api_transfers() -> WerkzeugResponse:
+            payload = request.get_json(silent=True)
+            transfers = payload.get('transfers') \
+                if isinstance(payload, dict) else None
+            if not isinstance(transfers, list) or not transfers:
+                return make_response(
+                    "Expected a JSON object with a list of transfers.", 400)
+            if len(transfers) > MAX_BATCH_SIZE:
+                return make_response(
+                    f"At most {MAX_BATCH_SIZE} transfers per batch.", 400)
+            chunk_size = payload.get('chunk_size')  # type: ignore[union-attr]
+            if chunk_size is not None and (
+                    not isinstance(chunk_size, int) or chunk_size < 1):
+                return make_response("Invalid chunk size.", 400)
+
+            try:
+                outcomes = TransferService(self._db_session).transfer_batch(
+                    session['user_id'], transfers, chunk_size=chunk_size)
+            except Exception:
+                self._db_session.rollback()
+                logger.exception(
+                    "An error occurred during the batch transfer.")
+                return make_response(
+                    "An error occurred during the transfer.", 500)
+
+            touched = {int(str(account_id))
+                       for item in transfers if isinstance(item, dict)
+                       for account_id in (item.get('from_account'),
+                                          item.get('to_account'))
+                       if str(account_id).isdigit()}
+            self._bank_system.invalidate(touched)
+            self._user_cache.invalidate(session['user_id'])
+            self._user_cache.invalidate_accounts(touched)
+            completed = sum(1 for outcome in outcomes if outcome.completed)
+            logger.info("Batch transfer: %d of %d completed",
+                        completed, len(outcomes))
+            return jsonify({
+                'results': [outcome.to_dict() for outcome in outcomes],
+                'completed': completed,
+                'rejected': len(outcomes) - completed,
+            })
 
         @self._app.route('/register', methods=['GET', 'POST'])
         def register() -> Union[WerkzeugResponse, str]:
@@ -344,36 +530,11 @@ class BankApp:
                 email = request.form['email']
                 password = request.form['password']
                 result = self._user_auth.register_user(
-                    username, email, password)  # type: ignore
+                    username, email, password)
                 if result['success']:
-                    # initial balances
-                    new_user: Optional[User] = self._db_session.query(User).filter_by(
-                        username=username).first()
-                    if new_user is not None:
-                        initial_accounts = [
-                            Account(user_id=new_user.user_id,
-                                    account_type='Checking Account',
-                                    balance=500.00),
-                            Account(user_id=new_user.user_id,
-                                    account_type='Savings Account',
-                                    balance=1500.00),
-                            Account(user_id=new_user.user_id,
-                                    account_type='Business Account',
-                                    balance=3000.00)
-                        ]
-                        self._db_session.add_all(initial_accounts)
-                        self._db_session.commit()
-
-                        # initial transactions
-                        for account in initial_accounts:
-                            initial_transaction = Transaction(
-                                account_id=account.account_id,
-                                transaction_type=TransactionType.deposit,
-                                amount=account.balance,
-                                status=TransactionStatus.completed)
-                            self._db_session.add(initial_transaction)
-                        self._db_session.commit()
-
+                    # a shared cache backend (e.g. RESP) can outlive a
+                    # database reset and still hold entries for this id
+                    self._user_cache.invalidate(result.get('user_id'))
                     return redirect(url_for('login'))
                 else:
                     error_message = result.get('message', 'Register failed')
@@ -384,27 +545,22 @@ class BankApp:
         @self._app.route('/logout')
         def logout() -> WerkzeugResponse:
             session.pop('user_id', None)
+            session.pop('role', None)
             return redirect(url_for('login'))
 
     def add_admin_user(self) -> None:
         """
-        Makes all usernames lowercase,
-        then adds a hardcoded admin user
+        Adds a hardcoded admin user unless it exists, which is a single
+        lookup in the lower(username) index. Usernames are lowercased once
+        by a migration.
         """
-        all_users = self._db_session.query(User).all()
-        for user in all_users:
-            if user.username != user.username.lower():
-                user.username = user.username.lower()
-        self._db_session.commit()
-
         admin_username = 'admin'
         admin_password = 'admin'
-        existing_admin = self._db_session.query(User).filter_by(
-            username=admin_username.lower()).first()
+        existing_admin = self._db_session.execute(select(exists().where(
+            func.lower(User.username) == admin_username))).scalar()
 
         if not existing_admin:
-            hashed_pw = bcrypt.hashpw(admin_password.encode('utf-8'),
-                                      bcrypt.gensalt()).decode('utf-8')
+            hashed_pw = self._password_hasher.hash(admin_password)
             admin_user = User(username=admin_username.lower(),
                               password_hash=hashed_pw,
                               email='admin@example.com',
@@ -413,6 +569,10 @@ class BankApp:
             self._db_session.commit()
 
 
+def _account_ids(data: DashboardData) -> List[int]:
+    return [account.account_id for account in data.accounts]
+
+
 def login_required(f: Callable[..., Any]) -> Callable[..., Any]:
     """
     Decorator to check if the user is logged in
@@ -431,15 +591,40 @@ def admin_required(f: Callable[..., Any]) -> Callable[..., Any]:
     """
     @wraps(f)
     def decorated_function(*args: Any, **kwargs: Any) -> Any:
-        user_id = session.get('user_id')
-        user: Optional[User] = bank_app.db_session.query(User).filter_by(
-            user_id=user_id).first()
-        if not user or user.role != Role.admin:
+        if _claimed_role() != Role.admin:
             return redirect(url_for('login'))
         return f(*args, **kwargs)
     return decorated_function
 
 
+def _claim_role(user_id: Optional[int], role: Optional[Role]) -> None:
+    """
+    Record the user's role, and when it was read, in the session cookie,
+    which Flask signs so that clients cannot forge it.
+    """
+    session['role'] = [user_id, role.value if role else None, time.time()]
+
+
+def _claimed_role() -> Optional[Role]:
+    """
+    The role of the logged in user. The claim made at login is trusted
+    for `role_claim_ttl` seconds, then read again from the database, so a
+    revoked role stops working within that time.
+    """
+    user_id = session.get('user_id')
+    if user_id is None:
+        return None
+    app: BankApp = current_app.extensions['bank_app']
+    claim = session.get('role')
+    if not claim or claim[0] != user_id \
+            or time.time() - claim[2] >= app.role_claim_ttl:
+        user: Optional[User] = app.db_session.query(User).filter_by(
+            user_id=user_id).first()
+        _claim_role(user_id, user.role if user else None)
+        claim = session['role']
+    return Role(claim[1]) if claim[1] else None
+
+
 class Command(ABC):
     """
     Abstract base class representing a command that can be executed.
@@ -448,61 +633,101 @@ class Command(ABC):
     def execute(self) -> None:
         pass
 
+    @abstractmethod
+    def undo(self) -> None:
+        """
+        Revert the effect of the last execute, if it had one.
+        """
+        pass
+
 
 class DepositCommand(Command):
-    def __init__(self, bank_system: BankSystem, user_id: int, account_id: int, amount: float) -> None:
+    def __init__(self, bank_system: BankSystem, user_id: int,
+                 account_id: int, amount: MoneyLike) -> None:
         self._bank_system = bank_system
         self._user_id = user_id
         self._account_id = account_id
-        self._amount = amount
+        self._amount = to_money(amount)
+        self._applied = False
 
     @property
-    def amount(self) -> float:
+    def amount(self) -> Decimal:
         """Getter for the amount."""
         return self._amount
 
     @amount.setter
-    def amount(self, value: float) -> None:
+    def amount(self, value: MoneyLike) -> None:
         """Setter for the amount."""
-        self._amount = value
+        self._amount = to_money(value)
 
     def execute(self) -> None:
         """
         Execute the deposit operation.
         """
-        self._bank_system.deposit(self._user_id,
-                                  self._account_id,
-                                  self._amount)  # type: ignore
+        self._applied = bool(self._bank_system.deposit(
+            self._user_id, self._account_id, self._amount))
+
+    def undo(self) -> None:
+        """
+        Take the deposited amount back out.
+        """
+        if self._applied:
+            self._bank_system.withdraw(self._user_id, self._account_id,
+                                       self._amount)
+            self._applied = False
 
 
 class WithdrawCommand(Command):
-    def __init__(self, bank_system: BankSystem, user_id: int, account_id: int, amount: float) -> None:
+    def __init__(self, bank_system: BankSystem, user_id: int,
+                 account_id: int, amount: MoneyLike) -> None:
         self._bank_system = bank_system
         self._user_id = user_id
         self._account_id = account_id
-        self._amount = amount
+        self._amount = to_money(amount)
+        self._applied = False
 
     @property
-    def amount(self) -> float:
+    def amount(self) -> Decimal:
         """Getter for the amount."""
         return self._amount
 
     @amount.setter
-    def amount(self, value: float) -> None:
+    def amount(self, value: MoneyLike) -> None:
         """Setter for the amount."""
-        self._amount = value
+        self._amount = to_money(value)
 
     def execute(self) -> None:
         """
         Execute the withdraw operation.
         """
-        self._bank_system.withdraw(self._user_id,
-                                   self._account_id,
-                                   self._amount)  # type: ignore
+        self._applied = bool(self._bank_system.withdraw(
+            self._user_id, self._account_id, self._amount))
 
+    def undo(self) -> None:
+        """
+        Put the withdrawn amount back.
+        """
+        if self._applied:
+            self._bank_system.deposit(self._user_id, self._account_id,
+                                      self._amount)
+            self._applied = False
+
+
+def create_app(config: Optional[Mapping[str, Any]] = None) -> Flask:
+    """
+    Application factory, found by `flask --app logic.main` and called by
+    WSGI servers (e.g. `gunicorn 'logic.main:create_app()'`). Importing
+    this module has no side effects: the app, its engine and the schema
+    check are only set up here.
+
+    With a pre-fork server preloading the app, the workers drop the
+    connections inherited from the parent and each opens its own pool.
+    Logging is configured from the environment, see `configure_logging`.
+    """
+    load_dotenv(dotenv_path=".env")
+    configure_logging()
+    return BankApp(config).app
 
-bank_app = BankApp()
-app = bank_app.app  # to expose app to flaskCLI
 
 if __name__ == "__main__":  # pragma: no cover
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,155 @@
+import os
+import threading
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
+import bcrypt
+
+DEFAULT_ROUNDS = 12
+
+# the hashers of this process, whose pools a forked child has to recreate
+_hashers: 'weakref.WeakSet[PasswordHasher]' = weakref.WeakSet()
+
+
+def _reset_after_fork() -> None:
+    for hasher in list(_hashers):
+        hasher._executor = None
+        hasher._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _verify(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+def hash_rounds(hashed: str) -> int:
+    """
+    Returns the cost factor of a bcrypt hash ("$2b$12$..." -> 12).
+
+    Raises:
+        ValueError: If the hash is not a bcrypt hash.
+    """
+    parts = hashed.split('$')
+    if len(parts) < 4 or not parts[2].isdigit():
+        raise ValueError("Not a bcrypt hash.")
+    return int(parts[2])
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification on a bounded worker pool.
+
+    The caller still waits for its result, so this does not make a login
+    any faster; it bounds how many hashes run at once, so that a burst of
+    logins queues up instead of starving the other requests of CPU. bcrypt
+    releases the GIL while it works, so a thread pool spreads the work over
+    all cores; a process pool can be used instead. The pool is created on
+    first use, and again in a forked child process, which does not inherit
+    the parent's workers.
+
+    The bound is per process, and at most the number of CPUs: under a
+    pre-fork server with N workers, up to N times `max_workers` hashes run
+    at once, so set PASSWORD_HASH_WORKERS to the CPUs divided by N there.
+
+    Environment variables:
+        BCRYPT_ROUNDS: Cost factor for new hashes (default 12).
+        PASSWORD_HASH_WORKERS: Pool size (default: number of CPUs).
+        PASSWORD_HASH_EXECUTOR: 'thread' (default) or 'process'.
+    """
+
+    def __init__(self, rounds: Optional[int] = None,
+                 max_workers: Optional[int] = None,
+                 executor: Optional[str] = None) -> None:
+        self._rounds = rounds or int(os.getenv("BCRYPT_ROUNDS",
+                                               DEFAULT_ROUNDS))
+        cpus = os.cpu_count() or 1
+        # bcrypt is CPU bound, more workers than cores only add queueing
+        self._max_workers = min(cpus, max_workers or int(os.getenv(
+            "PASSWORD_HASH_WORKERS", cpus)))
+        self._executor_kind = executor or os.getenv(
+            "PASSWORD_HASH_EXECUTOR", "thread")
+        if self._executor_kind not in ("thread", "process"):
+            raise ValueError("PASSWORD_HASH_EXECUTOR must be "
+                             "'thread' or 'process'.")
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        _hashers.add(self)
+
+    @property
+    def rounds(self) -> int:
+        """Getter for the configured cost factor."""
+        return self._rounds
+
+    @rounds.setter
+    def rounds(self, value: int) -> None:
+        """Setter for the configured cost factor."""
+        self._rounds = value
+
+    @property
+    def max_workers(self) -> int:
+        """Getter for the pool size of this process."""
+        return self._max_workers
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self._executor_kind == "process":
+                        self._executor = ProcessPoolExecutor(
+                            self._max_workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            self._max_workers,
+                            thread_name_prefix="password-hasher")
+        return self._executor
+
+    def hash(self, password: str) -> str:
+        """
+        Hash a password with the configured cost factor.
+        """
+        hashed = self._pool().submit(_hash, password.encode('utf-8'),
+                                     self._rounds).result()
+        return hashed.decode('utf-8')
+
+    def hash_many(self, passwords: Iterable[str]) -> List[str]:
+        """
+        Hash several passwords in parallel, keeping their order.
+        """
+        pool = self._pool()
+        futures = [pool.submit(_hash, password.encode('utf-8'),
+                               self._rounds) for password in passwords]
+        return [future.result().decode('utf-8') for future in futures]
+
+    def verify(self, password: str, hashed: str) -> bool:
+        """
+        Check a password against a stored hash.
+        """
+        return self._pool().submit(_verify, password.encode('utf-8'),
+                                   hashed.encode('utf-8')).result()
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """
+        Whether a stored hash uses a different cost factor than the
+        configured one.
+        """
+        try:
+            return hash_rounds(hashed) != self._rounds
+        except ValueError:
+            return True
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker pool; it is recreated on next use.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
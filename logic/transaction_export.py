@@ -0,0 +1,148 @@
+import csv
+import heapq
+import io
+import json
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database.archive import TransactionArchive
+from database.models import Account, Transaction
+from logic.transaction_history import TransactionFilters
+
+# media type of each export format
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+COLUMNS = ('id', 'created_at', 'type', 'status', 'account_id', 'account',
+           'amount', 'notes')
+STREAM_BATCH_SIZE = 1000
+
+
+class TransactionExport:
+    """
+    Streams a user's whole transaction history, newest first, as CSV or
+    NDJSON.
+
+    Rows are fetched `batch_size` at a time through a server-side cursor
+    and written out in chunks of the same size, so memory use does not
+    depend on the length of the history. Archived transactions are merged
+    in when the requested range reaches back past the archive horizon.
+
+    The export opens its own session, since the response body is produced
+    after the request that started it has returned.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session],
+                 archive: Optional[TransactionArchive] = None,
+                 batch_size: int = STREAM_BATCH_SIZE) -> None:
+        self._session_factory = session_factory
+        self._archive = archive
+        self._batch_size = batch_size
+
+    @property
+    def batch_size(self) -> int:
+        """Getter for the number of rows fetched and written at a time."""
+        return self._batch_size
+
+    def rows(self, user_id: int,
+             filters: Optional[TransactionFilters] = None
+             ) -> Iterator[Dict[str, Any]]:
+        """Yields the user's matching transactions as dicts of `COLUMNS`."""
+        filters = filters or TransactionFilters()
+        start, end = filters.bounds()
+        with self._session_factory() as session:
+            accounts = select(Account.account_id, Account.account_type).where(
+                Account.user_id == user_id)
+            if filters.account_id is not None:
+                accounts = accounts.where(
+                    Account.account_id == filters.account_id)
+            types = {row.account_id: row.account_type
+                     for row in session.execute(accounts)}
+            if not types:
+                return
+
+            statement = select(
+                Transaction.transaction_id, Transaction.created_at,
+                Transaction.transaction_type, Transaction.status,
+                Transaction.account_id, Transaction.amount, Transaction.notes
+            ).where(Transaction.account_id.in_(types))
+            if filters.transaction_type is not None:
+                statement = statement.where(
+                    Transaction.transaction_type == filters.transaction_type)
+            if start is not None:
+                statement = statement.where(Transaction.created_at >= start)
+            if end is not None:
+                statement = statement.where(Transaction.created_at < end)
+            statement = statement.order_by(
+                Transaction.created_at.desc(),
+                Transaction.transaction_id.desc()
+            ).execution_options(yield_per=self._batch_size)
+
+            live: Iterator[Any] = iter(session.execute(statement))
+            horizon = self._archive.horizon if self._archive else None
+            if self._archive is not None and horizon is not None and (
+                    start is None or start < horizon):
+                live = heapq.merge(
+                    live, self._archive.iterate(
+                        types, filters.transaction_type, start, end),
+                    key=lambda row: (row.created_at, row.transaction_id),
+                    reverse=True)
+            for row in live:
+                yield {
+                    'id': row.transaction_id,
+                    'created_at': row.created_at.isoformat(),
+                    'type': row.transaction_type.name,
+                    'status': row.status.name,
+                    'account_id': row.account_id,
+                    'account': types[row.account_id],
+                    'amount': str(row.amount),
+                    'notes': row.notes or "",
+                }
+
+    def to_csv(self, user_id: int,
+               filters: Optional[TransactionFilters] = None) -> Iterator[str]:
+        """Yields the export as chunks of CSV text, header first."""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+        writer.writeheader()
+        for count, row in enumerate(self.rows(user_id, filters), 1):
+            writer.writerow(row)
+            if count % self._batch_size == 0:
+                yield _drain(buffer)
+        if buffer.tell():
+            yield _drain(buffer)
+
+    def to_ndjson(self, user_id: int,
+                  filters: Optional[TransactionFilters] = None
+                  ) -> Iterator[str]:
+        """Yields the export as chunks of newline-delimited JSON."""
+        lines = []
+        for row in self.rows(user_id, filters):
+            lines.append(json.dumps(row) + "\n")
+            if len(lines) == self._batch_size:
+                yield "".join(lines)
+                lines = []
+        if lines:
+            yield "".join(lines)
+
+    def stream(self, user_id: int, export_format: str,
+               filters: Optional[TransactionFilters] = None) -> Iterator[str]:
+        """
+        Raises:
+            ValueError: If the format is not one of `EXPORT_FORMATS`.
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError("Invalid export format.")
+        export: Callable[..., Iterator[str]] = getattr(
+            self, f"to_{export_format}")
+        return export(user_id, filters)
+
+
+def _drain(buffer: io.StringIO) -> str:
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return text
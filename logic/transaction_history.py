@@ -0,0 +1,250 @@
+import base64
+import binascii
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from sqlalchemy import literal, tuple_
+from sqlalchemy.orm import Query
+
+from database.archive import TransactionArchive
+from database.init_db import DbSession
+from database.models import Account, Transaction, TransactionType
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at: datetime, transaction_id: int) -> str:
+    """
+    Encode the keyset position of a transaction as an opaque cursor.
+    """
+    raw = f"{created_at.isoformat()}|{transaction_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, transaction_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(transaction_id)
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise ValueError("Invalid cursor.") from e
+
+
+@dataclass
+class TransactionFilters:
+    """
+    Server-side filters for a user's transaction history.
+
+    Attributes:
+        transaction_type (TransactionType): Only this type, if set.
+        account_id (int): Only this account, if set.
+        start (date): First day to include, if set.
+        end (date): Last day to include, if set.
+    """
+    transaction_type: Optional[TransactionType] = None
+    account_id: Optional[int] = None
+    start: Optional[date] = None
+    end: Optional[date] = None
+
+    @classmethod
+    def from_args(cls, args: Mapping[str, str]) -> 'TransactionFilters':
+        """
+        Build filters from query string arguments
+        (`type`, `account`, `start`, `end`).
+
+        Raises:
+            ValueError: If any argument is invalid.
+        """
+        filters = cls()
+        type_name = args.get('type', '')
+        if type_name:
+            try:
+                filters.transaction_type = TransactionType[type_name]
+            except KeyError as e:
+                raise ValueError("Invalid transaction type.") from e
+        account = args.get('account', '')
+        if account:
+            try:
+                filters.account_id = int(account)
+            except ValueError as e:
+                raise ValueError("Invalid account.") from e
+        try:
+            if args.get('start'):
+                filters.start = date.fromisoformat(args['start'])
+            if args.get('end'):
+                filters.end = date.fromisoformat(args['end'])
+        except ValueError as e:
+            raise ValueError("Invalid date, expected YYYY-MM-DD.") from e
+        return filters
+
+    def apply(self, query: Query[Any]) -> Query[Any]:
+        """
+        Push the filters into the SQL query.
+        """
+        if self.transaction_type is not None:
+            query = query.filter(
+                Transaction.transaction_type == self.transaction_type)
+        if self.account_id is not None:
+            query = query.filter(Transaction.account_id == self.account_id)
+        start, end = self.bounds()
+        if start is not None:
+            query = query.filter(Transaction.created_at >= start)
+        if end is not None:
+            query = query.filter(Transaction.created_at < end)
+        return query
+
+    def bounds(self) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """
+        The date range as [start, end) timestamps, None where unbounded.
+        """
+        start = end = None
+        if self.start is not None:
+            start = datetime.combine(self.start, datetime.min.time())
+        if self.end is not None:
+            end = datetime.combine(self.end + timedelta(days=1),
+                                   datetime.min.time())
+        return start, end
+
+
+@dataclass
+class HistoryPage:
+    """
+    One page of a user's transaction history.
+
+    Attributes:
+        transactions (list[dict]): Serialized transactions, newest first.
+        next_cursor (str): Cursor for the following page, or None at the end.
+    """
+    transactions: List[Dict[str, Any]] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'transactions': self.transactions,
+                'next_cursor': self.next_cursor}
+
+
+class TransactionHistory:
+    """
+    Keyset-paginated access to a user's transactions, ordered by
+    (created_at, transaction_id) descending.
+
+    Given an archive, transactions older than its horizon are read from
+    the archive files and merged with those still in the database.
+    """
+
+    def __init__(self, session: DbSession,
+                 archive: Optional[TransactionArchive] = None) -> None:
+        self._session = session
+        self._archive = archive
+
+    @property
+    def session(self) -> DbSession:
+        """Getter for the database session."""
+        return self._session
+
+    def page(self, user_id: int,
+             filters: Optional[TransactionFilters] = None,
+             cursor: Optional[str] = None,
+             limit: int = DEFAULT_PAGE_SIZE) -> HistoryPage:
+        """
+        Fetch one page of transactions that come after `cursor`.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        filters = filters or TransactionFilters()
+        position = decode_cursor(cursor) if cursor else None
+        query: Query[Any] = self._session.query(
+            Transaction.transaction_id, Transaction.created_at,
+            Transaction.transaction_type, Transaction.amount,
+            Transaction.notes, Account.account_type
+        ).join(Account).filter(Account.user_id == user_id)
+        query = filters.apply(query)
+        if position is not None:
+            # the plain bound on created_at lets PostgreSQL prune the
+            # partitions newer than the cursor, which a row comparison does not
+            query = query.filter(
+                Transaction.created_at <= position[0],
+                tuple_(Transaction.created_at, Transaction.transaction_id)
+                < tuple_(literal(position[0]), literal(position[1])))
+        rows: List[Any] = query.order_by(
+            Transaction.created_at.desc(), Transaction.transaction_id.desc()
+        ).limit(limit + 1).all()
+        if self._reaches_archive(rows, filters, limit):
+            rows = sorted(
+                rows + self._archived(user_id, filters, position, limit + 1),
+                key=lambda row: (row.created_at, row.transaction_id),
+                reverse=True)[:limit + 1]
+
+        page = HistoryPage(transactions=[
+            {
+                'id': row.transaction_id,
+                'date': row.created_at.strftime("%Y-%m-%d"),
+                'type': row.transaction_type.name,
+                'account': row.account_type,
+                'amount': row.amount,
+                'notes': row.notes or "",
+            }
+            for row in rows[:limit]
+        ])
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            page.next_cursor = encode_cursor(last.created_at,
+                                             last.transaction_id)
+        return page
+
+    def _reaches_archive(self, rows: List[Any], filters: TransactionFilters,
+                         limit: int) -> bool:
+        """
+        Whether the page may include archived transactions: the requested
+        range goes back past the archive horizon and the live transactions
+        do not fill the page with newer ones.
+        """
+        horizon = self._archive.horizon if self._archive else None
+        if horizon is None:
+            return False
+        start, _ = filters.bounds()
+        if start is not None and start >= horizon:
+            return False
+        return len(rows) <= limit or rows[limit].created_at < horizon
+
+    def _archived(self, user_id: int, filters: TransactionFilters,
+                  position: Optional[Tuple[datetime, int]],
+                  limit: int) -> List[Any]:
+        """The user's archived transactions that match, as history rows."""
+        assert self._archive is not None
+        accounts = self._session.query(
+            Account.account_id, Account.account_type).filter(
+            Account.user_id == user_id)
+        if filters.account_id is not None:
+            accounts = accounts.filter(
+                Account.account_id == filters.account_id)
+        types = {row.account_id: row.account_type for row in accounts}
+        start, end = filters.bounds()
+        return [
+            _ArchivedRow(row.transaction_id, row.created_at,
+                         row.transaction_type, row.amount, row.notes,
+                         types[row.account_id])
+            for row in self._archive.scan(
+                types, transaction_type=filters.transaction_type,
+                start=start, end=end, before=position, limit=limit)
+        ]
+
+
+class _ArchivedRow(NamedTuple):
+    transaction_id: int
+    created_at: datetime
+    transaction_type: TransactionType
+    amount: Decimal
+    notes: Optional[str]
+    account_type: str
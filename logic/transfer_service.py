@@ -0,0 +1,406 @@
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from typing import TypeVar, cast
+
+from sqlalchemy import Table, bindparam, insert, select, update
+from sqlalchemy.exc import DBAPIError
+
+from database.init_db import DbSession
+from database.models import Account, Transaction
+from database.models import TransactionType, TransactionStatus
+from database.money import Money, MoneyLike, parse_amount, to_money
+from logic.ledger_version import bump_ledger_versions
+
+T = TypeVar('T')
+
+# serialization_failure and deadlock_detected
+RETRYABLE_SQLSTATES = {"40001", "40P01"}
+
+MAX_BATCH_SIZE = 5000
+
+# account ids are INTEGER columns; larger ids fail in the driver
+_ACCOUNT_IDS = range(-2 ** 31, 2 ** 31)
+
+
+class TransferError(Exception):
+    """
+    A transfer that was rejected; the message is safe to show the user.
+    """
+
+
+class InvalidAmount(TransferError):
+    def __init__(self) -> None:
+        super().__init__("Invalid amount.")
+
+
+class InvalidSourceAccount(TransferError):
+    def __init__(self) -> None:
+        super().__init__("Invalid source account.")
+
+
+class InvalidTargetAccount(TransferError):
+    def __init__(self, external: bool = False) -> None:
+        super().__init__("Invalid external target account." if external
+                         else "Invalid target account.")
+
+
+class InsufficientFunds(TransferError):
+    def __init__(self) -> None:
+        super().__init__("Insufficient funds.")
+
+
+class ConcurrentUpdate(Exception):
+    """
+    A balance changed under a batch between reading and writing it; the
+    batch chunk is rolled back and retried.
+    """
+
+
+@dataclass(frozen=True)
+class TransferRequest:
+    """
+    One item of a batch transfer.
+
+    Attributes:
+        from_account_id (int): Account to debit, owned by the user.
+        to_account_id (int): Account to credit.
+        amount (Decimal): Positive amount in whole cents.
+        external (bool): Whether the target may belong to another user.
+    """
+    from_account_id: int
+    to_account_id: int
+    amount: Decimal
+    external: bool = False
+
+    @classmethod
+    def from_dict(cls, data: Any) -> 'TransferRequest':
+        """
+        Build a request from a JSON object with `from_account`,
+        `to_account`, `amount` and optionally `type` ("internal" or
+        "external").
+
+        Raises:
+            TransferError: If the item is malformed.
+        """
+        if not isinstance(data, dict):
+            raise TransferError("Invalid transfer.")
+        transfer_type = data.get('type', 'internal')
+        if transfer_type not in ('internal', 'external'):
+            raise TransferError("Invalid transfer type.")
+        try:
+            from_account_id = int(data['from_account'])
+            to_account_id = int(data['to_account'])
+        except (KeyError, TypeError, ValueError, OverflowError):
+            raise TransferError("Invalid account.")
+        if from_account_id not in _ACCOUNT_IDS \
+                or to_account_id not in _ACCOUNT_IDS:
+            raise TransferError("Invalid account.")
+        try:
+            amount = parse_amount(str(data.get('amount', '')))
+        except (ValueError, ArithmeticError):
+            raise InvalidAmount()
+        return cls(from_account_id, to_account_id, amount,
+                   external=transfer_type == 'external')
+
+
+@dataclass
+class TransferOutcome:
+    """
+    Result of one batch item.
+
+    Attributes:
+        index (int): Position of the item in the batch.
+        error (str): Why the transfer was rejected, None if it completed.
+        from_balance (Decimal): Source balance after the transfer.
+    """
+    index: int
+    error: Optional[str] = None
+    from_balance: Optional[Decimal] = None
+
+    @property
+    def completed(self) -> bool:
+        """Whether the transfer was applied."""
+        return self.error is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.error is not None:
+            return {'index': self.index, 'status': 'rejected',
+                    'error': self.error}
+        return {'index': self.index, 'status': 'completed',
+                'from_balance': str(self.from_balance)}
+
+
+@dataclass
+class TransferResult:
+    """
+    Attributes:
+        from_balance (Decimal): Balance of the source account afterwards.
+        attempts (int): How many attempts the transfer took.
+    """
+    from_balance: Decimal
+    attempts: int = 1
+
+
+def is_retryable(error: DBAPIError) -> bool:
+    """
+    Whether a database error is a transient serialization failure,
+    deadlock or (on SQLite) lock timeout that is worth retrying.
+    """
+    orig = error.orig
+    sqlstate = getattr(orig, 'pgcode', None) or getattr(orig, 'sqlstate',
+                                                        None)
+    if sqlstate in RETRYABLE_SQLSTATES:
+        return True
+    return "database is locked" in str(orig)
+
+
+class TransferService:
+    """
+    Moves money between accounts without reading balances into Python.
+
+    The source is debited with a conditional
+    `UPDATE ... WHERE balance >= :amount RETURNING balance`, so concurrent
+    transfers can neither lose updates nor overdraw. Both rows are
+    updated in ascending account id order, so two transfers between the
+    same pair of accounts always lock them in the same order and cannot
+    deadlock. Transient serialization failures are retried.
+    """
+
+    def __init__(self, session: DbSession, max_retries: int = 3,
+                 backoff: float = 0.01) -> None:
+        self._session = session
+        self._max_retries = max_retries
+        self._backoff = backoff
+
+    @property
+    def session(self) -> DbSession:
+        """Getter for the database session."""
+        return self._session
+
+    def transfer(self, user_id: int, from_account_id: int,
+                 to_account_id: int, amount: MoneyLike,
+                 external: bool = False) -> TransferResult:
+        """
+        Transfer `amount` from one of the user's accounts to another of
+        their accounts, or to any account if `external`, and commit.
+
+        Raises:
+            TransferError: If the transfer is rejected.
+        """
+        result, attempts = self._run(lambda: self.apply(
+            user_id, from_account_id, to_account_id, amount, external))
+        result.attempts = attempts
+        return result
+
+    def transfer_batch(self, user_id: int, items: Sequence[Any],
+                       chunk_size: Optional[int] = None
+                       ) -> List[TransferOutcome]:
+        """
+        Apply many transfers for one user, each item a `TransferRequest`
+        or a mapping accepted by `TransferRequest.from_dict`.
+
+        Each chunk of `chunk_size` items (default: all of them) runs in one
+        transaction: the accounts it touches are read and locked with a
+        single `SELECT ... FOR UPDATE` in account id order, the transfers
+        are checked in order against those balances, and the net change
+        per account and the transaction rows are written with one
+        executemany each. A rejected item does not affect the others.
+
+        Returns:
+            list[TransferOutcome]: One outcome per item, in input order.
+        """
+        outcomes: List[Optional[TransferOutcome]] = [None] * len(items)
+        valid: List[Tuple[int, TransferRequest]] = []
+        for index, item in enumerate(items):
+            try:
+                valid.append((index, item if isinstance(item, TransferRequest)
+                              else TransferRequest.from_dict(item)))
+            except TransferError as e:
+                outcomes[index] = TransferOutcome(index, error=str(e))
+
+        size = chunk_size or len(valid) or 1
+        for start in range(0, len(valid), size):
+            chunk = valid[start:start + size]
+            applied, _ = self._run(
+                lambda: self._apply_chunk(user_id, chunk))
+            for outcome in applied:
+                outcomes[outcome.index] = outcome
+        return [outcome for outcome in outcomes if outcome is not None]
+
+    def _run(self, work: Callable[[], T]) -> Tuple[T, int]:
+        """
+        Run `work` and commit, retrying transient failures with jittered
+        exponential backoff.
+
+        Returns:
+            tuple: The result of `work` and the number of attempts.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = work()
+                self._session.commit()
+                return result, attempt
+            except TransferError:
+                self._session.rollback()
+                raise
+            except (DBAPIError, ConcurrentUpdate) as e:
+                self._session.rollback()
+                if attempt > self._max_retries or (
+                        isinstance(e, DBAPIError) and not is_retryable(e)):
+                    raise
+                time.sleep(self._backoff * 2 ** (attempt - 1)
+                           * (1 + random.random()))
+
+    def apply(self, user_id: Optional[int], from_account_id: int,
+              to_account_id: int, amount: MoneyLike,
+              external: bool = False) -> TransferResult:
+        """
+        Perform the transfer in the session's current transaction without
+        committing it. A `user_id` of None skips the ownership checks, for
+        postings made by the bank itself such as reversals.
+
+        Raises:
+            TransferError: If the transfer is rejected; the caller must
+                roll back.
+        """
+        amount = to_money(amount)
+        if amount <= 0:
+            raise InvalidAmount()
+        if from_account_id == to_account_id:
+            raise InvalidTargetAccount(external)
+
+        debit = update(Account).where(
+            Account.account_id == from_account_id,
+            Account.balance >= amount
+        ).values(balance=Account.balance - amount).returning(Account.balance)
+        credit = update(Account).where(
+            Account.account_id == to_account_id
+        ).values(balance=Account.balance + amount).returning(
+            Account.account_id)
+        if user_id is not None:
+            debit = debit.where(Account.user_id == user_id)
+            if not external:
+                credit = credit.where(Account.user_id == user_id)
+
+        from_balance: Optional[Decimal] = None
+        steps = sorted([(from_account_id, debit), (to_account_id, credit)],
+                       key=lambda step: step[0])
+        for account_id, statement in steps:
+            row = self._execute(statement).first()
+            if row is None:
+                if account_id == to_account_id:
+                    raise InvalidTargetAccount(external)
+                raise self._debit_failure(user_id, from_account_id)
+            if account_id == from_account_id:
+                from_balance = row[0]
+
+        self._execute(insert(Transaction), [
+            {'account_id': from_account_id,
+             'transaction_type': TransactionType.withdrawal,
+             'amount': amount, 'status': TransactionStatus.completed},
+            {'account_id': to_account_id,
+             'transaction_type': TransactionType.deposit,
+             'amount': amount, 'status': TransactionStatus.completed},
+        ])
+        bump_ledger_versions(self._session, [from_account_id, to_account_id])
+        assert from_balance is not None
+        return TransferResult(from_balance=from_balance)
+
+    def _apply_chunk(self, user_id: int,
+                     chunk: List[Tuple[int, TransferRequest]]
+                     ) -> List[TransferOutcome]:
+        account_ids = sorted({request.from_account_id for _, request in chunk}
+                             | {request.to_account_id for _, request in chunk})
+        rows = self._session.execute(
+            select(Account.account_id, Account.user_id, Account.balance)
+            .where(Account.account_id.in_(account_ids))
+            .order_by(Account.account_id).with_for_update()).all()
+        owners = {row.account_id: row.user_id for row in rows}
+        balances = {row.account_id: row.balance for row in rows}
+
+        deltas: Dict[int, Decimal] = defaultdict(Decimal)
+        records: List[Dict[str, Any]] = []
+        outcomes = []
+        for index, request in chunk:
+            try:
+                self._check(user_id, request, owners, balances)
+            except TransferError as e:
+                outcomes.append(TransferOutcome(index, error=str(e)))
+                continue
+            source, target = request.from_account_id, request.to_account_id
+            balances[source] -= request.amount
+            balances[target] += request.amount
+            deltas[source] -= request.amount
+            deltas[target] += request.amount
+            records += [
+                {'account_id': source,
+                 'transaction_type': TransactionType.withdrawal,
+                 'amount': request.amount,
+                 'status': TransactionStatus.completed},
+                {'account_id': target,
+                 'transaction_type': TransactionType.deposit,
+                 'amount': request.amount,
+                 'status': TransactionStatus.completed},
+            ]
+            outcomes.append(TransferOutcome(index,
+                                            from_balance=balances[source]))
+
+        changes: List[Dict[str, Any]] = [
+            {'id': account_id, 'delta': delta}
+            for account_id, delta in sorted(deltas.items()) if delta]
+        if changes:
+            # relative updates guarded against overdraft, so a write that
+            # slipped past the row locks (SQLite has none) is detected
+            accounts = cast(Table, Account.__table__)
+            delta = bindparam('delta', type_=Money)
+            updated = self._session.execute(
+                accounts.update().where(
+                    accounts.c.account_id == bindparam('id'),
+                    accounts.c.balance + delta >= 0
+                ).values(balance=accounts.c.balance + delta),
+                changes)
+            if updated.rowcount != len(changes):  # type: ignore
+                raise ConcurrentUpdate()
+            bump_ledger_versions(self._session,
+                                 [change['id'] for change in changes])
+        if records:
+            self._execute(insert(Transaction), records)
+        return outcomes
+
+    @staticmethod
+    def _check(user_id: int, request: TransferRequest,
+               owners: Dict[int, int], balances: Dict[int, Decimal]) -> None:
+        """Same rules as `apply`, against the balances locked in memory."""
+        if owners.get(request.from_account_id) != user_id:
+            raise InvalidSourceAccount()
+        if request.from_account_id == request.to_account_id \
+                or request.to_account_id not in owners \
+                or (not request.external
+                    and owners[request.to_account_id] != user_id):
+            raise InvalidTargetAccount(request.external)
+        if balances[request.from_account_id] < request.amount:
+            raise InsufficientFunds()
+
+    def _execute(self, statement: Any, params: Any = None) -> Any:
+        return self._session.execute(
+            statement, params,
+            execution_options={'synchronize_session': False})
+
+    def _debit_failure(self, user_id: Optional[int],
+                       from_account_id: int) -> TransferError:
+        """
+        Tell apart a missing source account from a short balance; only
+        runs after the conditional debit matched no row.
+        """
+        owned_account = select(Account.account_id).where(
+            Account.account_id == from_account_id)
+        if user_id is not None:
+            owned_account = owned_account.where(Account.user_id == user_id)
+        owned = self._session.execute(owned_account).first()
+        return InsufficientFunds() if owned else InvalidSourceAccount()
@@ -1,61 +1,105 @@
-import bcrypt
-from database.models import User, Role
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func
+
+from database.init_db import DbSession
+from database.models import User, Role, Account, Transaction
+from database.models import TransactionType, TransactionStatus
+from database.money import to_money
+from logic.bank_system import BankSystem
+from logic.password_hasher import PasswordHasher
+
+logger = logging.getLogger(__name__)
+
+# every new user starts with these accounts and opening deposits
+STARTER_ACCOUNTS = (
+    ('Checking Account', to_money('500.00')),
+    ('Savings Account', to_money('1500.00')),
+    ('Business Account', to_money('3000.00')),
+)
+
+
+def starter_accounts() -> List[Account]:
+    """
+    Build the starter accounts, each with its opening deposit.
+    """
+    return [
+        Account(account_type=account_type, balance=balance,
+                transactions=[Transaction(
+                    transaction_type=TransactionType.deposit,
+                    amount=balance,
+                    status=TransactionStatus.completed)])
+        for account_type, balance in STARTER_ACCOUNTS
+    ]
 
 
 class UserAuth:
-    def __init__(self, bank_system, session):
+    def __init__(self, bank_system: BankSystem, session: DbSession,
+                 password_hasher: Optional[PasswordHasher] = None) -> None:
         """
-        Initialize UserAuth with bank system and database session.
+        Initialize UserAuth with bank system, database session and the
+        password hashing service.
         """
         self._bank_system = bank_system
         self._session = session
+        self._password_hasher = password_hasher or PasswordHasher()
 
     @property
-    def bank_system(self):
+    def bank_system(self) -> BankSystem:
         """Getter for the bank system."""
         return self._bank_system
 
     @bank_system.setter
-    def bank_system(self, value):
+    def bank_system(self, value: BankSystem) -> None:
         """Setter for the bank system."""
         self._bank_system = value
 
     @property
-    def session(self):
+    def session(self) -> DbSession:
         """Getter for the database session."""
         return self._session
 
     @session.setter
-    def session(self, value):
+    def session(self, value: DbSession) -> None:
         """Setter for the database session."""
         self._session = value
 
-    def register_user(self, username, email, password):
+    @property
+    def password_hasher(self) -> PasswordHasher:
+        """Getter for the password hashing service."""
+        return self._password_hasher
+
+    def register_user(self, username: str, email: str,
+                      password: str) -> Dict[str, Any]:
         """
-        Register a new user with a hashed password and default role.
+        Register a new user with a hashed password and default role,
+        along with the starter accounts and their opening deposits.
+        Everything is written in a single transaction; the flush assigns
+        the user and account ids the dependent rows need.
         """
-        existing_user = self._session.query(User).filter_by(
-            username=username).first()
+        existing_user = self._session.query(User).filter(
+            func.lower(User.username) == username.lower()).first()
         if existing_user:
             return {'success': False, 'message': 'User already exists.'}
 
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'),
-                                        bcrypt.gensalt()).decode('utf-8')
+        hashed_password = self._password_hasher.hash(password)
 
         new_user = User(
             username=username,
             email=email,
             password_hash=hashed_password,
-            role=Role.user
+            role=Role.user,
+            accounts=starter_accounts()
         )
 
         try:
             self._session.add(new_user)
             self._session.commit()
-            print(f"User {username} registered successfully.")
-            return {'success': True}
-        except Exception as e:
+            logger.info("User %s registered", username)
+            return {'success': True, 'user_id': new_user.user_id}
+        except Exception:
             self._session.rollback()
-            print(f"Error adding user to the database: {e}")
+            logger.exception("Adding user %s to the database failed", username)
             return {'success': False, 'message': 'An error occurred while\
                  registering.'}
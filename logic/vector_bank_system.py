@@ -0,0 +1,251 @@
+from decimal import Decimal
+from typing import Dict, Mapping, Optional, Union
+
+import numpy as np
+import numpy.typing as npt
+
+from database.money import MoneyLike, from_cents, to_cents
+
+IntArray = npt.NDArray[np.int64]
+BoolArray = npt.NDArray[np.bool_]
+IdsLike = Union[npt.ArrayLike, int]
+
+
+class VectorBankSystem:
+    """
+    In-memory bank engine keeping balances as int64 cents in contiguous
+    NumPy arrays, with an account id -> slot index.
+
+    Offers the scalar operations of `BankSystem` plus batch operations
+    that apply thousands of deposits, withdrawals or transfers at once.
+
+    Batch debits are checked against the balances at the start of the
+    batch: per account, debits are accepted in order while their running
+    total fits the opening balance, and every later debit of that account
+    is rejected. Credits from the same batch only count once it is
+    applied, so a batch can never overdraw an account.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        capacity = max(capacity, 1)
+        self._balances: IntArray = np.zeros(capacity, dtype=np.int64)
+        self._owners: IntArray = np.zeros(capacity, dtype=np.int64)
+        self._ids: IntArray = np.zeros(capacity, dtype=np.int64)
+        self._slots: Dict[int, int] = {}
+        self._size = 0
+        # sorted account ids and their slots, rebuilt after accounts change
+        self._index: Optional[tuple[IntArray, IntArray]] = None
+
+    @classmethod
+    def from_accounts(cls, accounts: Mapping[int, Mapping[int, MoneyLike]]
+                      ) -> 'VectorBankSystem':
+        """
+        Build an engine from the `{user_id: {account_id: balance}}` shape
+        used by `BankSystem.accounts`.
+        """
+        engine = cls(sum(len(balances) for balances in accounts.values()))
+        for user_id, balances in accounts.items():
+            for account_id, balance in balances.items():
+                engine.add_account(user_id, account_id, balance)
+        return engine
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def accounts(self) -> Dict[int, Dict[int, Decimal]]:
+        """Snapshot of all balances, shaped like `BankSystem.accounts`."""
+        accounts: Dict[int, Dict[int, Decimal]] = {}
+        for slot in range(self._size):
+            accounts.setdefault(int(self._owners[slot]), {})[
+                int(self._ids[slot])] = from_cents(self._balances[slot])
+        return accounts
+
+    @property
+    def total(self) -> Decimal:
+        """Sum of all balances."""
+        return from_cents(int(self._balances[:self._size].sum()))
+
+    def add_account(self, user_id: int, account_id: int,
+                    balance: MoneyLike = 0) -> None:
+        """
+        Add an account, or reset the balance of an existing one.
+
+        Raises:
+            ValueError: If the account belongs to another user.
+        """
+        slot = self._slots.get(account_id)
+        if slot is not None:
+            if self._owners[slot] != user_id:
+                raise ValueError("Account belongs to another user.")
+            self._balances[slot] = to_cents(balance)
+            return
+        if self._size == len(self._balances):
+            self._grow()
+        slot = self._size
+        self._balances[slot] = to_cents(balance)
+        self._owners[slot] = user_id
+        self._ids[slot] = account_id
+        self._slots[account_id] = slot
+        self._size += 1
+        self._index = None
+
+    def balance(self, account_id: int) -> Optional[Decimal]:
+        """Balance of an account, None if it is unknown."""
+        slot = self._slots.get(account_id)
+        return None if slot is None else from_cents(self._balances[slot])
+
+    def get_user_accounts(self, user_id: int) -> Dict[int, Decimal]:
+        """Balances of a user's accounts."""
+        return self.accounts.get(user_id, {})
+
+    def deposit(self, user_id: int, account_id: int,
+                amount: MoneyLike) -> bool:
+        """
+        Deposit an amount into the specified user account.
+
+        Returns:
+            bool: Whether the deposit was applied.
+        """
+        return bool(self.deposit_many([account_id], [to_cents(amount)],
+                                      user_ids=user_id)[0])
+
+    def withdraw(self, user_id: int, account_id: int,
+                 amount: MoneyLike) -> bool:
+        """
+        Withdraw an amount from the specified user account, unless that
+        would overdraw it.
+
+        Returns:
+            bool: Whether the withdrawal was applied.
+        """
+        return bool(self.withdraw_many([account_id], [to_cents(amount)],
+                                       user_ids=user_id)[0])
+
+    def transfer_funds(self, user_id: int, from_account: int, to_account: int,
+                       amount: MoneyLike) -> bool:
+        """
+        Transfer funds between two of the user's accounts.
+
+        Returns:
+            bool: Whether the transfer was applied.
+        """
+        return bool(self.transfer_many([from_account], [to_account],
+                                       [to_cents(amount)],
+                                       user_ids=user_id)[0])
+
+    def slots(self, account_ids: npt.ArrayLike) -> IntArray:
+        """Slots of the given account ids, -1 for unknown accounts."""
+        ids = np.asarray(account_ids, dtype=np.int64)
+        if self._index is None:
+            order = np.argsort(self._ids[:self._size], kind='stable')
+            self._index = (self._ids[:self._size][order],
+                           order.astype(np.int64))
+        sorted_ids, sorted_slots = self._index
+        if not len(sorted_ids):
+            return np.full(ids.shape, -1, dtype=np.int64)
+        position = np.minimum(np.searchsorted(sorted_ids, ids),
+                              len(sorted_ids) - 1)
+        found = sorted_ids[position] == ids
+        return np.where(found, sorted_slots[position], -1)
+
+    def deposit_many(self, account_ids: npt.ArrayLike, cents: npt.ArrayLike,
+                     user_ids: Optional[IdsLike] = None) -> BoolArray:
+        """
+        Deposit `cents[i]` into `account_ids[i]` for every i.
+
+        Args:
+            user_ids: If given (one per operation or a single id), an
+                operation only applies to an account owned by that user.
+
+        Returns:
+            numpy.ndarray: Boolean mask of the operations that applied.
+        """
+        slots, amounts = self._prepare(account_ids, cents)
+        applied = self._valid(slots, amounts, user_ids)
+        np.add.at(self._balances, slots[applied], amounts[applied])
+        return applied
+
+    def withdraw_many(self, account_ids: npt.ArrayLike, cents: npt.ArrayLike,
+                      user_ids: Optional[IdsLike] = None) -> BoolArray:
+        """
+        Withdraw `cents[i]` from `account_ids[i]` for every i, masking out
+        withdrawals that would overdraw (see the class docstring).
+
+        Returns:
+            numpy.ndarray: Boolean mask of the operations that applied.
+        """
+        slots, amounts = self._prepare(account_ids, cents)
+        applied = self._covered(slots, amounts,
+                                self._valid(slots, amounts, user_ids))
+        np.subtract.at(self._balances, slots[applied], amounts[applied])
+        return applied
+
+    def transfer_many(self, from_ids: npt.ArrayLike, to_ids: npt.ArrayLike,
+                      cents: npt.ArrayLike,
+                      user_ids: Optional[IdsLike] = None) -> BoolArray:
+        """
+        Transfer `cents[i]` from `from_ids[i]` to `to_ids[i]` for every i,
+        masking out transfers that would overdraw the source.
+
+        Args:
+            user_ids: If given, both accounts of a transfer must belong to
+                that user, as in `BankSystem.transfer_funds`.
+
+        Returns:
+            numpy.ndarray: Boolean mask of the operations that applied.
+        """
+        sources, amounts = self._prepare(from_ids, cents)
+        targets = self.slots(np.atleast_1d(np.asarray(to_ids)))
+        if targets.shape != sources.shape:
+            raise ValueError("from_ids and to_ids differ in length.")
+        valid = (self._valid(sources, amounts, user_ids)
+                 & self._valid(targets, amounts, user_ids)
+                 & (sources != targets))
+        applied = self._covered(sources, amounts, valid)
+        np.subtract.at(self._balances, sources[applied], amounts[applied])
+        np.add.at(self._balances, targets[applied], amounts[applied])
+        return applied
+
+    def _prepare(self, account_ids: npt.ArrayLike,
+                 cents: npt.ArrayLike) -> tuple[IntArray, IntArray]:
+        slots = self.slots(np.atleast_1d(np.asarray(account_ids)))
+        amounts = np.atleast_1d(np.asarray(cents, dtype=np.int64))
+        if amounts.shape != slots.shape:
+            raise ValueError("account_ids and cents differ in length.")
+        return slots, amounts
+
+    def _valid(self, slots: IntArray, amounts: IntArray,
+               user_ids: Optional[IdsLike]) -> BoolArray:
+        """Known accounts, positive amounts and (if given) owned by user."""
+        valid: BoolArray = (slots >= 0) & (amounts > 0)
+        if user_ids is not None:
+            owners = self._owners[np.where(valid, slots, 0)]
+            valid &= owners == np.asarray(user_ids, dtype=np.int64)
+        return valid
+
+    def _covered(self, slots: IntArray, amounts: IntArray,
+                 valid: BoolArray) -> BoolArray:
+        """
+        Valid debits whose running total per account, in batch order,
+        still fits the account's opening balance.
+        """
+        debits = np.where(valid, amounts, 0)
+        order = np.argsort(slots, kind='stable')
+        grouped, running = slots[order], np.cumsum(debits[order])
+        starts = np.ones(len(grouped), dtype=bool)
+        starts[1:] = grouped[1:] != grouped[:-1]
+        # running total before each account's first debit
+        before = np.maximum.accumulate(
+            np.where(starts, running - debits[order], 0))
+        opening = self._balances[np.where(grouped >= 0, grouped, 0)]
+        covered = np.empty(len(slots), dtype=bool)
+        covered[order] = running - before <= opening
+        return valid & covered
+
+    def _grow(self) -> None:
+        capacity = 2 * len(self._balances)
+        for name in ('_balances', '_owners', '_ids'):
+            grown = np.zeros(capacity, dtype=np.int64)
+            grown[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, grown)
@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database.init_db import init_db
+from database.models import User, Account, Role
+from logic.admin_overview import AdminOverview
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:")
+    init_db(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    session = sessionmaker(bind=engine)()
+    # user i has i accounts holding 10.0 each; user 0 has none
+    for i in range(7):
+        user = User(username=f"user{i}", email=f"user{i}@example.com",
+                    password_hash="hashed", role=Role.user)
+        session.add(user)
+        session.flush()
+        session.add_all([Account(user_id=user.user_id, account_type="Checking",
+                                 balance=10.0) for _ in range(i)])
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_aggregates_per_user(session):
+    page = AdminOverview(session).page(per_page=10)
+    assert page.total == 7
+    assert page.pages == 1
+    by_name = {user['username']: user for user in page.users}
+    assert by_name['user0']['num_accounts'] == 0
+    assert by_name['user0']['balance'] == 0
+    assert by_name['user3']['num_accounts'] == 3
+    assert by_name['user3']['balance'] == 30.0
+
+
+def test_pagination(session):
+    overview = AdminOverview(session)
+    first = overview.page(page=1, per_page=3)
+    last = overview.page(page=3, per_page=3)
+    assert first.pages == 3
+    assert len(first.users) == 3
+    assert len(last.users) == 1
+    assert overview.page(page=4, per_page=3).total == 7
+
+
+@pytest.mark.parametrize("sort,order,expected", [
+    ('balance', 'desc', ['user6', 'user5', 'user4']),
+    ('accounts', 'asc', ['user0', 'user1', 'user2']),
+    ('username', 'desc', ['user6', 'user5', 'user4']),
+])
+def test_sorting(session, sort, order, expected):
+    page = AdminOverview(session).page(per_page=3, sort=sort, order=order)
+    assert [user['username'] for user in page.users] == expected
+
+
+def test_invalid_sort(session):
+    with pytest.raises(ValueError):
+        AdminOverview(session).page(sort='password_hash')
+    with pytest.raises(ValueError):
+        AdminOverview(session).page(order='sideways')
+
+
+def test_single_statement(engine, session):
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]))
+    AdminOverview(session).page(per_page=3)
+    assert len(statements) == 1
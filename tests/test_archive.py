@@ -0,0 +1,177 @@
+import os
+import pytest
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from decimal import Decimal
+from unittest.mock import patch
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+from database.archive import DEFAULT_ARCHIVE_DIR, TransactionArchive
+from database.archive import archive_transactions
+from database.init_db import create_engine_from_env, init_db
+from database.models import (
+    User, Account, Transaction, Role, TransactionType, TransactionStatus
+)
+from logic.transaction_history import TransactionHistory, TransactionFilters
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+CUTOFF = datetime(2024, 4, 1)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine_from_env(f"sqlite:///{tmp_path / 'bank.db'}")
+    init_db(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return TransactionArchive(str(tmp_path / "archive"))
+
+
+@pytest.fixture
+def accounts(session):
+    """One user with two accounts and 60 transactions over six months."""
+    owner = User(username="owner", email="owner@example.com",
+                 password_hash="hashed", role=Role.user)
+    session.add(owner)
+    session.flush()
+    checking = Account(user_id=owner.user_id, account_type="Checking Account",
+                       balance=100)
+    savings = Account(user_id=owner.user_id, account_type="Savings Account",
+                      balance=100)
+    session.add_all([checking, savings])
+    session.flush()
+    for i in range(60):
+        session.add(Transaction(
+            account_id=checking.account_id if i % 2 else savings.account_id,
+            transaction_type=(TransactionType.deposit if i % 3
+                              else TransactionType.withdrawal),
+            amount=Decimal(i) + Decimal("0.25"),
+            status=(TransactionStatus.pending if i == 0
+                    else TransactionStatus.completed),
+            created_at=START + timedelta(days=3 * i), notes=f"#{i}"))
+    session.commit()
+    ids = owner.user_id, checking.account_id, savings.account_id
+    # reading the ids began a transaction; end it so archival shows up
+    session.commit()
+    return ids
+
+
+def live_count(engine):
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(
+            Transaction)).scalar_one()
+
+
+def all_pages(history, user_id, filters=None, limit=7):
+    transactions, cursor = [], None
+    while True:
+        page = history.page(user_id, filters, cursor=cursor, limit=limit)
+        transactions.extend(page.transactions)
+        cursor = page.next_cursor
+        if cursor is None:
+            return transactions
+
+
+def test_archival_moves_old_transactions(engine, archive, accounts):
+    _, checking, savings = accounts
+
+    moved = archive_transactions(engine, archive, CUTOFF)
+
+    # 31 before the cutoff, of which the pending one stays
+    assert moved == 30
+    assert live_count(engine) == 30
+    assert archive.horizon == CUTOFF
+    assert archive.months(checking) == [date(2024, 3, 1), date(2024, 2, 1),
+                                        date(2024, 1, 1)]
+    archived = archive.scan([checking, savings])
+    assert len(archived) == 30
+    assert archived[0].created_at < CUTOFF
+    assert {row.status for row in archived} == {TransactionStatus.completed}
+    assert archived[-1].amount == Decimal("1.25")
+    assert archived[-1].notes == "#1"
+
+
+def test_archival_can_be_rerun(engine, archive, accounts):
+    _, checking, savings = accounts
+    archive_transactions(engine, archive, CUTOFF)
+    rows = archive.scan([checking])
+    # as if the previous run had stopped before deleting the rows
+    archive.write(checking, date(2024, 1, 1), [
+        {'transaction_id': row.transaction_id, 'account_id': checking,
+         'transaction_type': row.transaction_type.name, 'amount': 1,
+         'status': row.status.name, 'created_at': row.created_at,
+         'notes': None}
+        for row in rows if row.created_at < datetime(2024, 2, 1)])
+    assert archive_transactions(engine, archive, CUTOFF) == 0
+    assert len(archive.scan([checking, savings])) == 30
+    archive.horizon = START
+    assert archive.horizon == CUTOFF
+
+
+def test_horizon_is_read_once_per_change(archive):
+    assert archive.horizon is None
+    archive.horizon = START
+    with patch('pathlib.Path.read_text', autospec=True,
+               side_effect=lambda path: START.isoformat()) as read:
+        assert archive.horizon == START
+        assert archive.horizon == START
+    assert read.call_count == 1
+    # another process moves the horizon on
+    TransactionArchive(str(archive.root)).horizon = CUTOFF
+    assert archive.horizon == CUTOFF
+
+
+def test_default_archive_dir_does_not_depend_on_the_cwd(monkeypatch):
+    monkeypatch.delenv("TRANSACTION_ARCHIVE_DIR", raising=False)
+    assert os.path.isabs(DEFAULT_ARCHIVE_DIR)
+    assert TransactionArchive().root == Path(DEFAULT_ARCHIVE_DIR)
+
+
+@pytest.mark.parametrize("filters", [
+    None,
+    TransactionFilters(transaction_type=TransactionType.withdrawal),
+    TransactionFilters(start=date(2024, 3, 10), end=date(2024, 4, 20)),
+    TransactionFilters(start=date(2024, 1, 5), end=date(2024, 1, 20)),
+])
+def test_history_merges_archived_and_live(engine, session, archive,
+                                          accounts, filters):
+    user_id = accounts[0]
+    history = TransactionHistory(session, archive)
+    before = all_pages(history, user_id, filters)
+    session.commit()
+
+    archive_transactions(engine, archive, CUTOFF)
+
+    assert all_pages(history, user_id, filters) == before
+    assert all_pages(history, user_id, filters, limit=200) == before
+
+
+def test_history_filters_archived_accounts(engine, session, archive,
+                                           accounts):
+    user_id, checking, _ = accounts
+    archive_transactions(engine, archive, CUTOFF)
+    page = TransactionHistory(session, archive).page(
+        user_id, TransactionFilters(account_id=checking), limit=200)
+    assert len(page.transactions) == 30
+    assert {row['account'] for row in page.transactions} == {
+        "Checking Account"}
+
+
+def test_recent_pages_skip_the_archive(engine, session, archive, accounts,
+                                       monkeypatch):
+    user_id = accounts[0]
+    archive_transactions(engine, archive, CUTOFF)
+    monkeypatch.setattr(TransactionArchive, 'scan', pytest.fail)
+    page = TransactionHistory(session, archive).page(user_id, limit=10)
+    assert len(page.transactions) == 10
@@ -0,0 +1,128 @@
+import gzip
+import json
+import shutil
+import pytest
+from pathlib import Path
+from flask import Flask, Response, jsonify, render_template_string
+from logic.assets import (
+    BUNDLES, IMMUTABLE, StaticAssets, build_assets, minify_css, minify_js
+)
+from logic.compression import ResponseCompression
+
+STATIC = Path(__file__).resolve().parent.parent / "banking_app" / "static"
+
+
+@pytest.fixture
+def static_folder(tmp_path):
+    folder = tmp_path / "static"
+    shutil.copytree(STATIC, folder, ignore=shutil.ignore_patterns("dist"))
+    return folder
+
+
+def make_app(static_folder):
+    app = Flask(__name__, static_folder=str(static_folder))
+    StaticAssets(app)
+    ResponseCompression(app, min_size=100)
+
+    @app.route('/page')
+    def page():
+        return render_template_string(
+            "{{ stylesheets('dashboard.css') }}{{ scripts('history.js') }}")
+
+    @app.route('/json/<int:size>')
+    def payload(size):
+        return jsonify(data="x" * size)
+
+    @app.route('/stream')
+    def stream():
+        return Response(iter(["x" * 500]), mimetype='application/json')
+
+    return app
+
+
+def test_minify_css():
+    assert minify_css("""
+        /* the name */
+        h1 span,
+        .card > p {
+            color: #004aad; /* highlight */
+            font-family: 'Poppins', sans-serif;
+        }
+    """) == "h1 span,.card>p{color:#004aad;font-family:'Poppins',sans-serif}"
+
+
+def test_minify_js_keeps_line_breaks():
+    assert minify_js("""
+        // comment
+        const url = "http://example.com";
+
+            load(url)
+    """) == 'const url = "http://example.com";\nload(url)'
+
+
+def test_build_fingerprints_and_precompresses(static_folder):
+    manifest = build_assets(str(static_folder))
+
+    assert set(manifest) == set(BUNDLES)
+    dist = static_folder / "dist"
+    assert json.loads((dist / "manifest.json").read_text()) == manifest
+    built = dist / manifest['dashboard.css']
+    assert built.name.startswith("dashboard.") and built.suffix == ".css"
+    content = built.read_bytes()
+    assert gzip.decompress((dist / (built.name + ".gz")).read_bytes()) \
+        == content
+    # the bundle carries the sidebar styles along with the page's own
+    assert b".sidebar" in content and b".recent-activity" in content
+    assert build_assets(str(static_folder)) == manifest
+
+    (static_folder / "css" / "dashboard.css").write_text("h1 { color: red }")
+    changed = build_assets(str(static_folder))
+    assert changed['dashboard.css'] != manifest['dashboard.css']
+    assert changed['history.js'] == manifest['history.js']
+
+
+def test_sources_are_linked_until_assets_are_built(static_folder):
+    page = make_app(static_folder).test_client().get('/page').data.decode()
+    assert '<link rel="stylesheet" href="/static/css/sidebar.css">' in page
+    assert '<link rel="stylesheet" href="/static/css/dashboard.css">' in page
+    assert '<script src="/static/js/history.js" defer></script>' in page
+
+
+def test_built_assets_are_served_immutable_and_precompressed(static_folder):
+    manifest = build_assets(str(static_folder))
+    client = make_app(static_folder).test_client()
+
+    page = client.get('/page').data.decode()
+    url = f"/assets/{manifest['dashboard.css']}"
+    assert page.count("<link") == 1 and f'href="{url}"' in page
+
+    plain = client.get(url)
+    assert plain.status_code == 200
+    assert plain.mimetype == 'text/css'
+    assert plain.headers['Cache-Control'] == IMMUTABLE
+    assert 'Accept-Encoding' in plain.headers['Vary']
+    assert 'Content-Encoding' not in plain.headers
+
+    compressed = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.mimetype == 'text/css'
+    assert gzip.decompress(compressed.data) == plain.data
+
+    assert client.get('/assets/missing.css').status_code == 404
+
+
+def test_dynamic_responses_are_gzipped_above_the_threshold(static_folder):
+    client = make_app(static_folder).test_client()
+    headers = {'Accept-Encoding': 'gzip, deflate'}
+
+    large = client.get('/json/1000', headers=headers)
+    assert large.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(large.data)) == {'data': "x" * 1000}
+    assert 'Accept-Encoding' in large.headers['Vary']
+
+    assert 'Content-Encoding' not in client.get(
+        '/json/10', headers=headers).headers
+    assert 'Content-Encoding' not in client.get('/json/1000').headers
+    streamed = client.get('/stream', headers=headers)
+    assert 'Content-Encoding' not in streamed.headers
+    assert streamed.data == b"x" * 500
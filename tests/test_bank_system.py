@@ -1,4 +1,13 @@
+import threading
+import time
 import pytest
+from decimal import Decimal
+from unittest.mock import Mock, patch
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from database.init_db import create_engine_from_env, init_db
+from database.models import User, Account, Transaction, Role
 from logic.bank_system import BankSystem
 
 
@@ -45,3 +54,247 @@ def test_get_user_accounts(bank_system):
     assert user_1_accounts == {1001: 100.0}
     user_3_accounts = bank_system.get_user_accounts(3)
     assert user_3_accounts == []
+
+
+@pytest.fixture
+def Session(tmp_path):
+    engine = create_engine_from_env(f"sqlite:///{tmp_path / 'bank.db'}")
+    init_db(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def stored(Session):
+    with Session() as session:
+        alice = User(username="alice", email="alice@example.com",
+                     password_hash="hashed", role=Role.user,
+                     accounts=[Account(account_type="Checking Account",
+                                       balance=100),
+                               Account(account_type="Savings Account",
+                                       balance=0)])
+        bob = User(username="bob", email="bob@example.com",
+                   password_hash="hashed", role=Role.user,
+                   accounts=[Account(account_type="Checking Account",
+                                     balance=50)])
+        session.add_all([alice, bob])
+        session.commit()
+        return (alice.user_id, [a.account_id for a in alice.accounts],
+                bob.user_id, bob.accounts[0].account_id)
+
+
+def stored_balance(Session, account_id):
+    with Session() as session:
+        return session.get(Account, account_id).balance
+
+
+def add_to_balance(Session, account_id, delta):
+    with Session() as session, session.begin():
+        session.execute(update(Account)
+                        .where(Account.account_id == account_id)
+                        .values(balance=Account.balance + delta))
+
+
+def cached_bank(Session, **kwargs):
+    kwargs.setdefault('flush_interval', 60)
+    return BankSystem(Session, **kwargs)
+
+
+def test_balances_are_loaded_on_first_access(Session, stored):
+    alice, (checking, savings), _, _ = stored
+    bank_system = cached_bank(Session)
+    assert bank_system.accounts == {}
+    assert bank_system.get_user_accounts(alice) == {
+        checking: Decimal("100.00"), savings: Decimal("0.00")}
+    assert bank_system.get_user_accounts(9999) == []
+
+
+def test_stale_balances_are_reloaded(Session, stored):
+    alice, (checking, _), _, _ = stored
+    bank_system = cached_bank(Session, max_age=0)
+    bank_system.get_user_accounts(alice)
+    add_to_balance(Session, checking, 5)
+    assert bank_system.get_user_accounts(alice)[checking] == Decimal("105.00")
+
+
+def test_least_recently_used_users_are_evicted(Session, stored):
+    alice, _, bob, _ = stored
+    bank_system = cached_bank(Session, max_bytes=1)
+    bank_system.get_user_accounts(alice)
+    bank_system.get_user_accounts(bob)
+    assert list(bank_system.accounts) == [bob]
+
+
+def test_users_with_unflushed_changes_are_not_evicted(Session, stored):
+    alice, (checking, _), bob, _ = stored
+    bank_system = cached_bank(Session, max_bytes=1)
+    assert bank_system.deposit(alice, checking, 1)
+    bank_system.get_user_accounts(bob)
+    assert list(bank_system.accounts) == [alice, bob]
+
+
+def test_flushed_users_can_be_evicted_again(Session, stored):
+    alice, (checking, _), bob, _ = stored
+    bank_system = cached_bank(Session, max_bytes=1)
+    assert bank_system.deposit(alice, checking, 1)
+    assert bank_system.deposit(alice, checking, 1)
+    assert bank_system.flush() == 2
+    bank_system.get_user_accounts(bob)
+    assert list(bank_system.accounts) == [bob]
+
+
+def test_balances_are_loaded_outside_the_lock(Session, stored):
+    alice, (checking, _), _, _ = stored
+    loads = []
+
+    def session_factory():
+        session = Session()
+        loads.append(session)
+        if len(loads) == 1:
+            execute = session.execute
+
+            def racing_execute(*args, **kwargs):
+                rows = execute(*args, **kwargs).all()
+                # a transfer commits after the balances were read
+                committer = threading.Thread(target=lambda: (
+                    add_to_balance(Session, checking, -10),
+                    bank_system.apply_committed({checking: -10})))
+                committer.start()
+                committer.join(timeout=5)
+                assert not committer.is_alive()
+                return Mock(all=Mock(return_value=rows))
+            session.execute = racing_execute
+        return session
+
+    bank_system = cached_bank(session_factory)
+    assert bank_system.get_user_accounts(alice)[checking] == Decimal("90.00")
+    assert len(loads) == 2
+
+
+def test_flush_writes_relative_changes(Session, stored):
+    alice, (checking, savings), _, _ = stored
+    bank_system = cached_bank(Session)
+    assert bank_system.transfer_funds(alice, checking, savings, 30)
+    assert bank_system.withdraw(alice, checking, 20)
+    # a write made elsewhere after the cache was loaded
+    add_to_balance(Session, checking, 7)
+    assert stored_balance(Session, checking) == Decimal("107.00")
+
+    assert bank_system.pending == 2
+    assert bank_system.flush() == 2
+    assert bank_system.pending == 0
+    assert stored_balance(Session, checking) == Decimal("57.00")
+    assert stored_balance(Session, savings) == Decimal("30.00")
+    with Session() as session:
+        assert session.execute(select(func.count()).select_from(
+            Transaction)).scalar_one() == 3
+
+
+def test_full_journal_is_flushed_in_the_background(Session, stored):
+    alice, (checking, _), _, _ = stored
+    bank_system = cached_bank(Session, flush_batch_size=3)
+    for _ in range(3):
+        bank_system.deposit(alice, checking, 1)
+    deadline = time.monotonic() + 5
+    while bank_system.pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert stored_balance(Session, checking) == Decimal("103.00")
+
+
+def test_journal_is_flushed_after_the_interval(Session, stored):
+    alice, (checking, _), _, _ = stored
+    bank_system = cached_bank(Session, flush_interval=0.05)
+    bank_system.deposit(alice, checking, 1)
+    deadline = time.monotonic() + 5
+    while bank_system.pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert stored_balance(Session, checking) == Decimal("101.00")
+
+
+def test_overdrawing_change_is_dropped_and_reloaded(Session, stored):
+    alice, (checking, savings), _, _ = stored
+    bank_system = cached_bank(Session)
+    assert bank_system.withdraw(alice, checking, 80)
+    assert bank_system.deposit(alice, savings, 5)
+    add_to_balance(Session, checking, -50)
+
+    assert bank_system.flush() == 1
+    assert stored_balance(Session, checking) == Decimal("50.00")
+    assert stored_balance(Session, savings) == Decimal("5.00")
+    assert bank_system.get_user_accounts(alice) == {
+        checking: Decimal("50.00"), savings: Decimal("5.00")}
+
+
+def test_failed_flush_keeps_the_journal(Session, stored):
+    alice, (checking, _), _, _ = stored
+    bank_system = cached_bank(Session)
+    bank_system.deposit(alice, checking, 1)
+    with patch.object(bank_system, '_write',
+                      side_effect=OperationalError("UPDATE", {},
+                                                   Exception("locked"))):
+        assert bank_system.flush() == 0
+    assert bank_system.pending == 1
+    assert bank_system.flush() == 1
+    assert stored_balance(Session, checking) == Decimal("101.00")
+
+
+def test_has_funds_confirms_shortfalls(Session, stored):
+    alice, (checking, _), _, _ = stored
+    bank_system = cached_bank(Session)
+    assert bank_system.has_funds(alice, checking, 100)
+    assert not bank_system.has_funds(alice, checking, 101)
+    add_to_balance(Session, checking, 10)
+    assert bank_system.has_funds(alice, checking, 101)
+    assert bank_system.has_funds(alice, 9999, 1)
+
+
+def test_refreshed_balances_are_served_without_a_load(Session, stored):
+    alice, (checking, savings), _, _ = stored
+    bank_system = cached_bank(Session)
+    bank_system.refresh(alice, {checking: 7, savings: 0})
+    with patch.object(bank_system, '_session_factory',
+                      side_effect=AssertionError("loaded")):
+        assert bank_system.get_user_accounts(alice) == {
+            checking: Decimal("7.00"), savings: Decimal("0.00")}
+        assert bank_system.has_funds(alice, checking, 7)
+
+
+def test_refresh_keeps_unflushed_changes(Session, stored):
+    alice, (checking, savings), _, _ = stored
+    bank_system = cached_bank(Session)
+    assert bank_system.deposit(alice, checking, 1)
+    bank_system.refresh(alice, {checking: 100, savings: 0})
+    assert bank_system.get_user_accounts(alice)[checking] == Decimal("101.00")
+
+
+def test_cache_size_is_tracked_in_bytes(Session, stored):
+    alice, _, bob, _ = stored
+    bank_system = cached_bank(Session)
+    assert bank_system.size == 0
+    bank_system.get_user_accounts(alice)
+    alone = bank_system.size
+    assert alone > 0
+    bank_system.get_user_accounts(bob)
+    assert bank_system.size > alone
+    bank_system.invalidate()
+    assert bank_system.size == 0
+
+    bank_system = cached_bank(Session, max_bytes=alone)
+    bank_system.get_user_accounts(alice)
+    bank_system.get_user_accounts(bob)
+    assert list(bank_system.accounts) == [bob]
+    assert bank_system.size <= alone
+
+
+def test_committed_changes_update_the_cache(Session, stored):
+    alice, (checking, savings), bob, bobs = stored
+    bank_system = cached_bank(Session)
+    bank_system.get_user_accounts(alice)
+    bank_system.apply_committed({checking: Decimal("-10"), bobs: 10})
+    assert bank_system.accounts == {
+        alice: {checking: Decimal("90.00"), savings: Decimal("0.00")}}
+
+    add_to_balance(Session, savings, 3)
+    bank_system.invalidate([savings])
+    assert bank_system.accounts == {}
+    assert bank_system.get_user_accounts(alice)[savings] == Decimal("3.00")
@@ -0,0 +1,174 @@
+import socketserver
+import threading
+import time
+import pytest
+from decimal import Decimal
+from logic.cache import (
+    MemoryBackend, RespBackend, RespError, UserCache, encode_command,
+    read_reply
+)
+from logic.dashboard import AccountSummary
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    """Just enough of a Redis server: GET, SET with PX, DEL and SELECT."""
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except ConnectionError:
+                return
+            name = command[0].upper()
+            if name == b"GET":
+                value, expires = store.get(command[1], (None, 0))
+                if value is None or expires <= time.monotonic():
+                    self.wfile.write(b"$-1\r\n")
+                else:
+                    self.wfile.write(b"$%d\r\n%s\r\n" % (len(value), value))
+            elif name == b"SET":
+                store[command[1]] = (command[2], time.monotonic()
+                                     + int(command[4]) / 1000)
+                self.wfile.write(b"+OK\r\n")
+            elif name == b"DEL":
+                removed = sum(store.pop(key, None) is not None
+                              for key in command[1:])
+                self.wfile.write(b":%d\r\n" % removed)
+            elif name == b"SELECT":
+                self.wfile.write(b"+OK\r\n")
+            else:
+                self.wfile.write(b"-ERR unknown command\r\n")
+
+
+@pytest.fixture
+def resp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), RespHandler)
+    server.daemon_threads = True
+    server.store = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_memory_backend_expires_entries():
+    clock = FakeClock()
+    backend = MemoryBackend(clock=clock)
+    backend.set("a", 1, ttl=10)
+    clock.now = 9.9
+    assert backend.get("a") == 1
+    clock.now = 10
+    assert backend.get("a") is None
+    assert len(backend) == 0
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2)
+    backend.set("a", 1, ttl=60)
+    backend.set("b", 2, ttl=60)
+    backend.get("a")
+    backend.set("c", 3, ttl=60)
+    assert backend.get("b") is None
+    assert (backend.get("a"), backend.get("c")) == (1, 3)
+    backend.delete("a", "missing")
+    assert backend.get("a") is None
+
+
+def test_resp_encoding_round_trip():
+    import io
+    assert encode_command(["SET", "k", b"\r\nv"]) == \
+        b"*3\r\n$3\r\nSET\r\n$1\r\nk\r\n$3\r\n\r\nv\r\n"
+    replies = io.BytesIO(b"+OK\r\n:2\r\n$-1\r\n$2\r\nhi\r\n*1\r\n:1\r\n"
+                         b"-ERR nope\r\n")
+    assert [read_reply(replies) for _ in range(5)] == [
+        "OK", 2, None, b"hi", [1]]
+    with pytest.raises(RespError, match="nope"):
+        read_reply(replies)
+
+
+def test_resp_backend_talks_to_a_redis_protocol_server(resp_server):
+    port = resp_server.server_address[1]
+    backend = RespBackend(f"redis://127.0.0.1:{port}/1")
+    value = [AccountSummary(1, "Checking Account", Decimal("10.50"))]
+    backend.set("user:1:accounts", value, ttl=60)
+    assert backend.get("user:1:accounts") == value
+    backend.delete("user:1:accounts")
+    assert backend.get("user:1:accounts") is None
+    backend.set("short", 1, ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get("short") is None
+    backend.close()
+
+
+def test_resp_backend_misses_when_the_server_is_down(resp_server):
+    port = resp_server.server_address[1]
+    resp_server.shutdown()
+    resp_server.server_close()
+    backend = RespBackend(f"redis://127.0.0.1:{port}/0", timeout=0.05)
+    backend.set("a", 1, ttl=60)
+    assert backend.get("a") is None
+
+
+def test_user_cache_serves_entries_of_the_current_version():
+    cache = UserCache(MemoryBackend(), ttl=60)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return [AccountSummary(7, "Checking Account", Decimal("1.00"))]
+
+    def ids(accounts):
+        return [account.account_id for account in accounts]
+
+    first = cache.load(1, 'accounts', 3, loader, ids)
+    assert cache.load(1, 'accounts', 3, loader, ids) == first
+    assert len(loads) == 1
+    # written elsewhere: the version moved on
+    cache.load(1, 'accounts', 4, loader, ids)
+    assert len(loads) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.stats() == {'backend': 'MemoryBackend', 'hits': 1,
+                             'misses': 2, 'hit_ratio': pytest.approx(1 / 3)}
+
+
+def test_user_cache_invalidation():
+    cache = UserCache(MemoryBackend(), ttl=60)
+    value = [AccountSummary(7, "Checking Account", Decimal("1.00"))]
+    cache.load(1, 'accounts', 1, lambda: value,
+               lambda accounts: [account.account_id for account in accounts])
+    cache.load(1, 'dashboard', 1, lambda: "dashboard")
+    cache.load(2, 'dashboard', 1, lambda: "other")
+
+    assert cache.invalidate_accounts([7, 99]) == [1]
+    assert cache.backend.get(cache.key(1, 'accounts')) is None
+    assert cache.backend.get(cache.key(1, 'dashboard')) is None
+    assert cache.backend.get(cache.key(2, 'dashboard')) == (1, "other")
+    cache.invalidate(2, None)
+    assert cache.backend.get(cache.key(2, 'dashboard')) is None
+
+
+def test_user_cache_remembers_a_bounded_number_of_owners():
+    cache = UserCache(MemoryBackend(), ttl=60, max_owners=2)
+    for user_id in (1, 2, 3):
+        cache.load(user_id, 'dashboard', 1, lambda: "dashboard",
+                   lambda _: [user_id * 10])
+    assert cache.invalidate_accounts([10]) == []
+    assert cache.invalidate_accounts([20, 30]) == [2, 3]
+
+
+def test_user_cache_skips_missing_values_and_unknown_versions():
+    cache = UserCache(MemoryBackend(), ttl=60)
+    assert cache.load(1, 'dashboard', 1, lambda: None) is None
+    assert cache.load(1, 'dashboard', None, lambda: "x") == "x"
+    assert cache.load(1, 'dashboard', 1, lambda: "y") == "y"
+    assert cache.misses == 3
@@ -0,0 +1,81 @@
+import pytest
+from sqlalchemy import create_engine, func, select
+from database.cli import main, import_users
+from database.init_db import init_db
+from database.models import User, Account, Transaction, TransactionType
+
+CSV = """username,email,password
+Alice,alice@example.com,pw-alice
+bob,bob@example.com,pw-bob
+alice,alice2@example.com,duplicate-username
+carol,carol@example.com,
+dave,dave@example.com,pw-dave
+"""
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bank.db'}")
+    init_db(engine)
+    yield engine
+    engine.dispose()
+
+
+def count(engine, model):
+    with engine.connect() as connection:
+        return connection.execute(
+            select(func.count()).select_from(model)).scalar_one()
+
+
+def test_import_users(engine):
+    imported = import_users(engine, CSV.splitlines(keepends=True),
+                            batch_size=2, rounds=4)
+    assert imported == 3
+    assert count(engine, User) == 3
+    assert count(engine, Account) == 9
+    assert count(engine, Transaction) == 9
+
+    with engine.connect() as connection:
+        alice = connection.execute(
+            select(User).where(User.username == 'alice')).one()
+        assert alice.password_hash.startswith('$2b$04$')
+        balances = connection.execute(
+            select(Account.account_type, Account.balance, Transaction.amount,
+                   Transaction.transaction_type)
+            .join(Transaction, Transaction.account_id == Account.account_id)
+            .where(Account.user_id == alice.user_id)
+            .order_by(Account.account_id)).all()
+    assert [(row.account_type, row.balance) for row in balances] == [
+        ('Checking Account', 500.0), ('Savings Account', 1500.0),
+        ('Business Account', 3000.0)]
+    assert all(row.amount == row.balance for row in balances)
+    assert all(row.transaction_type == TransactionType.deposit
+               for row in balances)
+
+
+def test_import_skips_existing_users(engine):
+    lines = CSV.splitlines(keepends=True)
+    import_users(engine, lines, batch_size=10, rounds=4)
+    assert import_users(engine, lines, batch_size=10, rounds=4) == 0
+    assert count(engine, User) == 3
+
+
+def test_cli_import_users(tmp_path, capsys):
+    csv_file = tmp_path / "users.csv"
+    csv_file.write_text(CSV)
+    url = f"sqlite:///{tmp_path / 'cli.db'}"
+    main(["--database-url", url, "import-users", str(csv_file),
+          "--batch-size", "2", "--rounds", "4", "--workers", "2"])
+    assert "Imported 3 users." in capsys.readouterr().out
+    engine = create_engine(url)
+    assert count(engine, User) == 3
+    engine.dispose()
+
+
+def test_cli_partition_commands_skip_sqlite(tmp_path, capsys):
+    url = f"sqlite:///{tmp_path / 'cli.db'}"
+    main(["--database-url", url, "ensure-partitions"])
+    main(["--database-url", url, "drop-partitions", "--keep-months", "12"])
+    out = capsys.readouterr().out
+    assert "Created 0 partitions: -" in out
+    assert "Dropped 0 partitions: -" in out
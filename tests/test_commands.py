@@ -0,0 +1,234 @@
+import os
+import threading
+import pytest
+from decimal import Decimal
+from unittest.mock import patch
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from database.init_db import create_engine_from_env, init_db
+from database.models import User, Account, Transaction, Role
+from logic.bank_system import BankSystem
+from logic.commands import (
+    CommandBus, DbDepositCommand, DbWithdrawCommand, DbTransferCommand
+)
+from logic.main import DepositCommand, WithdrawCommand
+from logic.transfer_service import InsufficientFunds, TransferError
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine_from_env(f"sqlite:///{tmp_path / 'bank.db'}")
+    init_db(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def Session(engine):
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def accounts(Session):
+    with Session() as session:
+        alice = User(username="alice", email="alice@example.com",
+                     password_hash="hashed", role=Role.user,
+                     accounts=[Account(account_type="Checking Account",
+                                       balance=100),
+                               Account(account_type="Savings Account",
+                                       balance=0)])
+        bob = User(username="bob", email="bob@example.com",
+                   password_hash="hashed", role=Role.user,
+                   accounts=[Account(account_type="Checking Account",
+                                     balance=0)])
+        session.add_all([alice, bob])
+        session.commit()
+        return ([account.account_id for account in alice.accounts]
+                + [bob.accounts[0].account_id])
+
+
+@pytest.fixture
+def bus(Session):
+    bus = CommandBus(Session, max_batch_size=50, max_wait=0.05)
+    yield bus
+    bus.shutdown()
+
+
+def balances(Session, account_ids):
+    with Session() as session:
+        return [session.get(Account, account_id).balance
+                for account_id in account_ids]
+
+
+def serialization_failure():
+    class Orig(Exception):
+        pgcode = "40001"
+    return OperationalError("UPDATE accounts", {}, Orig("could not serialize"))
+
+
+def count_commits(engine):
+    commits = []
+    event.listen(engine, "commit", lambda connection: commits.append(1))
+    return commits
+
+
+def test_commands_from_many_threads_share_commits(engine, Session,
+                                                  accounts, bus):
+    checking, savings, _ = accounts
+    commits = count_commits(engine)
+    futures = []
+
+    def submit():
+        futures.append(bus.submit(DbDepositCommand(checking, "1.00")))
+
+    threads = [threading.Thread(target=submit) for _ in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results = sorted(future.result(timeout=5) for future in futures)
+
+    assert results == [Decimal(100 + i) for i in range(1, 41)]
+    assert len(commits) < 40
+    assert balances(Session, [checking]) == [Decimal("140.00")]
+    with Session() as session:
+        assert session.execute(select(func.count()).select_from(
+            Transaction)).scalar_one() == 40
+
+
+def test_rejected_command_does_not_affect_its_batch(Session, accounts, bus):
+    checking, savings, bob = accounts
+    futures = [
+        bus.submit(DbTransferCommand(None, checking, savings, 60)),
+        bus.submit(DbWithdrawCommand(checking, 50)),
+        bus.submit(DbDepositCommand(9999, 1)),
+        bus.submit(DbTransferCommand(None, checking, bob, 40,
+                                     external=True)),
+    ]
+    assert futures[0].result(timeout=5) == Decimal("40.00")
+    with pytest.raises(InsufficientFunds):
+        futures[1].result(timeout=5)
+    with pytest.raises(TransferError, match="Invalid account."):
+        futures[2].result(timeout=5)
+    assert futures[3].result(timeout=5) == Decimal("0.00")
+    assert balances(Session, accounts) == [Decimal("0.00"), Decimal("60.00"),
+                                           Decimal("40.00")]
+
+
+def test_user_scoped_commands_check_ownership(Session, accounts, bus):
+    checking, _, bob = accounts
+    alice_id = 1
+    with pytest.raises(TransferError):
+        bus.execute(DbWithdrawCommand(bob, 1, user_id=alice_id), timeout=5)
+    with pytest.raises(TransferError):
+        bus.execute(DbTransferCommand(alice_id, checking, bob, 1), timeout=5)
+    bus.execute(DbDepositCommand(checking, 1, user_id=alice_id), timeout=5)
+    assert balances(Session, [checking]) == [Decimal("101.00")]
+
+
+def test_undo_applies_the_compensation(Session, accounts, bus):
+    checking, savings, bob = accounts
+    commands = [DbDepositCommand(savings, 5), DbWithdrawCommand(checking, 5),
+                DbTransferCommand(1, checking, bob, 10, external=True)]
+    for command in commands:
+        bus.execute(command, timeout=5)
+    for command in reversed(commands):
+        bus.undo(command).result(timeout=5)
+    assert balances(Session, accounts) == [Decimal("100.00"), Decimal("0.00"),
+                                           Decimal("0.00")]
+    with Session() as session:
+        assert session.execute(select(func.count()).select_from(
+            Transaction)).scalar_one() == 8
+
+
+def test_failing_batch_falls_back_to_single_commits(Session, accounts):
+    checking, savings, _ = accounts
+    bus = CommandBus(Session, max_batch_size=10, max_wait=0.05,
+                     max_retries=1)
+    poison = DbDepositCommand(savings, 1)
+    error = OperationalError("UPDATE", {}, Exception("disk I/O error"))
+    with patch.object(poison, 'apply', side_effect=error):
+        futures = [bus.submit(DbDepositCommand(checking, 1)),
+                   bus.submit(poison),
+                   bus.submit(DbDepositCommand(checking, 1))]
+        bus.shutdown()
+    assert futures[0].result() == Decimal("101.00")
+    with pytest.raises(OperationalError):
+        futures[1].result()
+    assert futures[2].result() == Decimal("102.00")
+
+
+def test_transient_failures_are_retried_with_backoff(Session, accounts):
+    checking, _, _ = accounts
+    bus = CommandBus(Session, max_wait=0, max_retries=2, backoff=0.01)
+    command = DbDepositCommand(checking, 1)
+    error = serialization_failure()
+    with patch.object(command, 'apply', side_effect=error) as apply, \
+            patch('logic.commands.time.sleep') as sleep:
+        future = bus.submit(command)
+        with pytest.raises(OperationalError):
+            future.result(timeout=5)
+        bus.shutdown()
+    assert apply.call_count == 3
+    delays = [call.args[0] for call in sleep.call_args_list]
+    assert len(delays) == 2
+    assert 0.01 <= delays[0] < 0.02 and 0.02 <= delays[1] < 0.04
+
+
+def test_batches_respect_max_batch_size(engine, Session, accounts):
+    checking, _, _ = accounts
+    bus = CommandBus(Session, max_batch_size=3, max_wait=1)
+    commits = count_commits(engine)
+    futures = [bus.submit(DbDepositCommand(checking, 1)) for _ in range(9)]
+    for future in futures:
+        future.result(timeout=5)
+    bus.shutdown()
+    assert len(commits) == 3
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_child_gets_its_own_worker(Session, accounts, bus):
+    checking, _, _ = accounts
+    bus.execute(DbDepositCommand(checking, 1), timeout=5)
+    pid = os.fork()
+    if pid == 0:
+        # the parent's worker thread does not exist in the child
+        ok = bus._worker is None and bus.execute(
+            DbDepositCommand(checking, 1), timeout=5) == Decimal("102.00")
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+
+
+def test_shut_down_bus_refuses_commands(Session):
+    bus = CommandBus(Session)
+    bus.shutdown()
+    with pytest.raises(RuntimeError):
+        bus.submit(DbDepositCommand(1, 1))
+
+
+def test_commands_reject_non_positive_amounts():
+    with pytest.raises(ValueError):
+        DbDepositCommand(1, 0)
+    with pytest.raises(ValueError):
+        DbTransferCommand(1, 1, 2, "-1")
+
+
+def test_in_memory_commands_undo():
+    bank_system = BankSystem()
+    bank_system.accounts = {1: {1001: Decimal("100.00")}}
+    withdraw = WithdrawCommand(bank_system, 1, 1001, 150)
+    withdraw.execute()
+    withdraw.undo()
+    assert bank_system.accounts[1][1001] == Decimal("100.00")
+
+    deposit = DepositCommand(bank_system, 1, 1001, 50)
+    deposit.execute()
+    withdraw = WithdrawCommand(bank_system, 1, 1001, 20)
+    withdraw.execute()
+    assert bank_system.accounts[1][1001] == Decimal("130.00")
+    withdraw.undo()
+    deposit.undo()
+    deposit.undo()
+    assert bank_system.accounts[1][1001] == Decimal("100.00")
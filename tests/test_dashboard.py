@@ -0,0 +1,157 @@
+import pytest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+from database.init_db import init_db, DEFAULT_DATABASE_URL
+from database.models import (
+    User, Account, Transaction, Role, TransactionType, TransactionStatus
+)
+from logic.dashboard import AccountSummary, DashboardService, with_balances
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:")
+    init_db(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def postgres_session():
+    engine = create_engine(DEFAULT_DATABASE_URL)
+    try:
+        connection = engine.connect()
+    except OperationalError:
+        pytest.skip("PostgreSQL is not available")
+    init_db(engine)
+    transaction = connection.begin()
+    # everything the test writes is rolled back
+    session = Session(bind=connection,
+                      join_transaction_mode="create_savepoint")
+    yield session
+    session.close()
+    transaction.rollback()
+    connection.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def user_id(session):
+    return seed(session)
+
+
+def seed(session, start=START):
+    user = User(username="dash", email="dash@example.com",
+                password_hash="hashed", role=Role.user)
+    session.add(user)
+    session.flush()
+    checking = Account(user_id=user.user_id, account_type="Checking Account",
+                       balance=500.0)
+    savings = Account(user_id=user.user_id, account_type="Savings Account",
+                      balance=1500.0)
+    session.add_all([checking, savings])
+    session.flush()
+    types = [TransactionType.deposit, TransactionType.withdrawal,
+             TransactionType.transfer]
+    for i in range(30):
+        session.add(Transaction(
+            account_id=(checking if i % 2 else savings).account_id,
+            transaction_type=types[i % 3], amount=float(i),
+            status=(TransactionStatus.pending if i < 4
+                    else TransactionStatus.completed),
+            created_at=start + timedelta(hours=i)))
+    session.commit()
+    return user.user_id
+
+
+def count_queries(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_load_dashboard(session, user_id):
+    data = DashboardService(session).load(user_id)
+    assert data.user_name == "dash"
+    assert [a.account_type for a in data.accounts] == \
+        ["Checking Account", "Savings Account"]
+    assert data.total_balance == 2000.0
+    assert data.pending_transfers == 4
+
+    assert [t.amount for t in data.recent_income] == [27.0, 24.0, 21.0,
+                                                      18.0, 15.0]
+    assert [t.amount for t in data.recent_expenses] == [29.0, 28.0, 26.0,
+                                                        25.0, 23.0]
+    assert all(t.transaction_type == TransactionType.deposit
+               for t in data.recent_income)
+
+
+def test_dashboard_uses_two_statements(engine, session, user_id):
+    statements = count_queries(engine)
+    DashboardService(session).load(user_id)
+    assert len(statements) == 2
+
+
+def test_postgres_dashboard_uses_two_statements(postgres_session):
+    user_id = seed(postgres_session,
+                   datetime.utcnow() - timedelta(days=2))
+    statements = count_queries(postgres_session.connection())
+    data = DashboardService(postgres_session).load(user_id)
+    assert len(statements) == 2
+    assert "created_at >=" in statements[1]
+    assert [t.amount for t in data.recent_income] == [27.0, 24.0, 21.0,
+                                                      18.0, 15.0]
+
+
+def test_postgres_dashboard_falls_back_to_the_whole_history(
+        postgres_session):
+    user_id = seed(postgres_session)
+    statements = count_queries(postgres_session.connection())
+    data = DashboardService(postgres_session).load(user_id)
+    assert len(statements) == 3
+    assert "created_at >=" not in statements[2]
+    assert [t.amount for t in data.recent_income] == [27.0, 24.0, 21.0,
+                                                      18.0, 15.0]
+    assert [t.amount for t in data.recent_expenses] == [29.0, 28.0, 26.0,
+                                                        25.0, 23.0]
+
+
+def test_user_without_accounts(engine, session):
+    user = User(username="empty", email="empty@example.com",
+                password_hash="hashed", role=Role.user)
+    session.add(user)
+    session.commit()
+    empty_id = user.user_id
+    statements = count_queries(engine)
+    data = DashboardService(session).load(empty_id)
+    assert data.user_name == "empty"
+    assert data.accounts == []
+    assert data.total_balance == 0.0
+    assert data.pending_transfers == 0
+    assert len(statements) == 1
+
+
+def test_unknown_user(session):
+    assert DashboardService(session).load(12345) is None
+
+
+def test_with_balances_overrides_known_accounts():
+    accounts = [AccountSummary(1, "Checking Account", Decimal("10.00")),
+                AccountSummary(2, "Savings Account", Decimal("20.00"))]
+    balances = {2: Decimal("25.00"), 3: Decimal("1.00")}
+    assert with_balances(accounts, balances) == [
+        accounts[0], AccountSummary(2, "Savings Account", Decimal("25.00"))]
+    assert accounts[1].balance == Decimal("20.00")
@@ -0,0 +1,217 @@
+import pytest
+from datetime import datetime, timedelta
+from flask import Flask, jsonify, redirect, request, session
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import scoped_session, sessionmaker
+from database.cli import purge_idempotency_keys
+from database.init_db import init_db
+from database.models import IdempotencyKey
+from logic.idempotency import (
+    IdempotencyConflict, IdempotencyStore, idempotent, _hashes
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bank.db'}")
+    init_db(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    db = scoped_session(sessionmaker(bind=engine))
+    yield db
+    db.remove()
+
+
+@pytest.fixture
+def store(db):
+    return IdempotencyStore(db, ttl=timedelta(minutes=5))
+
+
+@pytest.fixture
+def app(db, store):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.config['calls'] = []
+
+    @app.route('/pay', methods=['POST'])
+    @idempotent(store)
+    def pay():
+        app.config['calls'].append(request.form['amount'])
+        if request.form['amount'] == 'boom':
+            return "failed", 500
+        if request.form['amount'] == '0':
+            return "Invalid amount.", 400
+        return redirect('/done')
+
+    @app.route('/api/pay', methods=['POST'])
+    @idempotent(store)
+    def api_pay():
+        app.config['calls'].append(request.get_json()['amount'])
+        return jsonify(amount=request.get_json()['amount']), 201
+
+    app.teardown_appcontext(lambda exc: db.remove())
+    return app
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+    return client
+
+
+def keys(db):
+    return db.execute(select(func.count()).select_from(IdempotencyKey)
+                      ).scalar_one()
+
+
+def test_replays_the_stored_response(app, client, db):
+    headers = {'Idempotency-Key': 'abc'}
+    first = client.post('/pay', data={'amount': '5'}, headers=headers)
+    second = client.post('/pay', data={'amount': '5'}, headers=headers)
+    assert app.config['calls'] == ['5']
+    assert first.status_code == second.status_code == 302
+    assert second.headers['Location'] == first.headers['Location']
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    assert keys(db) == 1
+
+
+def test_replays_keep_the_content_type(app, client, db, store):
+    headers = {'Idempotency-Key': 'abc'}
+    first = client.post('/api/pay', json={'amount': 5}, headers=headers)
+    # from the database, not the in-process cache
+    store._cache.clear()
+    second = client.post('/api/pay', json={'amount': 5}, headers=headers)
+    assert app.config['calls'] == [5]
+    assert second.status_code == 201
+    assert second.mimetype == first.mimetype == 'application/json'
+    assert second.get_json() == {'amount': 5}
+
+
+def test_rejections_are_replayed_too(app, client):
+    headers = {'Idempotency-Key': 'abc'}
+    for _ in range(2):
+        response = client.post('/pay', data={'amount': '0'}, headers=headers)
+        assert response.status_code == 400
+        assert response.data == b"Invalid amount."
+    assert app.config['calls'] == ['0']
+
+
+def test_requests_without_a_key_always_run(app, client):
+    client.post('/pay', data={'amount': '5'})
+    client.post('/pay', data={'amount': '5'})
+    assert app.config['calls'] == ['5', '5']
+
+
+def test_keys_are_scoped_per_user(app, client):
+    headers = {'Idempotency-Key': 'abc'}
+    client.post('/pay', data={'amount': '5'}, headers=headers)
+    with client.session_transaction() as sess:
+        sess['user_id'] = 2
+    client.post('/pay', data={'amount': '5'}, headers=headers)
+    assert app.config['calls'] == ['5', '5']
+
+
+def test_reused_key_with_different_body_is_rejected(app, client):
+    headers = {'Idempotency-Key': 'abc'}
+    client.post('/pay', data={'amount': '5'}, headers=headers)
+    response = client.post('/pay', data={'amount': '6'}, headers=headers)
+    assert response.status_code == 422
+    assert app.config['calls'] == ['5']
+
+
+def test_server_errors_release_the_key(app, client, db):
+    headers = {'Idempotency-Key': 'abc'}
+    client.post('/pay', data={'amount': 'boom'}, headers=headers)
+    client.post('/pay', data={'amount': 'boom'}, headers=headers)
+    assert app.config['calls'] == ['boom', 'boom']
+    assert keys(db) == 0
+
+
+def test_in_progress_key_conflicts(app, client, store):
+    with app.test_request_context('/pay', method='POST',
+                                  data={'amount': '5'}):
+        session['user_id'] = 1
+        key_hash, request_hash = _hashes('abc')
+    assert store.reserve(key_hash, request_hash) is None
+
+    response = client.post('/pay', data={'amount': '5'},
+                           headers={'Idempotency-Key': 'abc'})
+    assert response.status_code == 409
+    assert app.config['calls'] == []
+
+
+@pytest.mark.filterwarnings("error::sqlalchemy.exc.SAWarning")
+def test_lapsed_reservation_is_taken_over(app, client, db):
+    lease = timedelta(seconds=30)
+    store = IdempotencyStore(db, ttl=timedelta(minutes=5), lease=lease)
+    with app.test_request_context('/pay', method='POST',
+                                  data={'amount': '5'}):
+        session['user_id'] = 1
+        key_hash, request_hash = _hashes('abc')
+    assert store.reserve(key_hash, request_hash) is None
+    row = db.get(IdempotencyKey, key_hash)
+    assert row.expires_at - row.created_at == lease
+
+    # the worker holding the key died
+    db.execute(IdempotencyKey.__table__.update().values(
+        expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.commit()
+    response = client.post('/pay', data={'amount': '5'},
+                           headers={'Idempotency-Key': 'abc'})
+    assert response.status_code == 302
+    assert app.config['calls'] == ['5']
+    row = db.get(IdempotencyKey, key_hash)
+    db.refresh(row)
+    assert row.status_code == 302
+    assert row.expires_at - row.created_at == timedelta(minutes=5)
+
+
+def test_lapsed_reservation_is_taken_over_once(app, db, store):
+    with app.test_request_context('/pay', method='POST',
+                                  data={'amount': '5'}):
+        session['user_id'] = 1
+        key_hash, request_hash = _hashes('abc')
+    assert store.reserve(key_hash, request_hash) is None
+    db.execute(IdempotencyKey.__table__.update().values(
+        expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.commit()
+
+    assert store.reserve(key_hash, request_hash) is None
+    with pytest.raises(IdempotencyConflict) as conflict:
+        store.reserve(key_hash, request_hash)
+    assert conflict.value.status_code == 409
+    assert keys(db) == 1
+
+
+def test_replays_from_cache_without_the_database(client, store, db):
+    headers = {'Idempotency-Key': 'abc'}
+    client.post('/pay', data={'amount': '5'}, headers=headers)
+    db.execute(IdempotencyKey.__table__.delete())
+    db.commit()
+    response = client.post('/pay', data={'amount': '5'}, headers=headers)
+    assert response.headers['Idempotent-Replayed'] == 'true'
+
+
+def test_expired_keys_are_purged(app, client, db, engine):
+    headers = {'Idempotency-Key': 'abc'}
+    client.post('/pay', data={'amount': '5'}, headers=headers)
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    db.execute(IdempotencyKey.__table__.update().values(expires_at=expired))
+    db.commit()
+    IdempotencyStore(db).reserve(b"x" * 32, b"y" * 32)
+
+    assert purge_idempotency_keys(engine) == 1
+    assert keys(db) == 1
+
+
+def test_invalid_key_is_rejected(client):
+    response = client.post('/pay', data={'amount': '5'},
+                           headers={'Idempotency-Key': 'k' * 256})
+    assert response.status_code == 400
@@ -1,48 +1,129 @@
-import pytest
-from sqlalchemy import inspect
-from sqlalchemy.orm import sessionmaker
-from database.models import User
-from sqlalchemy import create_engine
-
-DATABASE_URL = "postgresql://banking_user:\
-    secure_password@localhost:5432/banking_db"
-
-
-@pytest.fixture(scope="module")
-def engine():
-    """Provide a connection to the existing database."""
-    return create_engine(DATABASE_URL)
-
-
-@pytest.fixture(scope="module")
-def session(engine):
-    """Provide a session for interacting with the database."""
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    yield session
-    session.close()
-
-
-def test_tables_exist(engine):
-    """Test that all tables are created."""
-    inspector = inspect(engine)
-    tables = inspector.get_table_names()
-    expected_tables = {"users", "accounts", "transactions"}
-    assert expected_tables.issubset(set(tables)), f"Missing tables: \
-        {expected_tables - set(tables)}"
-
-
-def test_insert_user(session):
-    """Test inserting a user record."""
-    new_user = User(username="testuser", email="test@example.com",
-                    password_hash="hashed_password", role="user")
-    session.add(new_user)
-    session.commit()
-
-    queried_user = session.query(User).filter_by(username="testuser").first()
-    assert queried_user is not None
-    assert queried_user.email == "test@example.com"
-
-    # Clean up
-    session.delete(queried_user)
-    session.commit()
+import os
+import pytest
+from unittest.mock import patch
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database.init_db import (
+    create_engine_from_env, database_url, get_pool_stats, init_db,
+    TimedQueuePool, DEFAULT_DATABASE_URL
+)
+from database.models import User
+from sqlalchemy import create_engine
+
+DATABASE_URL = "postgresql://banking_user:\
+    secure_password@localhost:5432/banking_db"
+
+
+@pytest.fixture(scope="module")
+def engine():
+    """Provide a connection to the existing database."""
+    return create_engine(DATABASE_URL)
+
+
+@pytest.fixture(scope="module")
+def session(engine):
+    """Provide a session for interacting with the database."""
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    yield session
+    session.close()
+
+
+def test_tables_exist(engine):
+    """Test that all tables are created."""
+    inspector = inspect(engine)
+    tables = inspector.get_table_names()
+    expected_tables = {"users", "accounts", "transactions"}
+    assert expected_tables.issubset(set(tables)), f"Missing tables: \
+        {expected_tables - set(tables)}"
+
+
+def test_insert_user(session):
+    """Test inserting a user record."""
+    new_user = User(username="testuser", email="test@example.com",
+                    password_hash="hashed_password", role="user")
+    session.add(new_user)
+    session.commit()
+
+    queried_user = session.query(User).filter_by(username="testuser").first()
+    assert queried_user is not None
+    assert queried_user.email == "test@example.com"
+
+    # Clean up
+    session.delete(queried_user)
+    session.commit()
+
+
+def test_create_engine_from_env_sqlite_memory():
+    """An in-memory SQLite database shares one connection across threads."""
+    memory_engine = create_engine_from_env("sqlite://")
+    assert isinstance(memory_engine.pool, StaticPool)
+    init_db(memory_engine)
+    assert {"users", "accounts", "transactions"}.issubset(
+        set(inspect(memory_engine).get_table_names()))
+
+
+def test_create_engine_from_env_pool_settings(monkeypatch, tmp_path):
+    """Pool size, overflow and timeout are read from the environment."""
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "2")
+    monkeypatch.setenv("DB_POOL_TIMEOUT", "7")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "true")
+    file_engine = create_engine_from_env(f"sqlite:///{tmp_path / 'bank.db'}")
+    assert isinstance(file_engine.pool, TimedQueuePool)
+    assert file_engine.pool.size() == 3
+    assert file_engine.pool._max_overflow == 2
+    assert file_engine.pool._timeout == 7
+    assert file_engine.pool._pre_ping is True
+    file_engine.dispose()
+
+
+def test_database_url_from_env(monkeypatch):
+    """DATABASE_URL overrides the default DSN."""
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    assert database_url() == DEFAULT_DATABASE_URL
+    monkeypatch.setenv("DATABASE_URL", "sqlite://")
+    assert database_url() == "sqlite://"
+
+
+def test_pool_stats(tmp_path):
+    """Checkouts, checkins and waits are counted per engine."""
+    file_engine = create_engine_from_env(f"sqlite:///{tmp_path / 'bank.db'}")
+    for _ in range(3):
+        with file_engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    stats = get_pool_stats(file_engine)
+    assert stats['connects'] == 1
+    assert stats['checkouts'] == 3
+    assert stats['checkins'] == 3
+    assert stats['checked_out'] == 0
+    assert stats['max_wait'] >= stats['avg_wait'] >= 0
+    file_engine.dispose()
+    with file_engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    assert get_pool_stats(file_engine)['checkouts'] == 4
+    file_engine.dispose()
+
+
+def test_forked_child_opens_its_own_connections(tmp_path):
+    """A child process forgets the connections it inherited."""
+    with patch.object(os, 'register_at_fork') as register:
+        file_engine = create_engine_from_env(
+            f"sqlite:///{tmp_path / 'bank.db'}")
+    # one hook for all engines, registered when the module is imported
+    register.assert_not_called()
+    with file_engine.connect():
+        pass
+    assert file_engine.pool.checkedin() == 1
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.write(write, str(file_engine.pool.checkedin()).encode())
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 16) == b"0"
+    assert file_engine.pool.checkedin() == 1
+    file_engine.dispose()
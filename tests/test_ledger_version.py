@@ -0,0 +1,172 @@
+import pytest
+from flask import Flask, jsonify, session as flask_session
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from database.init_db import create_engine_from_env, init_db
+from database.models import User, Account, Role
+from logic.bank_system import BankSystem
+from logic.commands import CommandBus, DbDepositCommand
+from logic.ledger_version import (
+    bump_ledger_versions, conditional, ledger_version
+)
+from logic.transfer_service import InsufficientFunds, TransferService
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine_from_env(f"sqlite:///{tmp_path / 'bank.db'}")
+    init_db(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def Session(engine):
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def users(Session):
+    """Alice with two accounts and Bob with one, as (user_id, accounts)."""
+    with Session() as session:
+        alice = User(username="alice", email="alice@example.com",
+                     password_hash="hashed", role=Role.user,
+                     accounts=[Account(account_type="Checking Account",
+                                       balance=100),
+                               Account(account_type="Savings Account",
+                                       balance=0)])
+        bob = User(username="bob", email="bob@example.com",
+                   password_hash="hashed", role=Role.user,
+                   accounts=[Account(account_type="Checking Account",
+                                     balance=0)])
+        session.add_all([alice, bob])
+        session.commit()
+        return [(user.user_id, [account.account_id
+                                for account in user.accounts])
+                for user in (alice, bob)]
+
+
+def versions(Session, users):
+    with Session() as session:
+        return [ledger_version(session, user_id) for user_id, _ in users]
+
+
+def test_new_users_start_at_version_one(Session, users):
+    assert versions(Session, users) == [1, 1]
+    with Session() as session:
+        assert ledger_version(session, None) is None
+        assert ledger_version(session, 999) is None
+
+
+def test_transfers_bump_the_owners_of_both_accounts(Session, users):
+    (alice, (checking, savings)), (_, (bob_checking,)) = users
+    with Session() as session:
+        service = TransferService(session)
+        service.transfer(alice, checking, savings, "10")
+        assert versions(Session, users) == [2, 1]
+        service.transfer(alice, checking, bob_checking, "10", external=True)
+        assert versions(Session, users) == [3, 2]
+        with pytest.raises(InsufficientFunds):
+            service.transfer(alice, checking, savings, "1000")
+    assert versions(Session, users) == [3, 2]
+
+
+def test_batch_transfers_bump_once_per_chunk(Session, users):
+    (alice, (checking, savings)), _ = users
+    items = [{'from_account': checking, 'to_account': savings,
+              'amount': '1'} for _ in range(4)]
+    with Session() as session:
+        TransferService(session).transfer_batch(alice, items, chunk_size=2)
+    assert versions(Session, users) == [3, 1]
+
+
+def test_admin_commands_bump_the_account_owner(Session, users):
+    _, (_, (bob_checking,)) = users
+    bus = CommandBus(Session, max_wait=0)
+    try:
+        bus.execute(DbDepositCommand(bob_checking, "5"))
+    finally:
+        bus.shutdown()
+    assert versions(Session, users) == [1, 2]
+
+
+def test_cached_operations_bump_when_flushed(Session, users):
+    (alice, (checking, savings)), _ = users
+    bank_system = BankSystem(Session, flush_interval=60)
+    bank_system.transfer_funds(alice, checking, savings, 10)
+    assert versions(Session, users) == [1, 1]
+    bank_system.flush()
+    assert versions(Session, users) == [2, 1]
+
+
+@pytest.fixture
+def app(Session):
+    db_session = Session()
+    app = Flask(__name__)
+    app.secret_key = "test"
+    calls = []
+
+    @app.route('/balances')
+    @conditional(db_session)
+    def balances():
+        calls.append(1)
+        return jsonify(calls=len(calls))
+
+    @app.route('/login/<int:user_id>')
+    def login(user_id):
+        flask_session['user_id'] = user_id
+        db_session.rollback()
+        return ""
+
+    app.db_session = db_session
+    yield app
+    db_session.close()
+
+
+def test_unchanged_ledger_answers_304_after_one_lookup(app, engine, users):
+    (alice, (checking, _)), (bob, _) = users
+    client = app.test_client()
+    client.get(f'/login/{alice}')
+
+    first = client.get('/balances')
+    etag = first.headers['ETag']
+    assert first.status_code == 200
+    assert etag.startswith('W/"1-')
+    assert first.headers['Cache-Control'] == "private, no-cache"
+
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        app.db_session.rollback()
+        second = client.get('/balances', headers={'If-None-Match': etag})
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert second.status_code == 304
+    assert second.headers['ETag'] == etag
+    assert second.data == b""
+    # SQLite engines here issue an explicit BEGIN first
+    assert [s for s in statements if s != "BEGIN"] == [
+        "SELECT users.ledger_version \nFROM users \n"
+        "WHERE users.user_id = ?"]
+
+    # other filters, and other users, get other tags
+    assert client.get('/balances?type=deposit').headers['ETag'] != etag
+    client.get(f'/login/{bob}')
+    assert client.get('/balances').headers['ETag'] != etag
+    client.get(f'/login/{alice}')
+
+    bump_ledger_versions(app.db_session, [checking])
+    app.db_session.commit()
+    third = client.get('/balances', headers={'If-None-Match': etag})
+    assert third.status_code == 200
+    assert third.get_json() == {'calls': 4}
+    assert third.headers['ETag'].startswith('W/"2-')
+
+
+def test_anonymous_requests_are_not_tagged(app):
+    response = app.test_client().get('/balances')
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
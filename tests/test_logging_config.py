@@ -0,0 +1,148 @@
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import pytest
+from flask import Flask
+from logic.logging_config import (
+    JsonFormatter, LazyQueueHandler, RequestLog, SamplingFilter,
+    configure_logging, parse_levels, shutdown_logging
+)
+
+
+@pytest.fixture
+def output():
+    root = logging.getLogger()
+    level = root.level
+    stream = io.StringIO()
+    yield stream
+    shutdown_logging()
+    root.setLevel(level)
+    logging.getLogger("tests.quiet").setLevel(logging.NOTSET)
+
+
+def lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def record(level=logging.DEBUG, msg="tick %d", args=(1,), name="tests",
+           lineno=1):
+    return logging.LogRecord(name, level, __file__, lineno, msg, args, None)
+
+
+def test_json_formatter_adds_extra_fields_and_tracebacks():
+    logger = logging.getLogger("tests.json")
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        entry = logger.makeRecord(
+            logger.name, logging.ERROR, __file__, 1, "failed %s", ("x",),
+            sys.exc_info(), extra={'account_id': 7})
+    formatted = json.loads(JsonFormatter().format(entry))
+    assert formatted['level'] == "ERROR"
+    assert formatted['logger'] == "tests.json"
+    assert formatted['message'] == "failed x"
+    assert formatted['account_id'] == 7
+    assert "ValueError: boom" in formatted['exc']
+    assert formatted['time'].endswith("+00:00")
+
+
+def test_sampling_keeps_one_in_n_debug_records_per_call_site():
+    sampler = SamplingFilter(rate=0.25)
+    kept = [sampler.filter(record(msg=f"tick {i}", args=()))
+            for i in range(8)]
+    assert kept == [True, False, False, False, True, False, False, False]
+    assert sampler.filter(record(lineno=2))
+    assert all(sampler.filter(record(level=logging.INFO)) for _ in range(3))
+    with pytest.raises(ValueError):
+        SamplingFilter(rate=0)
+
+
+def test_parse_levels():
+    assert parse_levels(" sqlalchemy.engine=info, logic=DEBUG,") == {
+        'sqlalchemy.engine': logging.INFO, 'logic': logging.DEBUG}
+    with pytest.raises(ValueError):
+        parse_levels("logic")
+    with pytest.raises(ValueError):
+        parse_levels("logic=LOUD")
+
+
+def test_messages_are_formatted_by_the_listener_thread(output):
+    formatted_in = []
+
+    class Argument:
+        def __str__(self):
+            formatted_in.append(threading.current_thread())
+            return "argument"
+
+    entry = record(msg="%s", args=(Argument(),))
+    assert LazyQueueHandler(None).prepare(entry) is entry
+    assert formatted_in == []
+
+    configure_logging({'LOG_LEVEL': "INFO"}, output)
+    logging.getLogger("tests").info("%s", Argument())
+    shutdown_logging()
+    assert lines(output)[-1]['message'] == "argument"
+    # the test runner's own handlers may also format it in this thread
+    assert formatted_in[-1] is not threading.current_thread()
+
+
+def test_configure_logging_from_the_environment(output):
+    configure_logging({'LOG_LEVEL': "DEBUG",
+                       'LOG_LEVELS': "tests.quiet=WARNING",
+                       'LOG_DEBUG_SAMPLE_RATE': "0.5"}, output)
+    for i in range(4):
+        logging.getLogger("tests.loud").debug("tick %d", i)
+    logging.getLogger("tests.quiet").info("hidden")
+    logging.getLogger("tests.quiet").warning("shown", extra={'code': 3})
+    shutdown_logging()
+
+    entries = lines(output)
+    ticks = [entry for entry in entries if entry['logger'] == "tests.loud"]
+    assert [entry['message'] for entry in ticks] == ["tick 0", "tick 2"]
+    assert ticks[0]['sample_rate'] == 0.5
+    quiet = [entry for entry in entries if entry['logger'] == "tests.quiet"]
+    assert [(entry['message'], entry['code']) for entry in quiet] == [
+        ("shown", 3)]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_child_logs_through_a_listener_of_its_own(tmp_path):
+    path = tmp_path / "log.jsonl"
+    with open(path, "w") as stream:
+        configure_logging({'LOG_LEVEL': "INFO"}, stream)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                logging.getLogger("tests.child").info("from the child")
+                shutdown_logging()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        logging.getLogger("tests.parent").info("from the parent")
+        shutdown_logging()
+    entries = [json.loads(line) for line in path.read_text().splitlines()]
+    assert sorted(entry['message'] for entry in entries
+                  if entry['logger'].startswith("tests.")) == [
+        "from the child", "from the parent"]
+
+
+def test_request_log(output):
+    app = Flask(__name__)
+    RequestLog(app)
+
+    @app.route('/ping')
+    def ping():
+        return "pong"
+
+    configure_logging({'LOG_LEVEL': "DEBUG"}, output)
+    assert app.test_client().get('/ping?x=1').status_code == 200
+    shutdown_logging()
+    entry = next(entry for entry in lines(output)
+                 if entry['logger'] == "logic.requests")
+    assert entry['message'] == "GET /ping 200"
+    assert (entry['method'], entry['path'], entry['status']) == (
+        "GET", "/ping", 200)
+    assert entry['duration_ms'] >= 0
@@ -1,5 +1,9 @@
 import pytest
+import time
+import uuid
+from decimal import Decimal
 from logic.main import BankApp, WithdrawCommand, DepositCommand
+from logic.main import _close_apps, _open_apps
 from flask import Flask
 from unittest.mock import Mock, patch, PropertyMock, MagicMock
 from flask.sessions import SecureCookieSessionInterface
@@ -8,10 +12,17 @@ import sqlalchemy.orm
 from database.models import User, Account, Transaction, TransactionType, TransactionStatus, Role
 from logic.user_auth import UserAuth
 from logic.bank_system import BankSystem
+from logic.transfer_service import TransferService, TransferOutcome, InsufficientFunds
+from logic.dashboard import DashboardService
 
 @pytest.fixture
-def client():
+def bank_app():
     bank_app = BankApp()
+    yield bank_app
+    bank_app.close()
+
+@pytest.fixture
+def client(bank_app):
     bank_app.app.config['TESTING'] = True
     bank_app.app.config['SECRET_KEY'] = 'test_secret_key'
 
@@ -41,7 +52,7 @@ def test_login_success(client):
         mock_user.user_id = 1
         mock_user.role = Role.user
         mock_query.return_value.\
-            filter_by.return_value.first.return_value = mock_user
+            filter.return_value.first.return_value = mock_user
 
         response = client.post('/login', data={
             'username': 'correct_username',
@@ -51,6 +62,30 @@ def test_login_success(client):
         assert response.status_code == 302
         assert "/dashboard" in response.headers['Location']
 
+def test_login_rehashes_outdated_cost(client, bank_app):
+    bank_app.password_hasher.rounds = 4
+    old_hash = bcrypt.hashpw('correct_password'.encode('utf-8'),
+                             bcrypt.gensalt(5)).decode('utf-8')
+
+    with patch.object(sqlalchemy.orm.Session, 'query') as mock_query, \
+            patch.object(sqlalchemy.orm.Session, 'commit') as mock_commit:
+        mock_user = Mock()
+        mock_user.password_hash = old_hash
+        mock_user.user_id = 1
+        mock_user.role = Role.user
+        mock_query.return_value.\
+            filter.return_value.first.return_value = mock_user
+
+        response = client.post('/login', data={
+            'username': 'correct_username',
+            'password': 'correct_password'
+        })
+        assert response.status_code == 302
+        assert mock_user.password_hash.startswith('$2b$04$')
+        assert bcrypt.checkpw(b'correct_password',
+                              mock_user.password_hash.encode('utf-8'))
+        mock_commit.assert_called()
+
 def test_login_fail(client):
     response = client.post('/login', data=dict
                            (username="wrong", password="wrong"))
@@ -61,7 +96,7 @@ def test_register_success(client):
     with patch.object(sqlalchemy.orm.Session, 'query') as mock_query:
         # Simulate no existing user
         mock_query.return_value.\
-            filter_by.return_value.first.return_value = None
+            filter.return_value.first.return_value = None
 
         with patch.object(sqlalchemy.orm.Session, 'add') as mock_add:
             with patch.object(sqlalchemy.orm.Session, 'commit') as mock_commit:
@@ -69,7 +104,7 @@ def test_register_success(client):
                 mock_new_user = Mock()
                 mock_new_user.user_id = 1
                 mock_query.return_value.\
-                    filter_by.return_value.first.side_effect =\
+                    filter.return_value.first.side_effect =\
                     [None, mock_new_user]
 
                 response = client.post('/register', data={
@@ -98,6 +133,111 @@ def test_dashboard_access_with_login(client):
     assert response.status_code == 200
     assert b"Dashboard" in response.data
 
+def test_dashboard_query_count(client, bank_app):
+    from sqlalchemy import event
+    engine = bank_app.engine
+    admin_user = bank_app.db_session.query(User).filter_by(
+        username='admin').first()
+    with client.session_transaction() as sess:
+        sess['user_id'] = admin_user.user_id
+
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        response = client.get('/dashboard')
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert response.status_code == 200
+    assert len(statements) <= 2
+
+def test_dashboard_shows_cached_balances(client, bank_app):
+    from logic.dashboard import AccountSummary, DashboardData
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+    data = DashboardData(user_name="alice", accounts=[
+        AccountSummary(7, "Checking Account", Decimal("10.00")),
+        AccountSummary(8, "Savings Account", Decimal("20.00"))])
+    with patch('logic.main.DashboardService.load', return_value=data), \
+            patch.object(bank_app.bank_system, 'get_user_accounts',
+                         return_value={7: Decimal("15.00")}):
+        response = client.get('/dashboard')
+    assert response.status_code == 200
+    assert b"$35.00" in response.data
+    # the cached dashboard itself is left as it was
+    assert data.total_balance == Decimal("30.00")
+
+def test_dashboard_balances_are_cached_for_later_reads(client, bank_app):
+    from sqlalchemy import event
+    from logic.dashboard import AccountSummary, DashboardData
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+    data = DashboardData(user_name="alice", accounts=[
+        AccountSummary(7, "Checking Account", Decimal("10.00"))])
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+    with patch('logic.main.DashboardService.load', return_value=data):
+        assert client.get('/dashboard').status_code == 200
+        assert bank_app.bank_system.get_user_accounts(1) == {
+            7: Decimal("10.00")}
+        event.listen(bank_app.engine, "before_cursor_execute", count)
+        try:
+            assert client.get('/dashboard').status_code == 200
+        finally:
+            event.remove(bank_app.engine, "before_cursor_execute", count)
+    assert not [statement for statement in statements
+                if "FROM accounts" in statement]
+
+def test_dashboard_conditional_get(client, bank_app):
+    from sqlalchemy import update
+    admin_user = bank_app.db_session.query(User).filter_by(
+        username='admin').first()
+    with client.session_transaction() as sess:
+        sess['user_id'] = admin_user.user_id
+
+    first = client.get('/dashboard')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert client.get('/dashboard', headers={
+        'If-None-Match': etag}).status_code == 304
+
+    bank_app.db_session.execute(update(User).where(
+        User.user_id == admin_user.user_id).values(
+            ledger_version=User.ledger_version + 1))
+    bank_app.db_session.commit()
+    changed = client.get('/dashboard', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+def test_dashboard_served_from_user_cache(client, bank_app):
+    admin_user = bank_app.db_session.query(User).filter_by(
+        username='admin').first()
+    with client.session_transaction() as sess:
+        sess['user_id'] = admin_user.user_id
+    cache = bank_app.user_cache
+    hits, misses = cache.hits, cache.misses
+
+    with patch('logic.main.DashboardService.load',
+               wraps=DashboardService(bank_app.db_session).load) \
+            as load:
+        assert client.get('/dashboard').status_code == 200
+        assert client.get('/dashboard').status_code == 200
+        cache.invalidate(admin_user.user_id)
+        assert client.get('/dashboard').status_code == 200
+    assert load.call_count == 2
+    assert (cache.hits - hits, cache.misses - misses) == (1, 2)
+
+    with patch.object(sqlalchemy.orm.Session, 'query') as mock_query:
+        mock_query.return_value.filter_by.return_value.first.return_value \
+            = Mock(role=Role.admin)
+        stats = client.get('/admin/cache').get_json()
+    assert stats['hits'] == cache.hits
+    assert stats['backend'] == 'MemoryBackend'
+
 def test_logout(client):
     with client.session_transaction() as sess:
         sess['user_id'] = 1
@@ -139,12 +279,14 @@ def test_transfer_insufficient_funds(client):
                     with client.session_transaction() as sess:
                         sess['user_id'] = 1
 
-                    response = client.post('/transfer', data={
-                        'fromAccount': '1',
-                        'transferType': 'internal',
-                        'amount': '200',  # More than the account balance
-                        'toInternalAccount': '2'
-                    })
+                    with patch.object(TransferService, 'transfer',
+                                      side_effect=InsufficientFunds()):
+                        response = client.post('/transfer', data={
+                            'fromAccount': '1',
+                            'transferType': 'internal',
+                            'amount': '200',  # More than the account balance
+                            'toInternalAccount': '2'
+                        })
                     assert response.status_code == 400
                     assert b"Insufficient funds." in response.data
 
@@ -159,12 +301,12 @@ def test_transfer_external_success(client):
         mock_from_account = Mock()
         mock_from_account.account_id = 1
         mock_from_account.user_id = 1
-        mock_from_account.balance = 500.0
+        mock_from_account.balance = Decimal('500.00')
 
         mock_to_account = Mock()
         mock_to_account.account_id = 2
         mock_to_account.user_id = 2
-        mock_to_account.balance = 300.0
+        mock_to_account.balance = Decimal('300.00')
 
         def mock_query_side_effect(model):
             if model == User:
@@ -197,12 +339,16 @@ def test_transfer_external_success(client):
                     with client.session_transaction() as sess:
                         sess['user_id'] = 1
 
-                    response = client.post('/transfer', data={
-                        'fromAccount': '1',
-                        'transferType': 'external',
-                        'amount': '100',
-                        'toExternalAccount': '2'
-                    })
+                    with patch.object(TransferService, 'transfer') \
+                            as mock_transfer:
+                        response = client.post('/transfer', data={
+                            'fromAccount': '1',
+                            'transferType': 'external',
+                            'amount': '100',
+                            'toExternalAccount': '2'
+                        })
+                    mock_transfer.assert_called_once_with(
+                        1, 1, 2, Decimal('100.00'), external=True)
                     # Expecting a redirect to dashboard on success
                     assert response.status_code == 302
                     assert "/dashboard" in response.headers['Location']
@@ -218,7 +364,7 @@ def test_admin_access_with_admin_login(client):
         mock_admin_user.role = Role.admin
 
         mock_query.return_value.\
-            filter_by.return_value.first.return_value = mock_admin_user
+            filter.return_value.first.return_value = mock_admin_user
 
         # Login as admin
         response = client.post('/login', data={
@@ -236,6 +382,56 @@ def test_admin_access_with_admin_login(client):
         assert response.status_code == 200
         assert b"Admin" in response.data
 
+def test_admin_sorting_and_paging(client):
+    with patch.object(sqlalchemy.orm.Session, 'query') as mock_query:
+        mock_admin_user = Mock()
+        mock_admin_user.user_id = 1
+        mock_admin_user.role = Role.admin
+        mock_query.return_value.\
+            filter_by.return_value.first.return_value = mock_admin_user
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+
+        response = client.get('/admin?sort=balance&order=desc&page=1&per_page=5')
+        assert response.status_code == 200
+        assert b"Page 1 of" in response.data
+
+        response = client.get('/admin?sort=password_hash')
+        assert response.status_code == 400
+
+def test_admin_role_claim_skips_the_user_lookup(client):
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['role'] = [1, 'admin', time.time()]
+    with patch.object(sqlalchemy.orm.Session, 'query') as mock_query:
+        response = client.get('/admin/cache')
+    assert response.status_code == 200
+    mock_query.assert_not_called()
+
+def test_admin_role_claim_is_rechecked_after_ttl(client, bank_app):
+    ttl = bank_app.role_claim_ttl
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['role'] = [1, 'admin', time.time() - ttl]
+    with patch.object(sqlalchemy.orm.Session, 'query') as mock_query:
+        # the admin role was revoked in the meantime
+        mock_query.return_value.filter_by.return_value.first.return_value \
+            = Mock(role=Role.user)
+        assert client.get('/admin/cache').status_code == 302
+        assert client.get('/admin/cache').status_code == 302
+    mock_query.assert_called_once()
+    with client.session_transaction() as sess:
+        assert sess['role'][:2] == [1, 'user']
+
+def test_admin_role_claim_of_another_user_is_ignored(client):
+    with client.session_transaction() as sess:
+        sess['user_id'] = 2
+        sess['role'] = [1, 'admin', time.time()]
+    with patch.object(sqlalchemy.orm.Session, 'query') as mock_query:
+        mock_query.return_value.filter_by.return_value.first.return_value \
+            = None
+        assert client.get('/admin/cache').status_code == 302
+
 def test_admin_access_without_login(client):
     response = client.get('/admin')
     assert response.status_code == 302
@@ -253,7 +449,7 @@ def test_admin_access_with_non_admin_login(client):
         mock_user.role = Role.user
 
         mock_query.return_value.\
-            filter_by.return_value.first.return_value = mock_user
+            filter.return_value.first.return_value = mock_user
 
         # Login as regular user
         response = client.post('/login', data={
@@ -293,20 +489,34 @@ def test_api_transactions_with_login(client):
 
     # Mock the query for transactions
     with patch.object(sqlalchemy.orm.Session, 'query') as mock_query:
-        mock_transaction = Mock()
-        mock_transaction.account = Mock()
-        mock_transaction.account.created_at.strftime.return_value = '2021-01-01'
-        mock_transaction.transaction_type.name = 'Deposit'
-        mock_transaction.account.account_type = 'Checking'
-        mock_transaction.amount = 100.0
+        mock_row = Mock()
+        mock_row.transaction_id = 7
+        mock_row.created_at.strftime.return_value = '2021-01-01'
+        mock_row.transaction_type.name = 'Deposit'
+        mock_row.account_type = 'Checking'
+        mock_row.amount = 100.0
+        mock_row.notes = None
 
-        mock_query.return_value.join.return_value.filter.return_value.order_by.return_value.all.return_value = [mock_transaction]
+        mock_query.return_value.join.return_value.filter.return_value.order_by.return_value.limit.return_value.all.return_value = [mock_row]
 
         response = client.get('/api/transactions')
         assert response.status_code == 200
         data = response.get_json()
-        assert isinstance(data, list)
-        assert data[0]['type'] == 'Deposit'
+        assert isinstance(data['transactions'], list)
+        assert data['transactions'][0]['type'] == 'Deposit'
+        assert data['next_cursor'] is None
+
+def test_api_transactions_invalid_filter(client):
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+
+    response = client.get('/api/transactions?type=bogus')
+    assert response.status_code == 400
+    response = client.get('/api/transactions?cursor=not-a-cursor')
+    assert response.status_code == 400
+    response = client.get('/api/transactions?account=abc')
+    assert response.status_code == 400
+    assert response.data == b"Invalid account."
 
 def test_api_transactions_without_login(client):
     response = client.get('/api/transactions')
@@ -319,13 +529,29 @@ def test_login_page(client):
     assert response.status_code == 200
     assert b"Login" in response.data or b"Sign In" in response.data
 
-def test_getters(client):
-    bank_app_instance = BankApp()
+def test_getters(client, bank_app):
     # Test the getters
-    assert isinstance(bank_app_instance.app, Flask)
-    assert bank_app_instance.db_session is not None
-    assert isinstance(bank_app_instance.bank_system, BankSystem)
-    assert isinstance(bank_app_instance.user_auth, UserAuth)
+    assert isinstance(bank_app.app, Flask)
+    assert bank_app.db_session is not None
+    assert isinstance(bank_app.bank_system, BankSystem)
+    assert isinstance(bank_app.user_auth, UserAuth)
+
+def test_db_session_scoped_per_app_context(client, bank_app):
+    with bank_app.app.app_context():
+        first = bank_app.db_session()
+        assert bank_app.db_session() is first
+    with bank_app.app.app_context():
+        second = bank_app.db_session()
+    assert first is not second
+
+def test_db_session_removed_on_teardown(client, bank_app):
+    with bank_app.app.app_context():
+        bank_app.db_session()
+        assert bank_app.db_session.registry.has()
+    with patch.object(bank_app.db_session, 'remove') as mock_remove:
+        with bank_app.app.app_context():
+            pass
+        mock_remove.assert_called_once()
 
 def test_deposit_command(client):
     # Mocking the BankSystem methods
@@ -396,6 +622,146 @@ def test_withdraw_command(client):
 
         assert mock_account.balance == 500.00
 
+def test_transfer_rejects_invalid_amounts(client):
+    with patch.object(sqlalchemy.orm.Session, 'query') as mock_query:
+        mock_user = Mock()
+        mock_user.user_id = 1
+        mock_query.return_value.\
+            filter_by.return_value.first.return_value = mock_user
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+
+        for amount in ['-5', '0', 'abc', '1.005', 'NaN']:
+            response = client.post('/transfer', data={
+                'fromAccount': '1',
+                'transferType': 'internal',
+                'amount': amount,
+                'toInternalAccount': '2'
+            })
+            assert response.status_code == 400
+            assert b"Invalid amount." in response.data
+
+def test_transfer_is_pre_checked_from_the_balance_cache(client, bank_app):
+    from sqlalchemy import event
+    bank_app.bank_system.refresh(1, {7: Decimal("10.00")})
+    form = {'fromAccount': '7', 'transferType': 'internal',
+            'toInternalAccount': '8'}
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+    with patch.object(sqlalchemy.orm.Session, 'query') as mock_query, \
+            patch.object(TransferService, 'transfer') as transfer:
+        mock_query.return_value.\
+            filter_by.return_value.first.return_value = Mock(user_id=1)
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        event.listen(bank_app.engine, "before_cursor_execute", count)
+        try:
+            response = client.post('/transfer', data=dict(form, amount='10'))
+        finally:
+            event.remove(bank_app.engine, "before_cursor_execute", count)
+        assert response.status_code == 302
+        assert transfer.call_count == 1
+        assert not [statement for statement in statements
+                    if "FROM accounts" in statement]
+
+        with patch.object(bank_app.bank_system, 'has_funds',
+                          return_value=False):
+            response = client.post('/transfer', data=dict(form, amount='11'))
+        assert response.status_code == 400
+        assert b"Insufficient funds." in response.data
+        assert transfer.call_count == 1
+
+def test_out_of_range_amounts_are_rejected(client):
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['role'] = [1, 'admin', time.time()]
+    with patch.object(sqlalchemy.orm.Session, 'query') as mock_query:
+        mock_query.return_value.\
+            filter_by.return_value.first.return_value = Mock(user_id=1)
+        for amount in ['1e30', '99999999999999999999']:
+            response = client.post('/transfer', data={
+                'fromAccount': '1',
+                'transferType': 'internal',
+                'amount': amount,
+                'toInternalAccount': '2'
+            })
+            assert response.status_code == 400
+            assert response.data == b"Amount out of range."
+            response = client.post('/admin/transaction', data={
+                'account_id': '1', 'type': 'deposit', 'amount': amount})
+            assert response.status_code == 400
+            assert response.data == b"Amount out of range."
+
+def test_batch_transfer_api(client):
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+    transfers = [{'from_account': 1, 'to_account': 2, 'amount': '5'},
+                 {'from_account': 1, 'to_account': 2, 'amount': '500'}]
+    with patch.object(TransferService, 'transfer_batch', return_value=[
+            TransferOutcome(0, from_balance=Decimal('95.00')),
+            TransferOutcome(1, error="Insufficient funds.")]) as batch:
+        response = client.post('/api/transfers', json={
+            'transfers': transfers, 'chunk_size': 100})
+    batch.assert_called_once_with(1, transfers, chunk_size=100)
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'results': [
+            {'index': 0, 'status': 'completed', 'from_balance': '95.00'},
+            {'index': 1, 'status': 'rejected',
+             'error': 'Insufficient funds.'}],
+        'completed': 1, 'rejected': 1}
+
+
+def test_batch_transfer_api_rejects_malformed_batches(client):
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+    for payload in [None, {'transfers': []}, {'transfers': {}},
+                    {'transfers': [{}], 'chunk_size': 0}]:
+        response = client.post('/api/transfers', json=payload)
+        assert response.status_code == 400
+
+
+def test_transfer_errors_do_not_reach_the_client(client):
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+    secret = "password=hunter2"
+    with patch.object(sqlalchemy.orm.Session, 'query') as mock_query, \
+            patch.object(TransferService, 'transfer',
+                         side_effect=RuntimeError(secret)), \
+            patch.object(TransferService, 'transfer_batch',
+                         side_effect=RuntimeError(secret)):
+        mock_query.return_value.filter_by.return_value.first.return_value \
+            = Mock(user_id=1)
+        responses = [
+            client.post('/transfer', data={
+                'fromAccount': '1', 'transferType': 'internal',
+                'toInternalAccount': '2', 'amount': '5'}),
+            client.post('/api/transfers', json={'transfers': [
+                {'from_account': 1, 'to_account': 2, 'amount': '5'}]})]
+    for response in responses:
+        assert response.status_code == 500
+        assert response.data == b"An error occurred during the transfer."
+
+
+def test_transfer_retry_with_idempotency_key_moves_money_once(client):
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+    headers = {'Idempotency-Key': str(uuid.uuid4())}
+    form = {'fromAccount': '1', 'transferType': 'internal',
+            'toInternalAccount': '2', 'amount': '5'}
+    with patch.object(sqlalchemy.orm.Session, 'query') as mock_query, \
+            patch.object(TransferService, 'transfer') as mock_transfer:
+        mock_query.return_value.filter_by.return_value.first.return_value \
+            = Mock(user_id=1)
+        first = client.post('/transfer', data=form, headers=headers)
+        retry = client.post('/transfer', data=form, headers=headers)
+    mock_transfer.assert_called_once()
+    assert first.status_code == retry.status_code == 302
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+
+
 def test_transfer_route_without_login(client):
     response = client.post('/transfer', data={
         'fromAccount': '1',
@@ -414,7 +780,7 @@ def test_register_user_success():
     user_auth = UserAuth(mock_bank_system, mock_session)
 
     # Simulate successful user registration
-    mock_session.query().filter_by().first.return_value = None
+    mock_session.query().filter().first.return_value = None
     result = user_auth.register_user("new_user", "email@example.com", "password")
     assert result['success'] is True
 
@@ -437,3 +803,78 @@ def test_session_getter_setter():
     new_session = Mock()
     user_auth.session = new_session
     assert user_auth.session == new_session
+
+def test_api_transactions_export(client):
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+
+    with patch('logic.main.TransactionExport.stream',
+               return_value=iter(["id,amount\r\n", "1,2.00\r\n"])) as stream:
+        response = client.get('/api/transactions/export?format=csv&type=deposit')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert 'transactions.csv' in response.headers['Content-Disposition']
+    assert response.data == b"id,amount\r\n1,2.00\r\n"
+    assert stream.call_args.args[1] == 'csv'
+    assert stream.call_args.args[2].transaction_type == TransactionType.deposit
+
+def test_api_transactions_export_invalid_request(client):
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+
+    assert client.get('/api/transactions/export?format=xml').status_code == 400
+    assert client.get('/api/transactions/export?start=bad').status_code == 400
+
+def test_import_is_side_effect_free_and_create_app_builds_the_app():
+    import subprocess
+    import sys
+    import os
+    script = """
+import sys
+import database.init_db
+import logic.main
+assert database.init_db._engine is None
+assert 'pyarrow' not in sys.modules
+app = logic.main.create_app({'DATABASE_URL': 'sqlite://', 'TESTING': True})
+assert app.extensions['bank_app'].engine.url.drivername == 'sqlite'
+assert database.init_db._engine is None
+assert app.test_client().get('/').status_code == 200
+"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", script], cwd=root,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+
+def test_create_app_builds_independent_apps(tmp_path):
+    from logic.main import create_app
+    from sqlalchemy import select
+    with patch('logic.main.configure_logging'):
+        apps = [create_app({'DATABASE_URL': f"sqlite:///{tmp_path / name}",
+                            'TESTING': True, 'SECRET_KEY': 'test_secret_key'})
+                for name in ('a.db', 'b.db')]
+    bank_apps = [app.extensions['bank_app'] for app in apps]
+    try:
+        assert bank_apps[0] is not bank_apps[1]
+        assert bank_apps[0].engine is not bank_apps[1].engine
+        for app, username in zip(apps, ('alice', 'bob')):
+            response = app.test_client().post('/register', data={
+                'username': username, 'email': f"{username}@example.com",
+                'password': 'secret_password'})
+            assert response.status_code == 302
+        for bank_app, username in zip(bank_apps, ('alice', 'bob')):
+            with bank_app.engine.connect() as connection:
+                usernames = set(connection.execute(
+                    select(User.username)).scalars())
+            assert usernames == {'admin', username}
+    finally:
+        for bank_app in bank_apps:
+            bank_app.close()
+
+
+def test_open_apps_are_closed_at_exit():
+    bank_app = BankApp()
+    with patch.object(bank_app, '_bank_system') as bank_system:
+        _close_apps()
+    bank_system.flush.assert_called_once()
+    assert bank_app not in _open_apps
@@ -0,0 +1,253 @@
+import re
+import pytest
+from sqlalchemy import create_engine, event, func, inspect, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from database.models import Base, Account, Transaction, User
+from database.init_db import init_db, DEFAULT_DATABASE_URL
+from database.migrations import migrate, current_version, stamp, HEAD
+
+HOT_INDEXES = {"ix_transactions_account_created", "ix_transactions_pending"}
+
+# the shapes of the dashboard and history queries
+HISTORY_QUERY = """
+    SELECT transactions.transaction_id, transactions.created_at
+    FROM transactions JOIN accounts
+        ON accounts.account_id = transactions.account_id
+    WHERE accounts.user_id = :user_id
+    ORDER BY transactions.created_at DESC, transactions.transaction_id DESC
+    LIMIT 51
+"""
+PENDING_QUERY = """
+    SELECT count(*)
+    FROM transactions JOIN accounts
+        ON accounts.account_id = transactions.account_id
+    WHERE accounts.user_id = :user_id AND transactions.status = 'pending'
+"""
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:")
+    yield engine
+    engine.dispose()
+
+
+def index_names(engine, table):
+    return {index['name'] for index in inspect(engine).get_indexes(table)}
+
+
+def test_fresh_database_is_stamped(engine):
+    init_db(engine)
+    with engine.connect() as connection:
+        assert current_version(connection) == HEAD
+    assert HOT_INDEXES <= index_names(engine, "transactions")
+    assert "ix_accounts_user_id" in index_names(engine, "accounts")
+
+
+def test_existing_database_is_migrated(engine):
+    """A database created before the indexes existed gets them added."""
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for name in HOT_INDEXES | {"ix_accounts_user_id"}:
+            connection.execute(text(f"DROP INDEX {name}"))
+    with engine.connect() as connection:
+        assert current_version(connection) == 0
+
+    init_db(engine)
+
+    with engine.connect() as connection:
+        assert current_version(connection) == HEAD
+    assert HOT_INDEXES <= index_names(engine, "transactions")
+    assert "ix_accounts_user_id" in index_names(engine, "accounts")
+
+
+def test_migrate_is_idempotent(engine):
+    Base.metadata.create_all(engine)
+    assert migrate(engine) == list(range(1, HEAD + 1))
+    assert migrate(engine) == []
+    stamp(engine)
+    with engine.connect() as connection:
+        assert current_version(connection) == HEAD
+
+
+def test_migrated_database_is_only_read(engine):
+    init_db(engine)
+    checkouts, statements = [], []
+    event.listen(engine, "checkout", lambda *args: checkouts.append(1))
+
+    def listen(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", listen)
+    assert migrate(engine) == []
+    assert len(checkouts) == 1
+    assert not [statement for statement in statements
+                if not statement.lstrip().upper().startswith(
+                    ("SELECT", "PRAGMA"))]
+
+
+def sqlite_plan(engine, query):
+    with engine.connect() as connection:
+        rows = connection.execute(text("EXPLAIN QUERY PLAN " + query),
+                                  {'user_id': 1}).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+def test_sqlite_history_query_uses_indexes(engine):
+    init_db(engine)
+    plan = sqlite_plan(engine, HISTORY_QUERY)
+    assert "USING INDEX ix_accounts_user_id" in plan \
+        or "USING COVERING INDEX ix_accounts_user_id" in plan
+    assert "ix_transactions_account_created" in plan
+
+
+def test_sqlite_pending_query_uses_partial_index(engine):
+    init_db(engine)
+    plan = sqlite_plan(engine, PENDING_QUERY)
+    assert "ix_transactions_pending" in plan
+
+
+@pytest.fixture
+def postgres_engine():
+    engine = create_engine(DEFAULT_DATABASE_URL)
+    try:
+        with engine.connect():
+            pass
+    except OperationalError:
+        pytest.skip("PostgreSQL is not available")
+    init_db(engine)
+    yield engine
+    engine.dispose()
+
+
+def postgres_plan(engine, query):
+    with engine.connect() as connection:
+        # the test tables are tiny, so make the planner prefer indexes
+        connection.execute(text("SET enable_seqscan = off"))
+        rows = connection.execute(text("EXPLAIN " + query),
+                                  {'user_id': 1}).all()
+    return "\n".join(row[0] for row in rows)
+
+
+# on the partitions of the transactions table, the model indexes show up
+# under names generated from the partition and column names
+PARTITION_INDEXES = {
+    "ix_transactions_account_created":
+        "_account_id_created_at_transaction_id_idx",
+    "ix_transactions_pending": "_account_id_idx",
+}
+
+
+def uses_index(plan, name):
+    # "Index Scan using <index> on <partition>" or, for bitmap scans,
+    # "Bitmap Index Scan on <index>"
+    return name in plan or re.search(
+        r"transactions_\w+" + PARTITION_INDEXES[name] + r"\b", plan) \
+        is not None
+
+
+def test_postgres_history_query_uses_index_scans(postgres_engine):
+    plan = postgres_plan(postgres_engine, HISTORY_QUERY)
+    assert "ix_accounts_user_id" in plan
+    assert uses_index(plan, "ix_transactions_account_created")
+
+
+def test_postgres_pending_query_uses_partial_index(postgres_engine):
+    plan = postgres_plan(postgres_engine, PENDING_QUERY)
+    assert uses_index(plan, "ix_transactions_pending")
+
+
+def test_money_migrated_to_cents(engine):
+    """Float balances and amounts of an existing database become cents."""
+    with engine.begin() as connection:
+        connection.execute(text("""
+            CREATE TABLE users (user_id INTEGER PRIMARY KEY,
+                username VARCHAR NOT NULL UNIQUE, email VARCHAR NOT NULL,
+                password_hash VARCHAR NOT NULL, role VARCHAR(5) NOT NULL)"""))
+        connection.execute(text("""
+            CREATE TABLE accounts (account_id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL, account_type VARCHAR NOT NULL,
+                balance FLOAT NOT NULL, created_at DATETIME)"""))
+        connection.execute(text("""
+            CREATE TABLE transactions (transaction_id INTEGER PRIMARY KEY,
+                account_id INTEGER NOT NULL, transaction_type VARCHAR(10),
+                amount FLOAT NOT NULL, status VARCHAR(9) NOT NULL,
+                created_at DATETIME, notes VARCHAR)"""))
+        connection.execute(text(
+            "INSERT INTO users VALUES (1, 'u', 'u@example.com', 'h', 'user')"))
+        connection.execute(text(
+            "INSERT INTO accounts VALUES (1, 1, 'Checking', 0.3, NULL)"))
+        connection.execute(text(
+            "INSERT INTO transactions VALUES "
+            "(1, 1, 'deposit', 0.1, 'completed', NULL, NULL), "
+            "(2, 1, 'deposit', 0.2, 'completed', NULL, NULL)"))
+
+    init_db(engine)
+
+    with Session(engine) as session:
+        account = session.get(Account, 1)
+        assert str(account.balance) == "0.30"
+        amounts = [row.amount for row in session.query(
+            Transaction.amount).order_by(Transaction.transaction_id)]
+        assert [str(a) for a in amounts] == ["0.10", "0.20"]
+        total = session.query(func.sum(Transaction.amount)).scalar()
+        assert str(total) == "0.30"
+        # users of an existing database get a ledger version too
+        assert session.get(User, 1).ledger_version == 1
+
+
+def test_idempotency_content_type_added(engine):
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "ALTER TABLE idempotency_keys DROP COLUMN content_type"))
+
+    assert migrate(engine) == list(range(1, HEAD + 1))
+
+    columns = {column['name'] for column in
+               inspect(engine).get_columns("idempotency_keys")}
+    assert "content_type" in columns
+
+
+def insert_users(engine, usernames):
+    with engine.begin() as connection:
+        for i, username in enumerate(usernames, 1):
+            connection.execute(text(
+                "INSERT INTO users (user_id, username, email, password_hash, "
+                "role) VALUES (:id, :username, :email, 'h', 'user')"),
+                {'id': i, 'username': username,
+                 'email': f"{i}@example.com"})
+
+
+def test_usernames_lowercased_once(engine):
+    """Mixed-case usernames of an existing database are lowercased."""
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_users_username_lower"))
+    insert_users(engine, ["Alice", "bob"])
+
+    init_db(engine)
+
+    with engine.connect() as connection:
+        assert connection.execute(text(
+            "SELECT username FROM users ORDER BY user_id")).scalars().all() \
+            == ["alice", "bob"]
+    # SQLite does not reflect expression indexes, but the planner uses it
+    plan = sqlite_plan(engine, "SELECT user_id FROM users "
+                               "WHERE lower(username) = 'alice'")
+    assert "ix_users_username_lower" in plan
+
+
+def test_usernames_differing_in_case_stop_the_migration(engine):
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_users_username_lower"))
+    insert_users(engine, ["Alice", "alice", "bob"])
+
+    with pytest.raises(RuntimeError, match="alice"):
+        migrate(engine)
+    with engine.connect() as connection:
+        assert connection.execute(text(
+            "SELECT username FROM users ORDER BY user_id")).scalars().all() \
+            == ["Alice", "alice", "bob"]
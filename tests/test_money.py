@@ -0,0 +1,44 @@
+import pytest
+from decimal import Decimal
+from database.money import to_money, to_cents, from_cents, parse_amount
+from database.money import MAX_AMOUNT
+
+
+def test_to_money_rounds_to_cents():
+    assert to_money(0.1) == Decimal("0.10")
+    assert to_money("2.005") == Decimal("2.01")
+    assert to_money(3) == Decimal("3.00")
+    assert to_money(Decimal("1.234")) == Decimal("1.23")
+
+
+def test_to_money_rejects_non_numbers():
+    for value in ["abc", "NaN", "Infinity", None]:
+        with pytest.raises(ValueError):
+            to_money(value)
+
+
+def test_cents_round_trip():
+    assert to_cents(0.1) + to_cents(0.2) == to_cents(0.3)
+    assert to_cents("1234.56") == 123456
+    assert from_cents(123456) == Decimal("1234.56")
+    assert from_cents(-5) == Decimal("-0.05")
+
+
+def test_parse_amount():
+    assert parse_amount(" 12.50 ") == Decimal("12.50")
+    for text in ["0", "-1", "1.001", "abc", "", "NaN", "inf"]:
+        with pytest.raises(ValueError):
+            parse_amount(text)
+
+
+def test_amounts_must_fit_the_cents_column():
+    assert to_cents(MAX_AMOUNT) == 2 ** 63 - 1
+    assert parse_amount(str(MAX_AMOUNT)) == MAX_AMOUNT
+    # 1e30 cannot even be quantized to cents in the default context
+    for text in ["1e30", "99999999999999999999", "92233720368547758.08"]:
+        with pytest.raises(ValueError):
+            parse_amount(text)
+        with pytest.raises(ValueError):
+            to_money(text)
+    with pytest.raises(ValueError):
+        to_cents(-MAX_AMOUNT - 1)
@@ -0,0 +1,190 @@
+import uuid
+import pytest
+from datetime import date, datetime
+from sqlalchemy import create_engine, func, insert, inspect, select, text
+from sqlalchemy.exc import OperationalError
+from database.init_db import init_db, DEFAULT_DATABASE_URL
+from database.migrations import current_version, migrate, HEAD
+from database.models import Base, User, Account, Transaction, Role
+from database.models import TransactionType, TransactionStatus
+from database.partitions import (
+    add_months, drop_partitions, ensure_partitions, is_partitioned,
+    month_start, partition_name, partitions, partition_transactions
+)
+
+TODAY = date(2026, 10, 18)
+
+
+def test_month_arithmetic():
+    assert month_start(datetime(2026, 10, 18, 12)) == date(2026, 10, 1)
+    assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert partition_name(date(2027, 1, 1)) == "transactions_p202701"
+
+
+def test_sqlite_is_left_unpartitioned():
+    engine = create_engine("sqlite:///:memory:")
+    init_db(engine)
+    with engine.begin() as connection:
+        partition_transactions(connection)
+        assert not is_partitioned(connection)
+    assert ensure_partitions(engine) == []
+    assert drop_partitions(engine, TODAY) == []
+    engine.dispose()
+
+
+@pytest.fixture
+def pg_engine():
+    """An engine on a throwaway schema of the local PostgreSQL database."""
+    admin = create_engine(DEFAULT_DATABASE_URL)
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    try:
+        with admin.begin() as connection:
+            connection.execute(text(f"CREATE SCHEMA {schema}"))
+    except OperationalError:
+        pytest.skip("PostgreSQL is not available")
+    engine = create_engine(DEFAULT_DATABASE_URL, connect_args={
+        'options': f"-c search_path={schema}"})
+    yield engine
+    engine.dispose()
+    with admin.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+    admin.dispose()
+
+
+def add_transactions(connection, *created):
+    account_id = connection.execute(select(Account.account_id)).scalar()
+    if account_id is None:
+        user_id = connection.execute(insert(User).returning(User.user_id), {
+            'username': "p", 'email': "p@example.com",
+            'password_hash': "hashed", 'role': Role.user}).scalar_one()
+        account_id = connection.execute(
+            insert(Account).returning(Account.account_id), {
+                'user_id': user_id, 'account_type': "Checking Account",
+                'balance': 0}).scalar_one()
+    connection.execute(insert(Transaction), [
+        {'account_id': account_id, 'transaction_type': TransactionType.deposit,
+         'amount': 1, 'status': TransactionStatus.completed,
+         'created_at': moment} for moment in created])
+
+
+def rows_in(connection, table):
+    return connection.execute(
+        text(f"SELECT count(*) FROM {table}")).scalar()
+
+
+def test_fresh_database_is_partitioned(pg_engine):
+    init_db(pg_engine)
+    with pg_engine.begin() as connection:
+        assert is_partitioned(connection)
+        months = partitions(connection)
+        assert month_start(datetime.utcnow()) in months
+        assert len(months) >= 4
+        add_transactions(connection, datetime.utcnow(), datetime(2001, 1, 1))
+        assert rows_in(connection, partition_name(months[0])) == 1
+        assert rows_in(connection, "transactions_default") == 1
+
+
+def test_existing_table_is_migrated_with_its_rows(pg_engine):
+    Base.metadata.create_all(pg_engine)
+    migrate(pg_engine, target=3)
+    with pg_engine.begin() as connection:
+        add_transactions(connection, datetime(2026, 8, 3),
+                         datetime(2026, 9, 30, 23, 59))
+        assert not is_partitioned(connection)
+
+    assert migrate(pg_engine) == list(range(4, HEAD + 1))
+
+    with pg_engine.begin() as connection:
+        assert current_version(connection) == HEAD
+        assert partitions(connection)[:2] == [date(2026, 8, 1),
+                                              date(2026, 9, 1)]
+        assert rows_in(connection, "transactions_p202608") == 1
+        assert rows_in(connection, "transactions_p202609") == 1
+        add_transactions(connection, datetime(2026, 9, 1))
+        ids = connection.execute(select(Transaction.transaction_id).order_by(
+            Transaction.transaction_id)).scalars().all()
+    assert ids == [1, 2, 3]
+    indexes = {index['name']
+               for index in inspect(pg_engine).get_indexes("transactions")}
+    assert {"ix_transactions_account_created",
+            "ix_transactions_pending"} <= indexes
+
+
+def test_ensure_partitions_moves_rows_out_of_the_default(pg_engine):
+    init_db(pg_engine)
+    later = add_months(month_start(datetime.utcnow()), 12)
+    with pg_engine.begin() as connection:
+        add_transactions(connection, datetime(later.year, later.month, 5))
+        assert rows_in(connection, "transactions_default") == 1
+
+    created = ensure_partitions(pg_engine, ahead=1, today=later)
+
+    assert created == [partition_name(later), partition_name(
+        add_months(later, 1))]
+    assert ensure_partitions(pg_engine, ahead=1, today=later) == []
+    with pg_engine.begin() as connection:
+        assert rows_in(connection, "transactions_default") == 0
+        assert rows_in(connection, partition_name(later)) == 1
+        assert connection.execute(select(func.count()).select_from(
+            Transaction)).scalar() == 1
+
+
+def test_drop_partitions(pg_engine):
+    init_db(pg_engine)
+    with pg_engine.begin() as connection:
+        first = partitions(connection)[0]
+        add_transactions(connection, datetime(first.year, first.month, 2))
+    cutoff = add_months(first, 2)
+
+    detached = drop_partitions(pg_engine, cutoff, detach_only=True)
+
+    assert detached == [partition_name(first),
+                        partition_name(add_months(first, 1))]
+    with pg_engine.begin() as connection:
+        assert partitions(connection)[0] == cutoff
+        assert connection.execute(select(func.count()).select_from(
+            Transaction)).scalar() == 0
+        # a detached partition is kept as a standalone table
+        assert rows_in(connection, partition_name(first)) == 1
+    assert drop_partitions(pg_engine, cutoff) == []
+    assert drop_partitions(pg_engine, add_months(cutoff, 1)) == [
+        partition_name(cutoff)]
+
+
+def test_drop_partitions_removes_old_rows_of_the_default(pg_engine):
+    init_db(pg_engine)
+    with pg_engine.begin() as connection:
+        first = partitions(connection)[0]
+    cutoff = add_months(first, 1)
+    drop_partitions(pg_engine, cutoff)
+    with pg_engine.begin() as connection:
+        # the month is gone, so its rows now land in the default partition
+        add_transactions(connection, datetime(first.year, first.month, 2),
+                         datetime(first.year, first.month, 3))
+        assert rows_in(connection, "transactions_default") == 2
+    archive = f"transactions_default_before_{cutoff:%Y%m}"
+
+    assert drop_partitions(pg_engine, cutoff, detach_only=True) == [archive]
+    with pg_engine.begin() as connection:
+        assert rows_in(connection, "transactions_default") == 0
+        assert rows_in(connection, archive) == 2
+        add_transactions(connection, datetime(first.year, first.month, 4))
+    assert drop_partitions(pg_engine, cutoff) == []
+    with pg_engine.begin() as connection:
+        assert rows_in(connection, "transactions_default") == 0
+        assert rows_in(connection, archive) == 2
+
+
+def test_date_filters_prune_partitions(pg_engine):
+    init_db(pg_engine)
+    month = month_start(datetime.utcnow())
+    with pg_engine.connect() as connection:
+        plan = "\n".join(connection.execute(text(
+            "EXPLAIN SELECT transaction_id FROM transactions "
+            "WHERE account_id = 1 AND created_at >= :start "
+            "AND created_at < :end"), {
+                'start': month, 'end': add_months(month, 1)}).scalars())
+    assert partition_name(month) in plan
+    assert partition_name(add_months(month, 1)) not in plan
+    assert "transactions_default" not in plan
@@ -0,0 +1,87 @@
+import os
+import pytest
+import bcrypt
+from logic.password_hasher import PasswordHasher, hash_rounds
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=4, max_workers=2)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_and_verify(hasher):
+    hashed = hasher.hash("secret")
+    assert hash_rounds(hashed) == 4
+    assert hasher.verify("secret", hashed)
+    assert not hasher.verify("wrong", hashed)
+
+
+def test_verify_existing_bcrypt_hash(hasher):
+    hashed = bcrypt.hashpw(b"secret", bcrypt.gensalt(5)).decode('utf-8')
+    assert hasher.verify("secret", hashed)
+
+
+def test_hash_many_keeps_order(hasher):
+    passwords = [f"password{i}" for i in range(5)]
+    hashes = hasher.hash_many(passwords)
+    assert len(hashes) == 5
+    assert all(hasher.verify(p, h) for p, h in zip(passwords, hashes))
+
+
+def test_needs_rehash(hasher):
+    assert not hasher.needs_rehash(hasher.hash("secret"))
+    hasher.rounds = 5
+    assert hasher.needs_rehash(
+        bcrypt.hashpw(b"secret", bcrypt.gensalt(4)).decode('utf-8'))
+    assert hasher.needs_rehash("not-a-hash")
+
+
+def test_rounds_and_workers_from_env(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    monkeypatch.setenv("BCRYPT_ROUNDS", "6")
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "3")
+    hasher = PasswordHasher()
+    assert hasher.rounds == 6
+    assert hasher.max_workers == 3
+
+
+def test_workers_are_capped_at_the_cpu_count(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
+    assert PasswordHasher().max_workers == 4
+    assert PasswordHasher(max_workers=64).max_workers == 4
+    assert PasswordHasher(max_workers=2).max_workers == 2
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_child_gets_its_own_pool(hasher):
+    assert hasher.verify("secret", hasher.hash("secret"))
+    pid = os.fork()
+    if pid == 0:
+        # the parent's worker threads do not exist in the child
+        ok = hasher._executor is None and \
+            hasher.verify("secret", hasher.hash("secret"))
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+
+
+def test_invalid_executor():
+    with pytest.raises(ValueError):
+        PasswordHasher(executor="fiber")
+
+
+def test_process_pool(hasher):
+    process_hasher = PasswordHasher(rounds=4, max_workers=1,
+                                    executor="process")
+    try:
+        assert process_hasher.verify("secret", process_hasher.hash("secret"))
+    finally:
+        process_hasher.shutdown()
+
+
+def test_hash_rounds():
+    assert hash_rounds("$2b$12$abcdefghijklmnopqrstuv") == 12
+    with pytest.raises(ValueError):
+        hash_rounds("plain")
@@ -0,0 +1,108 @@
+import csv
+import io
+import json
+import pytest
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from sqlalchemy.orm import sessionmaker
+from database.archive import TransactionArchive, archive_transactions
+from database.init_db import create_engine_from_env, init_db
+from database.models import (
+    User, Account, Transaction, Role, TransactionType, TransactionStatus
+)
+from logic.transaction_export import TransactionExport, COLUMNS
+from logic.transaction_history import TransactionFilters
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine_from_env(f"sqlite:///{tmp_path / 'bank.db'}")
+    init_db(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def Session(engine):
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def user_id(Session):
+    """A user with 25 transactions, one a day, and another user."""
+    with Session() as session:
+        owner = User(username="owner", email="owner@example.com",
+                     password_hash="hashed", role=Role.user,
+                     accounts=[Account(account_type="Checking Account",
+                                       balance=100)])
+        other = User(username="other", email="other@example.com",
+                     password_hash="hashed", role=Role.user,
+                     accounts=[Account(account_type="Checking Account",
+                                       balance=100)])
+        session.add_all([owner, other])
+        session.flush()
+        for i in range(25):
+            session.add(Transaction(
+                account_id=owner.accounts[0].account_id,
+                transaction_type=(TransactionType.deposit if i % 2
+                                  else TransactionType.withdrawal),
+                amount=Decimal(i) + Decimal("0.50"),
+                status=TransactionStatus.completed,
+                created_at=START + timedelta(days=i),
+                notes='say "hi", again' if i == 3 else None))
+        session.add(Transaction(account_id=other.accounts[0].account_id,
+                                transaction_type=TransactionType.deposit,
+                                amount=1, status=TransactionStatus.completed,
+                                created_at=START))
+        session.commit()
+        return owner.user_id
+
+
+def test_csv_export(Session, user_id):
+    chunks = list(TransactionExport(Session, batch_size=10).to_csv(user_id))
+    assert len(chunks) == 3
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert len(rows) == 25
+    assert tuple(rows[0]) == COLUMNS
+    assert rows[0]['created_at'] == (START + timedelta(days=24)).isoformat()
+    assert rows[0]['amount'] == "24.50"
+    assert rows[0]['account'] == "Checking Account"
+    assert rows[21]['notes'] == 'say "hi", again'
+
+
+def test_ndjson_export_with_filters(Session, user_id):
+    filters = TransactionFilters(transaction_type=TransactionType.deposit,
+                                 start=date(2024, 1, 5),
+                                 end=date(2024, 1, 10))
+    body = "".join(TransactionExport(Session, batch_size=2).to_ndjson(
+        user_id, filters))
+    rows = [json.loads(line) for line in body.splitlines()]
+    assert [row['id'] for row in rows] == [10, 8, 6]
+    assert {row['type'] for row in rows} == {"deposit"}
+
+
+def test_export_of_unknown_account_is_empty(Session, user_id):
+    export = TransactionExport(Session)
+    assert list(export.to_ndjson(user_id, TransactionFilters(
+        account_id=9999))) == []
+    assert "".join(export.to_csv(9999)) == ",".join(COLUMNS) + "\r\n"
+
+
+def test_export_merges_archived_transactions(engine, Session, user_id,
+                                             tmp_path):
+    archive = TransactionArchive(str(tmp_path / "archive"))
+    export = TransactionExport(Session, archive, batch_size=4)
+    before = "".join(export.to_csv(user_id))
+    archive_transactions(engine, archive, datetime(2024, 1, 15))
+    assert "".join(export.to_csv(user_id)) == before
+
+
+def test_export_is_lazy(Session, user_id):
+    export = TransactionExport(Session, batch_size=5)
+    chunks = export.stream(user_id, 'ndjson')
+    assert len(next(chunks).splitlines()) == 5
+    chunks.close()
+    with pytest.raises(ValueError):
+        export.stream(user_id, 'xml')
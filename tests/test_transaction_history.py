@@ -0,0 +1,129 @@
+import pytest
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database.models import (
+    Base, User, Account, Transaction, Role,
+    TransactionType, TransactionStatus
+)
+from logic.transaction_history import (
+    TransactionHistory, TransactionFilters, encode_cursor, decode_cursor
+)
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def accounts(session):
+    """Two users; the first has 25 transactions, two per day."""
+    owner = User(username="owner", email="owner@example.com",
+                 password_hash="hashed", role=Role.user)
+    other = User(username="other", email="other@example.com",
+                 password_hash="hashed", role=Role.user)
+    session.add_all([owner, other])
+    session.flush()
+    checking = Account(user_id=owner.user_id, account_type="Checking Account",
+                       balance=100.0)
+    savings = Account(user_id=owner.user_id, account_type="Savings Account",
+                      balance=100.0)
+    foreign = Account(user_id=other.user_id, account_type="Checking Account",
+                      balance=100.0)
+    session.add_all([checking, savings, foreign])
+    session.flush()
+    for i in range(25):
+        session.add(Transaction(
+            account_id=checking.account_id if i % 2 else savings.account_id,
+            transaction_type=(TransactionType.deposit if i % 3
+                              else TransactionType.withdrawal),
+            amount=float(i), status=TransactionStatus.completed,
+            created_at=START + timedelta(days=i // 2)))
+    session.add(Transaction(account_id=foreign.account_id,
+                            transaction_type=TransactionType.deposit,
+                            amount=1.0, status=TransactionStatus.completed,
+                            created_at=START))
+    session.commit()
+    return owner.user_id, checking.account_id, savings.account_id
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(START, 42)
+    assert decode_cursor(cursor) == (START, 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_pages_cover_all_transactions_once(session, accounts):
+    user_id = accounts[0]
+    history = TransactionHistory(session)
+    seen = []
+    cursor = None
+    while True:
+        page = history.page(user_id, cursor=cursor, limit=10)
+        seen.extend(item['id'] for item in page.transactions)
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert len(seen) == 25
+    assert len(set(seen)) == 25
+    dates = [item['date'] for item in
+             history.page(user_id, limit=25).transactions]
+    assert dates == sorted(dates, reverse=True)
+
+
+def test_last_page_has_no_cursor(session, accounts):
+    page = TransactionHistory(session).page(accounts[0], limit=25)
+    assert len(page.transactions) == 25
+    assert page.next_cursor is None
+
+
+def test_filters_are_applied(session, accounts):
+    user_id, checking_id, _ = accounts
+    history = TransactionHistory(session)
+
+    by_type = history.page(user_id, TransactionFilters(
+        transaction_type=TransactionType.withdrawal), limit=100)
+    assert {t['type'] for t in by_type.transactions} == {'withdrawal'}
+    assert len(by_type.transactions) == 9
+
+    by_account = history.page(user_id, TransactionFilters(
+        account_id=checking_id), limit=100)
+    assert {t['account'] for t in by_account.transactions} == \
+        {"Checking Account"}
+    assert len(by_account.transactions) == 12
+
+    by_date = history.page(user_id, TransactionFilters(
+        start=date(2024, 1, 2), end=date(2024, 1, 3)), limit=100)
+    assert {t['date'] for t in by_date.transactions} == \
+        {"2024-01-02", "2024-01-03"}
+    assert len(by_date.transactions) == 4
+
+
+def test_filters_from_args():
+    filters = TransactionFilters.from_args({
+        'type': 'deposit', 'account': '3',
+        'start': '2024-01-01', 'end': '2024-01-31'})
+    assert filters.transaction_type == TransactionType.deposit
+    assert filters.account_id == 3
+    assert filters.start == date(2024, 1, 1)
+    assert filters.end == date(2024, 1, 31)
+    with pytest.raises(ValueError):
+        TransactionFilters.from_args({'type': 'bogus'})
+    with pytest.raises(ValueError, match="^Invalid date"):
+        TransactionFilters.from_args({'start': 'yesterday'})
+    with pytest.raises(ValueError, match="^Invalid account.$"):
+        TransactionFilters.from_args({'account': 'abc'})
+
+
+def test_other_users_transactions_are_excluded(session, accounts):
+    page = TransactionHistory(session).page(accounts[0], limit=100)
+    assert len(page.transactions) == 25
@@ -0,0 +1,249 @@
+import threading
+import pytest
+from decimal import Decimal
+from unittest.mock import patch
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from database.init_db import create_engine_from_env, init_db
+from database.models import User, Account, Transaction, Role
+from logic.transfer_service import (
+    TransferService, TransferResult, TransferRequest, InsufficientFunds,
+    InvalidSourceAccount, InvalidTargetAccount, is_retryable
+)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:")
+    init_db(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def make_user(session, name, balances):
+    user = User(username=name, email=f"{name}@example.com",
+                password_hash="hashed", role=Role.user,
+                accounts=[Account(account_type="Checking Account",
+                                  balance=balance) for balance in balances])
+    session.add(user)
+    session.commit()
+    return user.user_id, [account.account_id for account in user.accounts]
+
+
+def balance(session, account_id):
+    return session.execute(select(Account.balance).where(
+        Account.account_id == account_id)).scalar_one()
+
+
+def test_internal_transfer_moves_money_and_records_both_sides(session):
+    user_id, (first, second) = make_user(session, "alice", ["100.00", "5.00"])
+    result = TransferService(session).transfer(user_id, first, second,
+                                               Decimal("30.10"))
+    assert result.from_balance == Decimal("69.90")
+    assert balance(session, first) == Decimal("69.90")
+    assert balance(session, second) == Decimal("35.10")
+    amounts = session.execute(select(Transaction.account_id,
+                                     Transaction.amount)).all()
+    assert sorted(amounts) == [(first, Decimal("30.10")),
+                               (second, Decimal("30.10"))]
+
+
+def test_transfer_in_descending_account_order(session):
+    user_id, (first, second) = make_user(session, "alice", ["100", "100"])
+    TransferService(session).transfer(user_id, second, first, 40)
+    assert balance(session, first) == Decimal("140.00")
+    assert balance(session, second) == Decimal("60.00")
+
+
+@pytest.mark.parametrize("amount", ["100.01", "1000"])
+def test_insufficient_funds_changes_nothing(session, amount):
+    user_id, (first, second) = make_user(session, "alice", ["100", "0"])
+    with pytest.raises(InsufficientFunds, match="Insufficient funds."):
+        TransferService(session).transfer(user_id, first, second, amount)
+    assert balance(session, first) == Decimal("100.00")
+    assert balance(session, second) == Decimal("0.00")
+    assert session.execute(select(func.count(Transaction.transaction_id))
+                           ).scalar() == 0
+
+
+def test_rejects_accounts_of_other_users(session):
+    alice, (alice_account,) = make_user(session, "alice", ["100"])
+    _, (bob_account,) = make_user(session, "bob", ["100"])
+    service = TransferService(session)
+
+    with pytest.raises(InvalidSourceAccount):
+        service.transfer(alice, bob_account, alice_account, 10)
+    with pytest.raises(InvalidTargetAccount,
+                       match="^Invalid target account.$"):
+        service.transfer(alice, alice_account, bob_account, 10)
+    with pytest.raises(InvalidTargetAccount,
+                       match="Invalid external target account."):
+        service.transfer(alice, alice_account, 9999, 10, external=True)
+    assert balance(session, alice_account) == Decimal("100.00")
+
+    service.transfer(alice, alice_account, bob_account, 10, external=True)
+    assert balance(session, alice_account) == Decimal("90.00")
+    assert balance(session, bob_account) == Decimal("110.00")
+
+
+def test_rejects_transfer_to_same_account(session):
+    user_id, (first,) = make_user(session, "alice", ["100"])
+    with pytest.raises(InvalidTargetAccount):
+        TransferService(session).transfer(user_id, first, first, 10)
+
+
+def serialization_failure():
+    class Orig(Exception):
+        pgcode = "40001"
+    return OperationalError("UPDATE accounts", {}, Orig("could not serialize"))
+
+
+def test_retries_serialization_failures(session):
+    service = TransferService(session, max_retries=2, backoff=0)
+    with patch.object(TransferService, 'apply', side_effect=[
+            serialization_failure(), TransferResult(Decimal("1.00"))]):
+        result = service.transfer(1, 1, 2, 1)
+    assert result.attempts == 2
+
+    with patch.object(TransferService, 'apply',
+                      side_effect=serialization_failure()) as apply:
+        with pytest.raises(OperationalError):
+            service.transfer(1, 1, 2, 1)
+    assert apply.call_count == 3
+
+
+def test_only_transient_errors_are_retryable():
+    assert is_retryable(serialization_failure())
+    assert not is_retryable(OperationalError("x", {}, Exception("syntax")))
+
+
+def test_concurrent_transfers_conserve_money(tmp_path):
+    engine = create_engine_from_env(f"sqlite:///{tmp_path / 'bank.db'}")
+    init_db(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        user_id, (first, second) = make_user(session, "alice", ["50", "50"])
+
+    def worker(from_id, to_id):
+        with Session() as session:
+            service = TransferService(session, max_retries=10)
+            for _ in range(20):
+                try:
+                    service.transfer(user_id, from_id, to_id, "7.00")
+                except InsufficientFunds:
+                    pass
+
+    threads = [threading.Thread(target=worker, args=pair)
+               for pair in [(first, second), (second, first)] * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with Session() as session:
+        balances = [balance(session, first), balance(session, second)]
+    engine.dispose()
+    assert sum(balances) == Decimal("100.00")
+    assert min(balances) >= 0
+
+
+def test_batch_applies_items_in_order_and_reports_each(session):
+    alice, (first, second) = make_user(session, "alice", ["100", "0"])
+    _, (bob_account,) = make_user(session, "bob", ["0"])
+    outcomes = TransferService(session).transfer_batch(alice, [
+        {'from_account': first, 'to_account': second, 'amount': '60'},
+        {'from_account': first, 'to_account': second, 'amount': '60'},
+        {'from_account': second, 'to_account': bob_account,
+         'amount': '10.50', 'type': 'external'},
+        {'from_account': bob_account, 'to_account': first, 'amount': '1'},
+        {'from_account': first, 'to_account': bob_account, 'amount': '1'},
+        {'from_account': first, 'to_account': second, 'amount': '-1'},
+        {'from_account': 'x', 'to_account': second, 'amount': '1'},
+        TransferRequest(first, second, Decimal("40.00")),
+    ])
+    assert [o.to_dict() for o in outcomes] == [
+        {'index': 0, 'status': 'completed', 'from_balance': '40.00'},
+        {'index': 1, 'status': 'rejected', 'error': 'Insufficient funds.'},
+        {'index': 2, 'status': 'completed', 'from_balance': '49.50'},
+        {'index': 3, 'status': 'rejected',
+         'error': 'Invalid source account.'},
+        {'index': 4, 'status': 'rejected',
+         'error': 'Invalid target account.'},
+        {'index': 5, 'status': 'rejected', 'error': 'Invalid amount.'},
+        {'index': 6, 'status': 'rejected', 'error': 'Invalid account.'},
+        {'index': 7, 'status': 'completed', 'from_balance': '0.00'},
+    ]
+    assert balance(session, first) == Decimal("0.00")
+    assert balance(session, second) == Decimal("89.50")
+    assert balance(session, bob_account) == Decimal("10.50")
+    assert session.execute(select(func.count(Transaction.transaction_id))
+                           ).scalar() == 6
+
+
+def test_batch_rejects_unparseable_items_one_by_one(session):
+    alice, (first, second) = make_user(session, "alice", ["100", "0"])
+    outcomes = TransferService(session).transfer_batch(alice, [
+        {'from_account': first, 'to_account': second, 'amount': '1e30'},
+        {'from_account': first, 'to_account': second,
+         'amount': '99999999999999999999'},
+        {'from_account': float('inf'), 'to_account': second, 'amount': '1'},
+        {'from_account': 10 ** 30, 'to_account': second, 'amount': '1'},
+        {'from_account': first, 'to_account': second, 'amount': '1'},
+    ])
+    assert [o.error for o in outcomes] == [
+        'Invalid amount.', 'Invalid amount.', 'Invalid account.',
+        'Invalid account.', None]
+    assert balance(session, second) == Decimal("1.00")
+
+
+def test_batch_uses_one_lookup_and_commit_per_chunk(session, engine):
+    user_id, (first, second) = make_user(session, "alice", ["100", "100"])
+    items = [{'from_account': first, 'to_account': second, 'amount': '1'}
+             for _ in range(10)]
+    statements = []
+
+    def listen(*args):
+        statements.append(args[2].split()[0])
+    event.listen(engine, "before_cursor_execute", listen)
+    try:
+        with patch.object(session, 'commit',
+                          wraps=session.commit) as commit:
+            outcomes = TransferService(session).transfer_batch(
+                user_id, items, chunk_size=4)
+    finally:
+        event.remove(engine, "before_cursor_execute", listen)
+    assert all(outcome.completed for outcome in outcomes)
+    assert commit.call_count == 3
+    # the second UPDATE bumps the ledger version
+    assert statements == ["SELECT", "UPDATE", "UPDATE", "INSERT"] * 3
+    assert balance(session, first) == Decimal("90.00")
+
+
+def test_batch_retries_when_balance_changed_underneath(session):
+    user_id, (first, second) = make_user(session, "alice", ["10", "0"])
+    service = TransferService(session, backoff=0)
+    original = TransferService._check
+    raced = []
+
+    def race(*args):
+        # another writer empties the account after the balances were read
+        if not raced:
+            raced.append(True)
+            session.execute(Account.__table__.update().where(
+                Account.account_id == first).values(balance=0))
+            session.commit()
+        original(*args)
+
+    with patch.object(TransferService, '_check', staticmethod(race)):
+        outcomes = service.transfer_batch(user_id, [
+            {'from_account': first, 'to_account': second, 'amount': '5'}])
+    assert outcomes[0].error == "Insufficient funds."
+    assert balance(session, first) == Decimal("0.00")
@@ -11,7 +11,7 @@ def user_auth():
 
 
 def test_register_user_success(user_auth):
-    user_auth.session.query().filter_by().\
+    user_auth.session.query().filter().\
         first.return_value = None  # No existing user
     user_auth.session.commit.return_value = None
     result = user_auth.register_user("new_user",
@@ -20,7 +20,7 @@ def test_register_user_success(user_auth):
 
 
 def test_register_user_already_exists(user_auth):
-    user_auth.session.query().filter_by().\
+    user_auth.session.query().filter().\
         first.return_value = Mock()  # User already exists
     result = user_auth.register_user("existing_user",
                                      "email@example.com", "password")
@@ -41,10 +41,41 @@ def test_session_getter_setter(user_auth):
 
 
 def test_register_user_exception(user_auth):
-    user_auth.session.query().filter_by().first.return_value = None
+    user_auth.session.query().filter().first.return_value = None
     user_auth.session.add.side_effect = Exception("Database error")
     result = user_auth.register_user("new_user",
                                      "email@example.com", "password")
     assert result['success'] is False
     assert result['message'] == 'An error occurred while\
                  registering.'
+
+
+def test_register_user_single_transaction():
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    from database.init_db import init_db
+    from database.models import User, Account, Transaction
+    from logic.password_hasher import PasswordHasher
+
+    engine = create_engine("sqlite:///:memory:")
+    init_db(engine)
+    session = sessionmaker(bind=engine)()
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(conn))
+    user_auth = UserAuth(Mock(), session, PasswordHasher(rounds=4))
+
+    result = user_auth.register_user("starter", "starter@example.com", "pw")
+
+    assert result['success'] is True
+    assert len(commits) == 1
+    user = session.query(User).filter_by(username="starter").one()
+    accounts = session.query(Account).filter_by(user_id=user.user_id).all()
+    assert sorted(a.balance for a in accounts) == [500.0, 1500.0, 3000.0]
+    deposits = session.query(Transaction).join(Account).filter(
+        Account.user_id == user.user_id).all()
+    assert sorted(t.amount for t in deposits) == [500.0, 1500.0, 3000.0]
+    # usernames are unique regardless of case
+    assert user_auth.register_user(
+        "Starter", "other@example.com", "pw")['success'] is False
+    session.close()
+    engine.dispose()
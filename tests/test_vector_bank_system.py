@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+from decimal import Decimal
+from logic.bank_system import BankSystem
+from logic.vector_bank_system import VectorBankSystem
+
+
+@pytest.fixture
+def engine():
+    return VectorBankSystem.from_accounts(
+        {1: {1001: 100.0, 1002: 50.0}, 2: {2001: "0.10"}})
+
+
+def test_from_accounts_round_trips(engine):
+    assert engine.accounts == {1: {1001: Decimal("100.00"),
+                                   1002: Decimal("50.00")},
+                               2: {2001: Decimal("0.10")}}
+    assert engine.get_user_accounts(3) == {}
+    assert len(engine) == 3
+
+
+def test_scalar_operations_match_bank_system(engine):
+    bank_system = BankSystem()
+    bank_system.accounts = {1: {1001: 100.0, 1002: 50.0}, 2: {2001: "0.10"}}
+    for name, args in [("deposit", (1, 1001, 50.0)),
+                       ("withdraw", (1, 1001, 500.0)),
+                       ("withdraw", (1, 1002, 20.25)),
+                       ("deposit", (2, 1001, 1)),
+                       ("transfer_funds", (1, 1001, 1002, 150.0)),
+                       ("transfer_funds", (1, 1001, 1002, 150.01)),
+                       ("transfer_funds", (1, 1001, 2001, 1))]:
+        getattr(bank_system, name)(*args)
+        getattr(engine, name)(*args)
+    assert engine.accounts == {
+        user_id: {account_id: Decimal(balance)
+                  for account_id, balance in balances.items()}
+        for user_id, balances in bank_system.accounts.items()}
+
+
+def test_slots_marks_unknown_accounts(engine):
+    assert engine.slots([2001, 9999, 1001]).tolist() == [2, -1, 0]
+    assert VectorBankSystem().slots([1]).tolist() == [-1]
+
+
+def test_deposit_many_skips_invalid_operations(engine):
+    applied = engine.deposit_many([1001, 1001, 9999, 1002], [1, 2, 3, -4])
+    assert applied.tolist() == [True, True, False, False]
+    assert engine.balance(1001) == Decimal("100.03")
+    assert engine.balance(1002) == Decimal("50.00")
+
+
+def test_withdraw_many_masks_overdrafts_in_order(engine):
+    applied = engine.withdraw_many([1001, 1002, 1001, 1001, 1002],
+                                   [6000, 5000, 4000, 100, 1])
+    # 1001: 60 + 40 fits exactly, so the next debit no longer does
+    assert applied.tolist() == [True, True, True, False, False]
+    assert engine.balance(1001) == Decimal("0.00")
+    assert engine.balance(1002) == Decimal("0.00")
+
+
+def test_transfer_many_checks_ownership_and_conserves_money(engine):
+    total = engine.total
+    applied = engine.transfer_many(
+        [1001, 1001, 1002, 2001, 1001],
+        [1002, 2001, 1002, 1001, 1002],
+        [2500, 100, 1, 10, 8000],
+        user_ids=[1, 1, 1, 2, 1])
+    assert applied.tolist() == [True, False, False, False, False]
+    assert engine.total == total
+    assert engine.balance(1001) == Decimal("75.00")
+    assert engine.balance(1002) == Decimal("75.00")
+
+
+def test_batch_credits_do_not_fund_debits_of_the_same_batch(engine):
+    applied = engine.transfer_many([1002, 1001], [1001, 1002],
+                                   [5000, 15000])
+    assert applied.tolist() == [True, False]
+
+
+def reference_transfers(balances, sources, targets, amounts):
+    """The batch rule spelled out one operation at a time."""
+    opening, debited = dict(balances), {}
+    applied = []
+    for source, target, amount in zip(sources, targets, amounts):
+        ok = source in opening and target in opening and source != target
+        if ok:
+            debited[source] = debited.get(source, 0) + amount
+            ok = debited[source] <= opening[source]
+        if ok:
+            balances[source] -= amount
+            balances[target] += amount
+        applied.append(ok)
+    return applied
+
+
+def test_random_batches_match_reference_and_never_overdraw():
+    rng = np.random.default_rng(7)
+    engine = VectorBankSystem(capacity=2)
+    for account_id in range(100):
+        engine.add_account(account_id % 10, account_id, 10)
+    balances = {account_id: 1000 for account_id in range(100)}
+    for _ in range(20):
+        sources = rng.integers(0, 110, 500)
+        targets = rng.integers(0, 110, 500)
+        amounts = rng.integers(1, 500, 500)
+        expected = reference_transfers(balances, sources.tolist(),
+                                       targets.tolist(), amounts.tolist())
+        total = engine.total
+        applied = engine.transfer_many(sources, targets, amounts)
+        assert applied.tolist() == expected
+        assert engine.total == total
+    assert {account_id: int(engine.balance(account_id) * 100)
+            for account_id in range(100)} == balances
+    assert min(balances.values()) >= 0
+
+
+def test_account_of_another_user_is_rejected(engine):
+    with pytest.raises(ValueError):
+        engine.add_account(2, 1001)
+    engine.add_account(1, 1001, "1.50")
+    assert engine.balance(1001) == Decimal("1.50")